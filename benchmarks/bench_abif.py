@@ -0,0 +1,63 @@
+"""
+Benchmark of reading the ladder and one sample channel from the demo files,
+with AbifReader and (if installed) Biopython.
+
+Usage (with the package installed):
+    python benchmarks/bench_abif.py
+"""
+
+import time
+import tracemalloc
+from pathlib import Path
+
+from fragment_analyzer.abif import AbifReader
+
+DEMO = Path(__file__).resolve().parents[1] / "demo"
+CHANNELS = ["DATA205", "DATA1"]
+
+
+def read_abif_reader(file):
+    data = AbifReader(file)
+    return [data[x] for x in CHANNELS]
+
+
+def read_biopython(file):
+    from Bio import SeqIO
+
+    data = SeqIO.read(file, "abi").annotations["abif_raw"]
+    return [data[x] for x in CHANNELS]
+
+
+def measure(reader, files):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for file in files:
+        reader(file)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    files = sorted(DEMO.glob("*/*.fsa"))
+    readers = {"AbifReader": read_abif_reader}
+    try:
+        import Bio  # noqa: F401
+
+        readers["Biopython"] = read_biopython
+    except ImportError:
+        print("Biopython is not installed, skipping it")
+
+    for name, reader in readers.items():
+        reader(files[0])  # warm up imports
+        elapsed, peak = measure(reader, files)
+        print(
+            f"{name:12} {elapsed / len(files) * 1000:7.2f} ms/file "
+            f"peak memory {peak / 1024:8.1f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
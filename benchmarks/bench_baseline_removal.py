@@ -0,0 +1,111 @@
+"""
+Benchmark of baseline_arPLS on the demo traces.
+
+Compares the banded solver with the previous scipy.sparse.linalg.spsolve
+implementation (runtime and largest absolute difference) and shows the
+effect of warm-starting DATA1 with the weights of the ladder channel.
+
+Usage (with the package installed):
+    python benchmarks/bench_baseline_removal.py [--ratio 0.001] [--lam 100000]
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from numpy.linalg import norm
+from scipy import sparse
+from scipy.sparse import linalg
+
+from fragment_analyzer.abif import AbifReader
+from fragment_analyzer.baseline_removal import baseline_arPLS
+
+DEMO = Path(__file__).resolve().parents[1] / "demo"
+
+
+def sparse_arPLS(y, ratio=0.99, lam=100, niter=1000):
+    """
+    The previous implementation, kept as reference.
+    """
+    L = len(y)
+    diag = np.ones(L - 2)
+    D = sparse.spdiags([diag, -2 * diag, diag], [0, -1, -2], L, L - 2)
+    H = lam * D.dot(D.T)
+    w = np.ones(L)
+    W = sparse.spdiags(w, 0, L, L)
+    crit = 1
+    count = 0
+    while crit > ratio:
+        z = linalg.spsolve((W + H).tocsc(), W * y)
+        d = y - z
+        dn = d[d < 0]
+        m = np.mean(dn)
+        s = np.std(dn)
+        w_new = 1 / (1 + np.exp(2 * (d - (2 * s - m)) / s))
+        crit = norm(w_new - w) / norm(w)
+        w = w_new
+        W.setdiag(w)
+        count += 1
+        if count > niter:
+            break
+    return z
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ratio", type=float, default=0.99)
+    parser.add_argument("--lam", type=float, default=100)
+    parser.add_argument("--ladder-channel", default="DATA205")
+    parser.add_argument("--channel", default="DATA1")
+    args = parser.parse_args()
+
+    totals = {"sparse": 0.0, "banded": 0.0, "warm": 0.0}
+    max_difference = 0.0
+    for file in sorted(DEMO.glob("*/*.fsa")):
+        data = AbifReader(file)
+        ladder = np.array(data[args.ladder_channel], dtype=float)
+        y = np.array(data[args.channel], dtype=float)
+
+        reference, sparse_time = timed(sparse_arPLS, y, args.ratio, args.lam)
+        (z, _, info), banded_time = timed(
+            baseline_arPLS, y, args.ratio, args.lam, full_output=True
+        )
+        _, _, ladder_info = baseline_arPLS(
+            ladder, args.ratio, args.lam, full_output=True
+        )
+        (_, _, warm_info), warm_time = timed(
+            baseline_arPLS,
+            y,
+            args.ratio,
+            args.lam,
+            full_output=True,
+            w=ladder_info["weights"],
+        )
+
+        difference = np.abs(reference - z).max()
+        max_difference = max(max_difference, difference)
+        totals["sparse"] += sparse_time
+        totals["banded"] += banded_time
+        totals["warm"] += warm_time
+
+        print(
+            f"{file.name:45} sparse={sparse_time:6.3f}s banded={banded_time:6.3f}s "
+            f"({info['num_iter']} it) warm={warm_time:6.3f}s "
+            f"({warm_info['num_iter']} it) max|diff|={difference:.2e}"
+        )
+
+    print()
+    print(" ".join(f"{k}={v:.2f}s" for k, v in totals.items()))
+    print(f"speedup={totals['sparse'] / totals['banded']:.1f}x")
+    print(f"largest absolute difference={max_difference:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Import time budget of the package and the heavy modules it must not import
+before they are used.
+
+Every statement is timed in a fresh interpreter (the best of --repeat runs).
+Exits with status 1 if a statement is over its budget or imports one of
+its forbidden modules, so it can guard the start-up time of batch workers
+and the CLI.
+
+Usage (with the package installed):
+    python benchmarks/bench_import.py [--repeat 5] [--scale 1.0]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY = ["matplotlib", "panel", "lmfit", "networkx", "sklearn", "Bio"]
+
+# statement, budget in seconds, modules that must not be imported
+STATEMENTS = [
+    ("import fragment_analyzer", 0.1, HEAVY + ["scipy", "pandas"]),
+    ("from fragment_analyzer import AbifReader", 0.3, HEAVY + ["scipy", "pandas"]),
+    ("from fragment_analyzer import LadderMap", 2.0, HEAVY),
+    ("from fragment_analyzer import PeakArea", 2.0, HEAVY),
+    ("from fragment_analyzer.cli import main", 0.3, HEAVY + ["scipy", "pandas"]),
+    ("from fragment_analyzer import generate_report", None, []),
+]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted(x for x in {modules} if x in sys.modules)]))
+"""
+
+
+def measure(statement: str, forbidden: list) -> tuple:
+    code = "import json\n" + PROBE.format(statement=statement, modules=forbidden)
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return tuple(json.loads(output.splitlines()[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply the budgets (slow machines)"
+    )
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'statement':<50} {'seconds':>8} {'budget':>8}  loaded")
+    for statement, budget, forbidden in STATEMENTS:
+        runs = [measure(statement, forbidden) for _ in range(args.repeat)]
+        elapsed = min(x[0] for x in runs)
+        loaded = runs[0][1]
+
+        over = budget is not None and elapsed > budget * args.scale
+        failed |= over or bool(loaded)
+
+        budget_text = (
+            f"{budget * args.scale:8.2f}" if budget is not None else "       -"
+        )
+        print(
+            f"{statement:<50} {elapsed:8.3f} {budget_text}  "
+            f"{', '.join(loaded) or '-'}{'  OVER BUDGET' if over else ''}"
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
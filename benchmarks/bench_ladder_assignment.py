@@ -0,0 +1,59 @@
+"""
+Benchmark of the ladder assignment engines on the demo .fsa files.
+
+Reports the runtime of every file, the worst case and whether the engines
+agree on best_correlated_peaks.
+
+Usage (with the package installed):
+    python benchmarks/bench_ladder_assignment.py [--methods dp graph] [--ladder LIZ]
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from fragment_analyzer.ladder_map import LadderMap
+
+DEMO = Path(__file__).resolve().parents[1] / "demo"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--methods", nargs="+", default=["dp", "graph"])
+    parser.add_argument("--ladder", default="LIZ")
+    parser.add_argument("--files", nargs="+", default=None)
+    args = parser.parse_args()
+
+    files = args.files or sorted(str(x) for x in DEMO.glob("*/*.fsa"))
+
+    timings = {method: [] for method in args.methods}
+    disagreements = 0
+    for file in files:
+        found = {}
+        for method in args.methods:
+            start = time.perf_counter()
+            laddermap = LadderMap(file, args.ladder, method=method)
+            timings[method].append(time.perf_counter() - start)
+            found[method] = laddermap.best_correlated_peaks
+
+        agree = all(np.array_equal(found[args.methods[0]], x) for x in found.values())
+        disagreements += not agree
+
+        runtimes = " ".join(f"{m}={timings[m][-1]:8.3f}s" for m in args.methods)
+        print(f"{Path(file).name:45} {runtimes} {'' if agree else 'DIFFERENT'}")
+
+    print()
+    for method, values in timings.items():
+        values = np.array(values)
+        print(
+            f"{method:6} total={values.sum():8.2f}s mean={values.mean():7.3f}s "
+            f"worst={values.max():7.3f}s ({Path(files[values.argmax()]).name})"
+        )
+    if len(args.methods) > 1:
+        print(f"{disagreements} of {len(files)} files with different peaks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Size of the interactive (Vega-Lite) plots of the reports against the PNGs
+they replace, for the demo .fsa files.
+
+Every plot of Report is rendered both ways and the bytes of the JSON spec
+are compared with the bytes of the PNG. Exits with status 1 if a spec is
+larger than its PNG, so it guards the default max_points of the reports.
+
+Usage (with the package installed):
+    python benchmarks/bench_report_size.py [--max-points 1000] [--files 4]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+from pathlib import Path
+
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.peak_area import PeakArea
+from fragment_analyzer.reports.generate_report import Report
+from fragment_analyzer.reports.report_data import report_data
+
+DEMO = Path(__file__).resolve().parents[1] / "demo"
+
+
+def plots(report: Report) -> dict:
+    """
+    Plot name -> panel pane of every trace plot of report.
+    """
+    ladder, correlation = report.ladder_plots()
+    panes = {
+        "raw_data": report.raw_data_plot(),
+        "ladder": ladder,
+        "ladder_correlation": correlation,
+    }
+    if report.data["found_peaks"]:
+        panes["peaks"] = report.peaks_plot()
+
+    return panes
+
+
+def plot_sizes(data: dict, max_points: int, decimation: str) -> dict:
+    """
+    Plot name -> (bytes of the Vega-Lite spec, bytes of the PNG).
+    """
+    vega = plots(
+        Report(
+            data=data, max_points=max_points, interactive=True, decimation=decimation
+        )
+    )
+    png = plots(Report(data=data, max_points=max_points, interactive=False))
+
+    return {
+        name: (len(json.dumps(vega[name].object)), len(png[name].object))
+        for name in vega
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-points", type=int, default=1_000)
+    parser.add_argument("--decimation", default="minmax")
+    parser.add_argument("--files", type=int, default=4)
+    args = parser.parse_args()
+
+    files = sorted(DEMO.glob("*/*.fsa"))[: args.files]
+
+    failed = False
+    print(f"{'file':<32} {'plot':<20} {'vega':>8} {'png':>8}")
+    for file in files:
+        with contextlib.redirect_stdout(io.StringIO()):
+            laddermap = LadderMap(file, "LIZ")
+            peakarea = PeakArea(laddermap, "fast_gauss")
+        sizes = plot_sizes(
+            report_data(laddermap, peakarea), args.max_points, args.decimation
+        )
+
+        for name, (vega, png) in sizes.items():
+            larger = vega > png
+            failed |= larger
+            print(
+                f"{file.name:<32} {name:<20} {vega:8d} {png:8d}"
+                f"{'  LARGER THAN PNG' if larger else ''}"
+            )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Benchmark of every analysis stage on the demo .fsa files, with JSON output
+to compare runs across commits.
+
+Stages: ABIF parse, baseline_arPLS, get_peaks, peak_adjacency, the networkx
+graph (generate_graph), counting the paths of the graph search, the dp and graph correlation, PeakArea and
+(with --report) report rendering. The number of paths through the peak graph
+is counted exactly without enumerating them; files with more than
+--max-paths paths are flagged as pathological and the graph search is
+skipped for them.
+
+Usage (with the package installed):
+    python benchmarks/bench_stages.py --output bench.json
+    python benchmarks/bench_stages.py --compare bench.json --fail-on-regression
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from fragment_analyzer.abif import AbifReader
+from fragment_analyzer.baseline_removal import baseline_arPLS
+from fragment_analyzer.ladder_assignment import peak_adjacency
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.ladders.ladders import LADDER_REGISTRY
+from fragment_analyzer.peak_area import PeakArea, lmfit_model
+
+DEMO = Path(__file__).resolve().parents[1] / "demo"
+
+
+def timed(function, repeat: int = 1) -> tuple:
+    """
+    Returns (best runtime in seconds, result of the last call).
+    """
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+def count_paths(laddermap: LadderMap) -> tuple:
+    """
+    Number of paths through the peak graph from all start to all end nodes,
+    and the number of ladder sized windows on them, as enumerated by
+    LadderMap.generate_combinations.
+    """
+    n = laddermap.peaks.size
+    ladder_size = laddermap.ladder.size
+
+    indptr, indices = laddermap.adjacency
+    edges = [indices[indptr[i] : indptr[i + 1]] for i in range(n)]
+    has_in = np.zeros(n, dtype=bool)
+    for targets in edges:
+        has_in[targets] = True
+
+    ends = [i for i in range(n) if edges[i].size == 0]
+
+    # paths[i][k]: paths from a start node to i with k nodes (python ints, they get large)
+    paths = [dict() for _ in range(n)]
+    for start in np.flatnonzero(~has_in):
+        paths[start][1] = 1
+    for i in range(n):
+        for j in edges[i]:
+            for length, count in paths[i].items():
+                paths[j][length + 1] = paths[j].get(length + 1, 0) + count
+
+    # isolated peaks are start and end nodes, but not a path
+    n_paths = sum(
+        count for end in ends for length, count in paths[end].items() if length > 1
+    )
+    n_windows = sum(
+        count * (length - ladder_size + 1)
+        for end in ends
+        for length, count in paths[end].items()
+        if length >= ladder_size
+    )
+
+    return n_paths, n_windows
+
+
+def benchmark_file(file: Path, args) -> dict:
+    result = {}
+    channel = LADDER_REGISTRY[args.ladder].channel
+
+    result["abif"], data = timed(
+        lambda: [AbifReader(file)[x] for x in (channel, "DATA1")], args.repeat
+    )
+    result["baseline_arPLS"], _ = timed(lambda: baseline_arPLS(data[0]), args.repeat)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        laddermap = LadderMap(file, args.ladder)
+
+    result["get_peaks"], _ = timed(laddermap.get_peaks, args.repeat)
+    result["peak_adjacency"], _ = timed(
+        lambda: peak_adjacency(laddermap.peaks, laddermap.max_diff), args.repeat
+    )
+    result["generate_graph"], _ = timed(laddermap.generate_graph, args.repeat)
+    result["count_paths"], (paths, windows) = timed(
+        lambda: count_paths(laddermap), args.repeat
+    )
+    result["paths"] = paths
+    result["windows"] = windows
+    result["pathological"] = paths > args.max_paths
+
+    result["correlation_dp"], _ = timed(
+        laddermap.best_ladder_peak_correlation, args.repeat
+    )
+    if "graph" in args.methods and not result["pathological"]:
+        laddermap.method = "graph"
+        result["correlation_graph"], _ = timed(
+            laddermap.best_ladder_peak_correlation, args.repeat
+        )
+        laddermap.method = "dp"
+        laddermap.best_ladder_peak_correlation()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result["peak_area"], peakarea = timed(
+            lambda: PeakArea(laddermap, args.model), args.repeat
+        )
+
+        if args.report:
+            from fragment_analyzer.reports.generate_report import generate_report
+
+            with tempfile.TemporaryDirectory() as folder:
+                result["report"], _ = timed(
+                    lambda: generate_report(laddermap, peakarea, folder), 1
+                )
+
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stage_totals(files: dict) -> dict:
+    totals = {}
+    for result in files.values():
+        for stage, value in result.items():
+            if isinstance(value, float):
+                totals[stage] = totals.get(stage, 0.0) + value
+
+    return totals
+
+
+def compare(current: dict, baseline: dict, threshold: float, floor: float) -> list:
+    """
+    Returns the (file, stage, baseline, current) that got slower than
+    threshold times the baseline and by more than floor seconds.
+    """
+    regressions = []
+    for file, result in current["files"].items():
+        before = baseline["files"].get(file, {})
+        for stage, value in result.items():
+            if not isinstance(value, float) or stage not in before:
+                continue
+            if value > before[stage] * threshold and value - before[stage] > floor:
+                regressions.append((file, stage, before[stage], value))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ladder", default="LIZ")
+    parser.add_argument("--model", default="gauss")
+    parser.add_argument("--methods", nargs="+", default=["dp", "graph"])
+    parser.add_argument("--files", nargs="+", default=None)
+    parser.add_argument("--repeat", type=int, default=1, help="Best of n runs")
+    parser.add_argument("--report", action="store_true", help="Also render reports")
+    parser.add_argument("--max-paths", type=int, default=250_000)
+    parser.add_argument("--output", default=None, help="Save the results as JSON")
+    parser.add_argument("--compare", default=None, help="JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--floor", type=float, default=0.005, help="Seconds")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    files = (
+        [Path(x) for x in args.files] if args.files else sorted(DEMO.glob("*/*.fsa"))
+    )
+
+    # import the lazily imported modules now, so they are not timed
+    import networkx  # noqa: F401
+
+    if args.model != "fast_gauss":
+        lmfit_model(args.model)
+    if args.report:
+        import fragment_analyzer.reports.generate_report  # noqa: F401
+
+    results = {}
+    for file in files:
+        name = f"{file.parent.name}/{file.name}"
+        results[name] = benchmark_file(file, args)
+
+        stages = {k: v for k, v in results[name].items() if isinstance(v, float)}
+        slowest = max(stages, key=stages.get)
+        flag = "  PATHOLOGICAL" if results[name]["pathological"] else ""
+        print(
+            f"{name:60} total={sum(stages.values()):7.3f}s "
+            f"slowest={slowest} ({stages[slowest]:.3f}s) "
+            f"paths={results[name]['paths']}{flag}"
+        )
+
+    current = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "arguments": {k: v for k, v in vars(args).items() if k != "files"},
+        "totals": stage_totals(results),
+        "pathological": [k for k, v in results.items() if v["pathological"]],
+        "files": results,
+    }
+
+    print()
+    for stage, total in current["totals"].items():
+        print(f"{stage:20} {total:9.3f}s")
+    print(f"{len(current['pathological'])} pathological files")
+
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(current, indent=2))
+
+    if args.compare is not None:
+        baseline = json.loads(Path(args.compare).read_text())
+        print(f"\nCompared to {args.compare} (commit {baseline.get('commit')}):")
+        for stage, total in current["totals"].items():
+            before = baseline["totals"].get(stage)
+            if before:
+                print(
+                    f"{stage:20} {before:9.3f}s -> {total:9.3f}s ({total / before:5.2f}x)"
+                )
+
+        regressions = compare(current, baseline, args.threshold, args.floor)
+        for file, stage, before, value in regressions:
+            print(f"REGRESSION {file} {stage}: {before:.3f}s -> {value:.3f}s")
+        print(f"{len(regressions)} regressions")
+
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
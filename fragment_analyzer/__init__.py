@@ -1,14 +1,101 @@
 """
 ladder map.
 Easy Fragment Analyzing for python!
+
+The public names are imported lazily on first access (PEP 562), so that
+importing the package does not pull in scipy, matplotlib, lmfit or panel
+before they are needed. Only the ladders module, which needs nothing but
+numpy, is bound right away: importing fragment_analyzer.ladders.ladders
+anywhere sets the ladders attribute of the package to the ladders
+subpackage, which would shadow a lazy import.
 """
 
 __author__ = "William Rosenbaum and Pär Larsson"
 
-from fragment_analyzer.ladder_map import LadderMap
-from fragment_analyzer.peak_area import PeakArea
-from fragment_analyzer.baseline_removal import baseline_arPLS
+import importlib
+from typing import TYPE_CHECKING
+
 import fragment_analyzer.ladders.ladders as ladders
-from fragment_analyzer.reports.generate_report import generate_report
 
-__all__ = ["LadderMap", "PeakArea", "baseline_arPLS", "ladders", "generate_report"]
+if TYPE_CHECKING:
+    from fragment_analyzer.abif import AbifReader
+    from fragment_analyzer.baseline_removal import baseline_arPLS
+    from fragment_analyzer.batch import batch_analysis
+    from fragment_analyzer.calibration import SizeCalibration
+    from fragment_analyzer.calibration_cache import CalibrationCache
+    from fragment_analyzer.ladder_map import LadderMap
+    from fragment_analyzer.ladders.ladders import LADDER_REGISTRY, LadderTemplate
+    from fragment_analyzer.metrics import Metrics
+    from fragment_analyzer.peak_area import MultiChannelPeakArea, PeakArea
+    from fragment_analyzer.pipeline import Pipeline
+    from fragment_analyzer.plate_calibration import plate_ladder_qc
+    from fragment_analyzer.reports.generate_report import (
+        generate_report,
+        generate_reports,
+    )
+    from fragment_analyzer.reports.plate_report import generate_plate_report
+    from fragment_analyzer.results_store import ResultsStore
+    from fragment_analyzer.shared_traces import SharedTraceStore
+    from fragment_analyzer.watch import FolderWatcher
+
+# public name -> module it is defined in
+_LAZY_IMPORTS = {
+    "LadderMap": "fragment_analyzer.ladder_map",
+    "PeakArea": "fragment_analyzer.peak_area",
+    "Pipeline": "fragment_analyzer.pipeline",
+    "MultiChannelPeakArea": "fragment_analyzer.peak_area",
+    "baseline_arPLS": "fragment_analyzer.baseline_removal",
+    "LadderTemplate": "fragment_analyzer.ladders.ladders",
+    "LADDER_REGISTRY": "fragment_analyzer.ladders.ladders",
+    "generate_report": "fragment_analyzer.reports.generate_report",
+    "generate_reports": "fragment_analyzer.reports.generate_report",
+    "generate_plate_report": "fragment_analyzer.reports.plate_report",
+    "batch_analysis": "fragment_analyzer.batch",
+    "FolderWatcher": "fragment_analyzer.watch",
+    "plate_ladder_qc": "fragment_analyzer.plate_calibration",
+    "ResultsStore": "fragment_analyzer.results_store",
+    "SizeCalibration": "fragment_analyzer.calibration",
+    "CalibrationCache": "fragment_analyzer.calibration_cache",
+    "AbifReader": "fragment_analyzer.abif",
+    "SharedTraceStore": "fragment_analyzer.shared_traces",
+    "Metrics": "fragment_analyzer.metrics",
+}
+
+__all__ = [
+    "LadderMap",
+    "PeakArea",
+    "Pipeline",
+    "MultiChannelPeakArea",
+    "baseline_arPLS",
+    "ladders",
+    "LadderTemplate",
+    "LADDER_REGISTRY",
+    "generate_report",
+    "generate_reports",
+    "generate_plate_report",
+    "batch_analysis",
+    "FolderWatcher",
+    "plate_ladder_qc",
+    "ResultsStore",
+    "SizeCalibration",
+    "CalibrationCache",
+    "AbifReader",
+    "SharedTraceStore",
+    "Metrics",
+]
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+
+    # cache it, so __getattr__ is only called once per name
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
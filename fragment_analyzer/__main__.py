@@ -0,0 +1,3 @@
+from fragment_analyzer.cli import main
+
+main()
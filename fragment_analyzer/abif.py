@@ -0,0 +1,181 @@
+"""
+Lightweight reader of ABIF (.fsa/.ab1) files.
+
+Only the tag directory is parsed when a file is opened; the data of a tag is
+decoded with np.frombuffer on the file bytes the first time it is accessed.
+Tags are named like in Biopython's annotations["abif_raw"], i.e. the tag name
+followed by the tag number ("DATA1", "DATA205", ...).
+
+Format specification:
+https://projects.nfstc.org/workshops/resources/articles/ABIF_File_Format.pdf
+"""
+
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+
+_DIRECTORY_ENTRY = np.dtype(
+    [
+        ("name", "S4"),
+        ("number", ">i4"),
+        ("element_type", ">i2"),
+        ("element_size", ">i2"),
+        ("num_elements", ">i4"),
+        ("data_size", ">i4"),
+        ("data_offset", ">i4"),
+        ("data_handle", ">i4"),
+    ]
+)
+
+# element type -> big-endian dtype
+_NUMERIC_TYPES = {
+    1: np.dtype(">u1"),
+    3: np.dtype(">u2"),
+    4: np.dtype(">i2"),
+    5: np.dtype(">i4"),
+    7: np.dtype(">f4"),
+    8: np.dtype(">f8"),
+    13: np.dtype("?"),
+}
+_CHAR = 2
+_DATE = 10
+_TIME = 11
+_PSTRING = 18
+_CSTRING = 19
+
+
+class AbifReader(Mapping):
+    """
+    Read-only mapping of ABIF tags to their (lazily decoded) values.
+
+    Numeric tags are returned as NumPy arrays (integers as int64), or scalars if the
+    tag holds a single element, strings, dates and times as str and other types
+    as raw bytes.
+
+    Example usage:
+    data = AbifReader("demo/4062_Dx/1_PRT_1_4062_A01_Dx.fsa")
+    ladder = data["DATA205"]
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self._buffer = self.path.read_bytes()
+
+        if self._buffer[:4] != b"ABIF":
+            raise ValueError(f"{self.path} is not an ABIF file")
+
+        self.version = int(np.frombuffer(self._buffer, ">u2", 1, 4)[0])
+
+        root = np.frombuffer(self._buffer, _DIRECTORY_ENTRY, 1, 6)[0]
+        entries = np.frombuffer(
+            self._buffer,
+            _DIRECTORY_ENTRY,
+            int(root["num_elements"]),
+            int(root["data_offset"]),
+        )
+
+        # data of at most 4 bytes is stored in the data_offset field itself
+        inline_offsets = (
+            int(root["data_offset"])
+            + np.arange(entries.size) * _DIRECTORY_ENTRY.itemsize
+            + _DIRECTORY_ENTRY.fields["data_offset"][1]
+        )
+        offsets = np.where(
+            entries["data_size"] <= 4, inline_offsets, entries["data_offset"]
+        )
+
+        keys = [
+            f"{name.decode('ascii', errors='replace')}{number}"
+            for name, number in zip(
+                entries["name"].tolist(), entries["number"].tolist()
+            )
+        ]
+        self._entries = dict(
+            zip(
+                keys,
+                zip(
+                    entries["element_type"].tolist(),
+                    entries["num_elements"].tolist(),
+                    entries["data_size"].tolist(),
+                    offsets.tolist(),
+                ),
+            )
+        )
+
+        self._decoded = {}
+
+    def _decode(self, key: str):
+        element_type, num_elements, data_size, offset = self._entries[key]
+
+        if element_type in _NUMERIC_TYPES:
+            dtype = _NUMERIC_TYPES[element_type]
+            values = np.frombuffer(self._buffer, dtype, num_elements, offset)
+            # widen integers like Biopython, to avoid overflow in later arithmetic
+            native = np.int64 if dtype.kind in "iu" else dtype.newbyteorder("=")
+            values = values.astype(native)
+            return values[0] if num_elements == 1 else values
+
+        raw = self._buffer[offset : offset + data_size]
+        if element_type == _PSTRING:
+            return raw[1 : 1 + raw[0]].decode("latin-1")
+        if element_type == _CSTRING:
+            return raw.split(b"\x00", 1)[0].decode("latin-1")
+        if element_type == _CHAR:
+            return raw.decode("latin-1")
+        if element_type == _DATE:
+            year = int.from_bytes(raw[:2], "big")
+            return f"{year:04d}-{raw[2]:02d}-{raw[3]:02d}"
+        if element_type == _TIME:
+            return f"{raw[0]:02d}:{raw[1]:02d}:{raw[2]:02d}"
+
+        return raw
+
+    def __getitem__(self, key: str):
+        if key not in self._decoded:
+            self._decoded[key] = self._decode(key)
+
+        return self._decoded[key]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"AbifReader({str(self.path)!r}, {len(self)} tags)"
+
+
+def is_complete_abif(path: str) -> bool:
+    """
+    True if path is an ABIF file whose tag directory and tag data are all
+    present, i.e. the instrument has finished writing it.
+    """
+    try:
+        buffer = Path(path).read_bytes()
+    except OSError:
+        return False
+
+    header_size = 6 + _DIRECTORY_ENTRY.itemsize
+    if len(buffer) < header_size or buffer[:4] != b"ABIF":
+        return False
+
+    root = np.frombuffer(buffer, _DIRECTORY_ENTRY, 1, 6)[0]
+    count = int(root["num_elements"])
+    offset = int(root["data_offset"])
+    if (
+        count < 0
+        or offset < 0
+        or offset + count * _DIRECTORY_ENTRY.itemsize > len(buffer)
+    ):
+        return False
+
+    entries = np.frombuffer(buffer, _DIRECTORY_ENTRY, count, offset)
+    external = entries["data_size"] > 4
+    ends = (
+        entries["data_offset"][external].astype(np.int64)
+        + entries["data_size"][external]
+    )
+
+    return bool(np.all(ends <= len(buffer)))
@@ -4,30 +4,67 @@ https://stackoverflow.com/questions/29156532/python-baseline-correction-library
 
 from this paper:
 https://pubs.rsc.org/en/content/articlelanding/2015/AN/C4AN01061B#!divAbstract
+
+The system W + H is symmetric, positive definite and pentadiagonal, so it is
+solved with a banded Cholesky decomposition in O(n) per iteration.
 """
 
 from scipy import sparse
-from scipy.sparse import linalg
+from scipy.linalg import solveh_banded
 import numpy as np
 from numpy.linalg import norm
 
 
-def baseline_arPLS(y, ratio=0.99, lam=100, niter=1000, full_output=False):
-    L = len(y)
-
+def _penalty_bands(L, lam):
+    """
+    Upper bands of H = lam * D.dot(D.T) in the layout used by solveh_banded.
+    """
     diag = np.ones(L - 2)
     D = sparse.spdiags([diag, -2 * diag, diag], [0, -1, -2], L, L - 2)
+    H = D.dot(D.T)  # The transposes are flipped w.r.t the Algorithm on pg. 252
+
+    bands = np.zeros((3, L))
+    bands[0, 2:] = lam * H.diagonal(2)
+    bands[1, 1:] = lam * H.diagonal(1)
+    bands[2] = lam * H.diagonal(0)
+
+    return bands
+
+
+def baseline_arPLS(y, ratio=0.99, lam=100, niter=1000, full_output=False, w=None):
+    """
+    Asymmetrically reweighted penalized least squares baseline.
+
+    Args:
+        y: The signal.
+        ratio: Stop when the relative change of the weights is below ratio.
+        lam: Smoothness of the baseline.
+        niter: Maximum number of iterations.
+        full_output: Also return the residual and an info dict with the number
+            of iterations, the stop criterion, whether it converged and the
+            final weights.
+        w: Initial weights, e.g. the weights of another channel of the same run
+            (warm start). Defaults to ones.
+
+    Returns:
+        The baseline z, or (z, d, info) if full_output.
+    """
+    y = np.asarray(y, dtype=float)
+    L = len(y)
 
-    H = lam * D.dot(D.T)  # The transposes are flipped w.r.t the Algorithm on pg. 252
+    H = _penalty_bands(L, lam)
+    diagonal = H[2].copy()
 
-    w = np.ones(L)
-    W = sparse.spdiags(w, 0, L, L)
+    w = np.ones(L) if w is None else np.array(w, dtype=float)
+    system = H.copy()
 
     crit = 1
     count = 0
+    converged = True
 
     while crit > ratio:
-        z = linalg.spsolve(W + H, W * y)
+        system[2] = diagonal + w
+        z = solveh_banded(system, w * y, check_finite=False)
         d = y - z
         dn = d[d < 0]
 
@@ -39,16 +76,20 @@ def baseline_arPLS(y, ratio=0.99, lam=100, niter=1000, full_output=False):
         crit = norm(w_new - w) / norm(w)
 
         w = w_new
-        W.setdiag(w)  # Do not create a new matrix, just update diagonal values
 
         count += 1
 
         if count > niter:
-            print("Maximum number of iterations exceeded")
+            converged = False
             break
 
     if full_output:
-        info = {"num_iter": count, "stop_criterion": crit}
+        info = {
+            "num_iter": count,
+            "stop_criterion": crit,
+            "converged": converged,
+            "weights": w,
+        }
         return z, d, info
     else:
         return z
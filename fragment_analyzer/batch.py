@@ -0,0 +1,417 @@
+"""
+Batch processing of whole folders (plates) of .fsa files over a process pool.
+"""
+
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.peak_area import PeakArea
+
+
+def find_fsa_files(path: str) -> list:
+    """
+    Returns the sorted .fsa files of a directory, a glob pattern or a single file.
+    """
+    path = str(path)
+    if Path(path).is_dir():
+        files = Path(path).glob("*.fsa")
+    else:
+        files = (Path(x) for x in glob.glob(path))
+
+    return sorted(x for x in files if x.is_file())
+
+
+def append_csv(df: pd.DataFrame, path: str) -> None:
+    """
+    Appends df to the csv file at path, with a header only if the file is new.
+    """
+    df.to_csv(path, mode="a", index=False, header=not Path(path).exists())
+
+
+def append_metrics(result: dict, path: str) -> None:
+    """
+    Appends the metrics of an analyse_file result to path as one JSON line.
+    """
+    if result["metrics"] is None:
+        return
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(
+            json.dumps({"file_name": result["file_name"], **result["metrics"]}) + "\n"
+        )
+
+
+def metrics_argument(path: str, memory: bool = False):
+    """
+    The metrics argument of LadderMap and PeakArea for a metrics file path:
+    None without a path, "memory" with memory and True otherwise.
+    """
+    if path is None:
+        return None
+
+    return "memory" if memory else True
+
+
+def summary_row(result: dict) -> dict:
+    """
+    The file name, status, error and runtime of an analyse_file result.
+    """
+    return {
+        k: v
+        for k, v in result.items()
+        if k not in ("peaks", "ladder_peaks", "report_data", "tables", "metrics")
+    }
+
+
+def analyse_file(
+    file: str,
+    ladder: str,
+    model: str,
+    channel: str = "DATA1",
+    min_ratio: float = 0.2,
+    report_folder: str = None,
+    keep_report_data: bool = False,
+    keep_tables: bool = False,
+    metrics=None,
+    peak_height: float = 500,
+    min_peak_height: float = 500,
+    **laddermap_kwargs,
+) -> dict:
+    """
+    Runs LadderMap, PeakArea and optionally generate_report on one file.
+
+    Failures are caught and returned, so that one bad file does not stop a batch.
+    peak_height and min_peak_height are passed to PeakArea and laddermap_kwargs
+    to LadderMap, e.g. peak_height="auto" and height="auto" for thresholds
+    from the noise floor, with the floors min_peak_height and min_height.
+
+    Returns:
+        A dict with the path, file name, status ("ok", "no peaks" or "failed"), the
+        error message, the runtime in seconds, the peak table (or None), the
+        assigned ladder peaks and their correlation (or None) and,
+        if keep_report_data, the report_data for a plate report and, if
+        keep_tables, the result_tables for a ResultsStore (or None) and, if
+        metrics (see fragment_analyzer.metrics), the stage metrics of the
+        LadderMap and the PeakArea (or None).
+    """
+    start = time.perf_counter()
+    result = {
+        "path": str(file),
+        "file_name": Path(file).name,
+        "status": "ok",
+        "error": None,
+        "seconds": None,
+        "peaks": None,
+        "ladder_peaks": None,
+        "ladder_correlation": None,
+        "report_data": None,
+        "tables": None,
+        "metrics": None,
+    }
+
+    try:
+        laddermap = LadderMap(file, ladder, metrics=metrics, **laddermap_kwargs)
+        result["ladder_peaks"] = laddermap.best_correlated_peaks
+        result["ladder_correlation"] = laddermap.best_correlation
+        peakarea = PeakArea(
+            laddermap,
+            model,
+            channel=channel,
+            min_ratio=min_ratio,
+            metrics=metrics,
+            peak_height=peak_height,
+            min_peak_height=min_peak_height,
+        )
+
+        if peakarea.found_peaks:
+            result["peaks"] = peakarea.peak_position_area_dataframe
+        else:
+            result["status"] = "no peaks"
+
+        if report_folder is not None:
+            from fragment_analyzer.reports.generate_report import generate_report
+
+            generate_report(laddermap, peakarea, report_folder)
+
+        if keep_report_data:
+            from fragment_analyzer.reports.report_data import report_data
+
+            result["report_data"] = report_data(laddermap, peakarea)
+
+        if keep_tables:
+            from fragment_analyzer.results_store import result_tables
+
+            result["tables"] = result_tables(laddermap, peakarea, channel)
+
+        if metrics:
+            result["metrics"] = {
+                "laddermap": laddermap.metrics.to_dict(),
+                "peakarea": peakarea.metrics.to_dict(),
+            }
+
+    # any error of a file is reported in its result, so it never stops a batch
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["seconds"] = time.perf_counter() - start
+
+    return result
+
+
+def batch_analysis(
+    path: str,
+    ladder: str,
+    model: str,
+    channel: str = "DATA1",
+    min_ratio: float = 0.2,
+    workers: int = None,
+    report_folder: str = None,
+    output: str = None,
+    plate_report: str = None,
+    store=None,
+    metrics: str = None,
+    metrics_memory: bool = False,
+    plate_qc: bool = False,
+    min_correlation: float = 0.99,
+    seed_tolerance: float = None,
+    verbose: bool = True,
+    **laddermap_kwargs,
+) -> tuple:
+    """
+    Analyses every .fsa file of a directory or glob pattern over a process pool.
+
+    Args:
+        path: A directory, a glob pattern or a single .fsa file.
+        ladder: Name of the ladder, e.g. "LIZ", or a LadderTemplate.
+        model: Model used by PeakArea, e.g. "gauss".
+        channel: Channel of the sample.
+        min_ratio: Passed to PeakArea.
+        workers: Number of processes. Defaults to the number of CPUs, 1 runs
+            everything in the current process.
+        report_folder: If given, an HTML report of every file is saved there.
+        output: If given, the peak table is written to this csv file, the
+            rows of every file as soon as it is done. An existing file is
+            replaced.
+        plate_report: If given, one HTML report of all files is saved to this
+            path (see generate_plate_report).
+        store: If given, a ResultsStore the results of all files are appended to.
+        metrics: If given, the per stage metrics of every file are written to
+            this file as JSON lines. An existing file is replaced.
+        metrics_memory: With metrics, also record the peak memory of every
+            stage (metrics="memory", see fragment_analyzer.metrics).
+        plate_qc: Compare the ladder calibrations of all files (see
+            fragment_analyzer.plate_calibration) and map the failed, weak and
+            outlier ladders again, seeded with the consensus of the plate.
+            The summary gets the ladder_deviation and ladder_qc of every file.
+            The results are only written when all files are mapped.
+        min_correlation: With plate_qc, ladders with a lower correlation are
+            mapped again and left out of the consensus.
+        seed_tolerance: With plate_qc, the seeded search only uses peaks within
+            this many steps of the consensus aligned to the file. Defaults to
+            the spread of the ladder deviations of the plate (see
+            plate_tolerance).
+        verbose: Print the progress and the runtime of every file.
+        laddermap_kwargs: Passed to LadderMap, and peak_height and
+            min_peak_height to PeakArea (see analyse_file).
+
+    Returns:
+        A tuple of (peaks, summary), where peaks is the combined
+        peak_position_area_dataframe of all files and summary holds the status,
+        error and runtime of every file.
+
+    Example usage:
+    peaks, summary = batch_analysis("demo/4062_Dx", "LIZ", "gauss", workers=8)
+    """
+    files = find_fsa_files(path)
+    if not files:
+        raise FileNotFoundError(f"No .fsa files found in {path}")
+
+    workers = workers or os.cpu_count()
+    kwargs = dict(
+        ladder=ladder,
+        model=model,
+        channel=channel,
+        min_ratio=min_ratio,
+        # with plate_qc, the reports are saved once the ladders are final
+        report_folder=None if plate_qc else report_folder,
+        keep_report_data=plate_report is not None
+        or (plate_qc and report_folder is not None),
+        keep_tables=store is not None,
+        metrics=metrics_argument(metrics, metrics_memory),
+        **laddermap_kwargs,
+    )
+
+    # a new batch replaces the files of an earlier one, see FolderWatcher
+    # to append
+    for x in (output, metrics):
+        if x is not None and Path(x).exists():
+            Path(x).unlink()
+
+    peaks = []
+    summary = []
+    report_datas = []
+    tables = []
+    start = time.perf_counter()
+
+    def analyse(files, **extra):
+        if workers == 1:
+            for file in files:
+                yield analyse_file(file, **kwargs, **extra)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(analyse_file, file, **kwargs, **extra)
+                    for file in files
+                ]
+                for future in as_completed(futures):
+                    yield future.result()
+
+    def collect(result):
+        if plate_qc and report_folder is not None:
+            from fragment_analyzer.reports.generate_report import save_report
+
+            if result["report_data"] is not None:
+                save_report(result["report_data"], report_folder)
+            if plate_report is None:
+                result["report_data"] = None
+
+        if result["peaks"] is not None:
+            peaks.append(result["peaks"])
+            if output is not None:
+                append_csv(result["peaks"], output)
+
+        if result["report_data"] is not None:
+            report_datas.append(result["report_data"])
+
+        if result["tables"] is not None:
+            tables.append(result["tables"])
+
+        if metrics is not None:
+            append_metrics(result, metrics)
+
+        summary.append(summary_row(result))
+
+        if verbose:
+            error = f" ({result['error']})" if result["error"] else ""
+            print(
+                f"[{len(summary)}/{len(files)}] {result['file_name']}: "
+                f"{result['status']}{error} in {result['seconds']:.2f} s"
+            )
+
+    if plate_qc:
+        results, qc = _plate_qc(
+            files, analyse, min_correlation, seed_tolerance, verbose
+        )
+        for result in results:
+            collect(result)
+    else:
+        qc = None
+        for result in analyse(files):
+            collect(result)
+
+    if verbose:
+        failed = sum(x["status"] != "ok" for x in summary)
+        print(
+            f"Analysed {len(files)} files in {time.perf_counter() - start:.2f} s "
+            f"({failed} without peaks or failed)"
+        )
+
+    # results arrive in order of completion, return them in file order
+    summary = pd.DataFrame(summary).sort_values("file_name", ignore_index=True)
+    if qc is not None:
+        summary = summary.merge(
+            qc[["path", "ladder_deviation", "ladder_qc"]], on="path"
+        )
+    if peaks:
+        peaks = pd.concat(peaks).sort_values(
+            "file_name", kind="stable", ignore_index=True
+        )
+    else:
+        peaks = pd.DataFrame()
+
+    if store is not None:
+        store.append_tables(tables)
+
+    if plate_report is not None:
+        from fragment_analyzer.reports.plate_report import save_plate_report
+
+        save_plate_report(report_datas, plate_report, summary=summary, workers=workers)
+
+    return peaks, summary
+
+
+def _plate_qc(
+    files: list,
+    analyse,
+    min_correlation: float,
+    seed_tolerance: float,
+    verbose: bool,
+) -> tuple:
+    """
+    Analyses all files, then analyses the files with a failed, weak or
+    outlier ladder again with the plate consensus as seed. A rerun replaces
+    the first result if its ladder deviates less from the consensus and its
+    correlation is at least min_correlation or higher than before.
+
+    Returns:
+        A tuple of (results, qc), see plate_ladder_qc.
+    """
+    from fragment_analyzer.plate_calibration import ladder_deviation, plate_ladder_qc
+
+    # keyed by path, as files of different folders can share a name
+    results = {x["path"]: x for x in analyse(files)}
+    consensus, tolerance, qc = plate_ladder_qc(list(results.values()), min_correlation)
+    qc = qc.set_index("path")
+
+    rerun = [x for x in files if qc.loc[str(x), "ladder_qc"] != "ok"]
+    if consensus is None or not rerun:
+        return list(results.values()), qc.reset_index()
+
+    if seed_tolerance is None:
+        seed_tolerance = tolerance
+
+    if verbose:
+        print(
+            f"Mapping {len(rerun)} ladders again, seeded with the plate consensus "
+            f"(tolerance {seed_tolerance:.1f} steps)"
+        )
+
+    for result in analyse(rerun, seed=consensus, seed_tolerance=seed_tolerance):
+        path = result["path"]
+        if result["ladder_peaks"] is None:
+            continue
+
+        previous = results[path]["ladder_correlation"]
+        deviation = ladder_deviation(result["ladder_peaks"], consensus)[0]
+        # an outlier can have a high correlation with the wrong peaks, the
+        # seeded ladder is kept if it fits the consensus better and is good
+        # enough
+        if deviation >= qc.loc[path, "ladder_deviation"]:
+            continue
+        if (
+            previous is not None
+            and result["ladder_correlation"] < min_correlation
+            and result["ladder_correlation"] <= previous
+        ):
+            continue
+
+        results[path] = result
+        qc.loc[path, "ladder_correlation"] = result["ladder_correlation"]
+        qc.loc[path, "ladder_deviation"] = deviation
+        qc.loc[path, "ladder_qc"] = "rescued"
+
+    if verbose:
+        print(
+            "Plate ladder QC: "
+            + ", ".join(f"{k} {v}" for k, v in qc["ladder_qc"].value_counts().items())
+        )
+
+    return list(results.values()), qc.reset_index()
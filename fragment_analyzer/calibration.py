@@ -0,0 +1,126 @@
+"""
+Step to basepair calibration from the assigned ladder peaks.
+
+Methods:
+    linear: Least squares line through all ladder peaks.
+    piecewise: Linear interpolation between neighbouring ladder peaks.
+    local_southern: The local Southern method. Between two ladder peaks the
+        basepairs are the mean of the two Southern curves
+        L = c / (m - m0) + L0 fitted exactly through the three ladder peaks
+        (i - 1, i, i + 1) and (i, i + 1, i + 2).
+
+Outside the ladder, piecewise and local_southern continue linearly from the
+outermost ladder peak with the slope of the linear fit.
+"""
+
+import numpy as np
+
+CALIBRATION_METHODS = ["linear", "piecewise", "local_southern"]
+
+
+def southern_coefficients(steps: np.ndarray, basepairs: np.ndarray) -> np.ndarray:
+    """
+    Coefficients (c, m0, L0) of the Southern curves through every three
+    consecutive points, as an array of shape (len(steps) - 2, 3).
+    Rows of (nearly) collinear points, which have no Southern curve, are NaN.
+    """
+    m = np.lib.stride_tricks.sliding_window_view(steps, 3)
+    L = np.lib.stride_tricks.sliding_window_view(basepairs, 3)
+
+    # L * m = m0 * L + L0 * m + k, with k = c - L0 * m0
+    system = np.stack([L, m, np.ones_like(m)], axis=-1)
+    degenerate = np.linalg.cond(system) > 1e12
+    system[degenerate] = np.eye(3)
+
+    m0, L0, k = np.linalg.solve(system, (L * m)[..., None])[..., 0].T
+    coefficients = np.stack([k + L0 * m0, m0, L0], axis=-1)
+    coefficients[degenerate] = np.nan
+
+    return coefficients
+
+
+class SizeCalibration:
+    """
+    Converts steps (time) to basepairs with vectorized NumPy.
+
+    Example usage:
+    calibration = SizeCalibration(best_correlated_peaks, ladder, "local_southern")
+    basepairs = calibration.predict(np.arange(trace_length))
+    """
+
+    def __init__(
+        self, steps: np.ndarray, basepairs: np.ndarray, method: str = "linear"
+    ) -> None:
+        if method not in CALIBRATION_METHODS:
+            raise NotImplementedError(
+                f"{method} is not implemented! Options: [{', '.join(CALIBRATION_METHODS)}]"
+            )
+
+        self.steps = np.asarray(steps, dtype=float)
+        self.basepairs = np.asarray(basepairs, dtype=float)
+        self.method = method
+
+        self.slope, self.intercept = np.polyfit(self.steps, self.basepairs, 1)
+
+        if method == "local_southern":
+            self.southern = southern_coefficients(self.steps, self.basepairs)
+
+    @property
+    def coef_(self) -> np.ndarray:
+        return np.array([self.slope])
+
+    @property
+    def intercept_(self) -> float:
+        return self.intercept
+
+    def _local_southern(self, steps: np.ndarray) -> np.ndarray:
+        n_curves = self.southern.shape[0]
+
+        # interval i lies between ladder peak i and i + 1
+        interval = np.clip(
+            np.searchsorted(self.steps, steps, side="right") - 1,
+            0,
+            self.steps.size - 2,
+        )
+
+        # collinear ladder peaks have no Southern curve, they lie on a line
+        piecewise = np.interp(steps, self.steps, self.basepairs)
+
+        predictions = []
+        available = []
+        for curve in (interval - 1, interval):
+            valid = (curve >= 0) & (curve < n_curves)
+            c, m0, L0 = self.southern[np.clip(curve, 0, n_curves - 1)].T
+            with np.errstate(divide="ignore", invalid="ignore"):
+                southern = np.where(np.isnan(c), piecewise, c / (steps - m0) + L0)
+            predictions.append(np.where(valid, southern, 0.0))
+            available.append(valid.astype(int))
+
+        return (predictions[0] + predictions[1]) / (available[0] + available[1])
+
+    def predict(self, steps: np.ndarray) -> np.ndarray:
+        """
+        Basepairs of steps. Accepts arrays of any shape, e.g. (n, 1) as
+        with scikit-learn, and returns a 1-D array.
+        """
+        steps = np.asarray(steps, dtype=float).ravel()
+
+        if self.method == "linear":
+            return self.intercept + self.slope * steps
+
+        if self.method == "piecewise":
+            basepairs = np.interp(steps, self.steps, self.basepairs)
+        else:
+            basepairs = self._local_southern(steps)
+
+        # continue linearly outside of the ladder
+        before = steps < self.steps[0]
+        after = steps > self.steps[-1]
+        basepairs[before] = self.basepairs[0] + self.slope * (
+            steps[before] - self.steps[0]
+        )
+        basepairs[after] = self.basepairs[-1] + self.slope * (
+            steps[after] - self.steps[-1]
+        )
+
+        return basepairs
@@ -0,0 +1,163 @@
+"""
+Persistent on-disk cache of ladder calibrations.
+
+An entry is keyed on a content hash of the .fsa file together with the
+parameters that influence the ladder mapping, so re-running an analysis with
+other PeakArea parameters skips the ladder search entirely.
+
+The cache may be shared by many processes, which read, write and evict
+entries concurrently. A failing cache never fails an analysis: an entry that
+cannot be read is a miss and an entry that cannot be written is a warning.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger("fragment_analyzer")
+
+
+class CalibrationCache:
+    """
+    Size-bounded least recently used cache of ladder calibrations.
+
+    Every entry is stored as one .npz file in folder. The modification time of
+    an entry is refreshed when it is read, and the least recently used entries
+    are removed when more than max_entries are stored, down to evict_fraction
+    of max_entries, so the folder is only listed every few puts.
+
+    Example usage:
+    cache = CalibrationCache("~/.cache/fragment_analyzer")
+    laddermap = LadderMap(data, "LIZ", cache=cache)
+    """
+
+    def __init__(
+        self,
+        folder: str = "~/.cache/fragment_analyzer/calibrations",
+        max_entries: int = 10_000,
+        evict_fraction: float = 0.9,
+    ) -> None:
+        self.folder = Path(folder).expanduser()
+        self.max_entries = max_entries
+        self.evict_fraction = evict_fraction
+        self.folder.mkdir(parents=True, exist_ok=True)
+        # estimated number of entries, counted on the first put
+        self._entries = None
+
+    @staticmethod
+    def key(file: str, **parameters) -> str:
+        """
+        Content hash of file combined with the (json serializable) parameters.
+        """
+        digest = hashlib.sha256()
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+
+        digest.update(json.dumps(parameters, sort_keys=True).encode())
+
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.folder / f"{key}.npz"
+
+    def get(self, key: str):
+        """
+        Returns the stored arrays as a dict, or None if key is not cached. An
+        entry that cannot be read (e.g. a truncated file) is removed.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                values = {name: entry[name] for name in entry.files}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                pass
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another process in the meantime
+            pass
+
+        return values
+
+    def put(self, key: str, **values) -> None:
+        """
+        Stores the arrays in values under key and evicts old entries. Logs a
+        warning instead of raising if the entry cannot be written.
+        """
+        tmp = None
+        try:
+            # write to a temporary file first, so parallel readers never see
+            # half an entry
+            fd, tmp = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **values)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            logger.warning(
+                "Could not write to the calibration cache %s: %s", self.folder, e
+            )
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+            return
+
+        if self._entries is None:
+            self._entries = len(self)
+        else:
+            self._entries += 1
+
+        if self._entries > self.max_entries:
+            self.evict()
+
+    def _mtimes(self) -> list:
+        # (modification time, path) of every entry, skipping the ones that
+        # other processes remove while the folder is listed
+        mtimes = []
+        for entry in self.folder.glob("*.npz"):
+            try:
+                mtimes.append((entry.stat().st_mtime, entry))
+            except FileNotFoundError:
+                pass
+
+        return mtimes
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries if more than max_entries are
+        stored, down to evict_fraction of max_entries.
+        """
+        try:
+            entries = self._mtimes()
+            self._entries = len(entries)
+            if len(entries) <= self.max_entries:
+                return
+
+            entries.sort()
+            keep = int(self.max_entries * self.evict_fraction)
+            for _, entry in entries[: len(entries) - keep]:
+                entry.unlink(missing_ok=True)
+            self._entries = keep
+        except OSError as e:
+            logger.warning(
+                "Could not evict from the calibration cache %s: %s", self.folder, e
+            )
+
+    def clear(self) -> None:
+        for entry in self.folder.glob("*.npz"):
+            entry.unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.folder.glob("*.npz"))
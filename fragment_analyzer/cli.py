@@ -0,0 +1,259 @@
+"""
+Command line interface.
+
+Example usage:
+fragment-analyzer batch demo/4062_Dx --ladder LIZ --model gauss --workers 8 --output peaks.csv
+fragment-analyzer watch /data/sequencer --ladder LIZ --model gauss --workers 2
+fragment-analyzer batch demo/4062_Dx --ladder-file GS500.json --model gauss
+"""
+
+import argparse
+
+from fragment_analyzer.calibration import CALIBRATION_METHODS
+from fragment_analyzer.calibration_cache import CalibrationCache
+
+
+def add_analysis_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--ladder", default="LIZ", help="Ladder name [LIZ]")
+    parser.add_argument(
+        "--ladder-file",
+        default=None,
+        help="Load a custom ladder from this .json or sizes file, used instead of --ladder",
+    )
+    parser.add_argument(
+        "--ladder-channel",
+        default=None,
+        help="Channel of the ladder in --ladder-file, e.g. DATA105",
+    )
+    parser.add_argument(
+        "--model", default="gauss", help="Model for the peak areas [gauss]"
+    )
+    parser.add_argument("--channel", default="DATA1", help="Sample channel [DATA1]")
+    parser.add_argument(
+        "--min-ratio", type=float, default=0.2, help="Minimum peak ratio [0.2]"
+    )
+    parser.add_argument(
+        "--normalize-peaks",
+        action="store_true",
+        help="Baseline correct the traces with arPLS",
+    )
+    parser.add_argument(
+        "--calibration",
+        default="linear",
+        choices=CALIBRATION_METHODS,
+        help="Step to basepair calibration [linear]",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of processes [all CPUs]"
+    )
+    parser.add_argument(
+        "--report-folder", default=None, help="Save an HTML report per file here"
+    )
+    parser.add_argument(
+        "--store",
+        default=None,
+        help="Append the results to a Parquet results store in this folder",
+    )
+    parser.add_argument(
+        "--cache-folder",
+        default=None,
+        help="Cache the ladder calibrations in this folder",
+    )
+    parser.add_argument(
+        "--auto-thresholds",
+        action="store_true",
+        help="Derive the ladder and sample peak heights from the noise of every trace",
+    )
+    parser.add_argument(
+        "--min-height",
+        type=float,
+        default=100,
+        help="With --auto-thresholds, ladder peaks are at least this high [100]",
+    )
+    parser.add_argument(
+        "--min-peak-height",
+        type=float,
+        default=500,
+        help="With --auto-thresholds, sample peaks are at least this high [500]",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="Write the runtime of every analysis stage to this JSON lines file "
+        "(batch replaces it, watch appends to it)",
+    )
+    parser.add_argument(
+        "--metrics-memory",
+        action="store_true",
+        help="With --metrics, also record the peak memory of every stage (slower)",
+    )
+
+
+def ladder_argument(args: argparse.Namespace):
+    """
+    The ladder name of --ladder, or the LadderTemplate loaded from --ladder-file.
+    A template is passed on as is, so that it also reaches the worker processes.
+    """
+    if args.ladder_file is None:
+        return args.ladder
+
+    from fragment_analyzer.ladders.ladders import LADDER_REGISTRY
+
+    return LADDER_REGISTRY.load(args.ladder_file, channel=args.ladder_channel)
+
+
+def auto_thresholds(args: argparse.Namespace) -> dict:
+    """
+    The height of LadderMap and the peak_height of PeakArea of --auto-thresholds,
+    with the floors --min-height and --min-peak-height.
+    """
+    if not args.auto_thresholds:
+        return {}
+
+    return {
+        "height": "auto",
+        "peak_height": "auto",
+        "min_height": args.min_height,
+        "min_peak_height": args.min_peak_height,
+    }
+
+
+def batch(args: argparse.Namespace) -> None:
+    # imported here, so that --help does not wait for scipy and pandas
+    from fragment_analyzer.batch import batch_analysis
+    from fragment_analyzer.results_store import ResultsStore
+
+    cache = CalibrationCache(args.cache_folder) if args.cache_folder else None
+    store = ResultsStore(args.store) if args.store else None
+    _, summary = batch_analysis(
+        args.path,
+        ladder=ladder_argument(args),
+        model=args.model,
+        channel=args.channel,
+        min_ratio=args.min_ratio,
+        normalize_peaks=args.normalize_peaks,
+        calibration_method=args.calibration,
+        workers=args.workers,
+        report_folder=args.report_folder,
+        plate_report=args.plate_report,
+        plate_qc=args.plate_qc,
+        min_correlation=args.min_correlation,
+        output=args.output,
+        store=store,
+        metrics=args.metrics,
+        metrics_memory=args.metrics_memory,
+        cache=cache,
+        **auto_thresholds(args),
+    )
+
+    if args.summary is not None:
+        summary.to_csv(args.summary, index=False)
+
+
+def watch(args: argparse.Namespace) -> None:
+    from fragment_analyzer.results_store import ResultsStore
+    from fragment_analyzer.watch import FolderWatcher
+
+    cache = CalibrationCache(args.cache_folder) if args.cache_folder else None
+    store = ResultsStore(args.store) if args.store else None
+    watcher = FolderWatcher(
+        args.path,
+        ladder=ladder_argument(args),
+        model=args.model,
+        channel=args.channel,
+        min_ratio=args.min_ratio,
+        normalize_peaks=args.normalize_peaks,
+        calibration_method=args.calibration,
+        workers=args.workers,
+        report_folder=args.report_folder,
+        output=args.output,
+        summary=args.summary,
+        interval=args.interval,
+        settle=args.settle,
+        recursive=args.recursive,
+        store=store,
+        metrics=args.metrics,
+        metrics_memory=args.metrics_memory,
+        cache=cache,
+        **auto_thresholds(args),
+    )
+    watcher.run(idle_timeout=args.idle_timeout)
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="fragment-analyzer", description="Fragment Analysis in python!"
+    )
+    subparsers = parser.add_subparsers(required=True)
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Analyse a folder or glob of .fsa files in parallel"
+    )
+    batch_parser.add_argument("path", help="Folder, glob pattern or .fsa file")
+    add_analysis_arguments(batch_parser)
+    batch_parser.add_argument(
+        "--output", default="peaks.csv", help="Combined peak table [peaks.csv]"
+    )
+    batch_parser.add_argument(
+        "--summary", default=None, help="Save the status and runtime of every file"
+    )
+    batch_parser.add_argument(
+        "--plate-report",
+        default=None,
+        help="Save one HTML report of all files to this path",
+    )
+    batch_parser.add_argument(
+        "--plate-qc",
+        action="store_true",
+        help="Compare the ladders of all files and map failed or outlier ladders "
+        "again, seeded with the plate consensus",
+    )
+    batch_parser.add_argument(
+        "--min-correlation",
+        type=float,
+        default=0.99,
+        help="With --plate-qc, ladders below this correlation are mapped again [0.99]",
+    )
+    batch_parser.set_defaults(func=batch)
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="Analyse new .fsa files in a folder as they are written"
+    )
+    watch_parser.add_argument("path", help="Folder to watch")
+    add_analysis_arguments(watch_parser)
+    watch_parser.add_argument(
+        "--output",
+        default="peaks.csv",
+        help="Peak tables are appended here [peaks.csv]",
+    )
+    watch_parser.add_argument(
+        "--summary",
+        default="summary.csv",
+        help="Status of every file is appended here, files in it are skipped [summary.csv]",
+    )
+    watch_parser.add_argument(
+        "--interval", type=float, default=2.0, help="Seconds between scans [2]"
+    )
+    watch_parser.add_argument(
+        "--settle",
+        type=float,
+        default=5.0,
+        help="Seconds a file must be unchanged before it is analysed [5]",
+    )
+    watch_parser.add_argument(
+        "--recursive", action="store_true", help="Also watch the subfolders"
+    )
+    watch_parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="Stop after this many seconds without new files [run until Ctrl+C]",
+    )
+    watch_parser.set_defaults(func=watch)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
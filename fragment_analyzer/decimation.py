@@ -0,0 +1,126 @@
+"""
+Peak preserving decimation of traces for plotting.
+
+A trace has tens of thousands of points, far more than the pixels of a plot.
+The decimation keeps:
+    minmax: the minimum and maximum of y in equally sized bins, so every peak
+        and dip is drawn at its true height.
+    lttb: the point of every bin that spans the largest triangle with its
+        neighbours (Largest-Triangle-Three-Buckets), which follows the shape
+        of the trace more closely for the same number of points.
+
+Points given as keep (e.g. around the detected peaks) and the global minimum
+and maximum are always kept, so the trace stays at full resolution where it
+matters and its range is drawn with either method.
+"""
+
+import numpy as np
+
+DECIMATION_METHODS = ["minmax", "lttb"]
+
+
+def minmax_indices(y: np.ndarray, n_bins: int) -> np.ndarray:
+    """
+    Sorted indices of the minimum and maximum of y in n_bins equally sized bins.
+    """
+    y = np.asarray(y)
+    n_bins = max(min(n_bins, y.size), 1)
+    bin_size = -(-y.size // n_bins)
+    n_bins = -(-y.size // bin_size)
+
+    # pad the last bin with the last value
+    padded = np.empty(n_bins * bin_size, dtype=float)
+    padded[: y.size] = y
+    padded[y.size :] = y[-1]
+    padded = padded.reshape(n_bins, bin_size)
+
+    offsets = np.arange(n_bins) * bin_size
+    keep = np.stack([padded.argmin(axis=1), padded.argmax(axis=1)], axis=1)
+
+    return np.unique(np.clip(keep + offsets[:, None], 0, y.size - 1))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Sorted indices of the n_out points selected by Largest-Triangle-Three-Buckets.
+    The first and the last point are always selected.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if n_out >= x.size or n_out < 3:
+        return np.arange(x.size)
+
+    # the inner points are split into n_out - 2 buckets
+    edges = np.linspace(1, x.size - 1, n_out - 1).astype(int)
+    # the mean of every bucket, and of the last point as the bucket after the last
+    sums_x = np.add.reduceat(x[1:-1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:-1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1])
+    mean_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = x.size - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # twice the area of the triangles (previous, point, next bucket mean)
+        area = np.abs(
+            (x[previous] - mean_x[i + 1]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (mean_y[i + 1] - y[previous])
+        )
+        previous = start + int(area.argmax())
+        selected[i + 1] = previous
+
+    return selected
+
+
+def peak_neighbourhood(size: int, peaks: np.ndarray, radius: int) -> np.ndarray:
+    """
+    Sorted indices within radius of peaks in a trace of length size.
+    """
+    peaks = np.asarray(peaks, dtype=int).ravel()
+    if peaks.size == 0:
+        return peaks
+
+    indices = peaks[:, None] + np.arange(-radius, radius + 1)[None, :]
+
+    return np.unique(np.clip(indices, 0, size - 1))
+
+
+def decimate(
+    x: np.ndarray,
+    y: np.ndarray,
+    max_points: int = None,
+    method: str = "minmax",
+    keep: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Sorted indices of at most about max_points points of (x, y), plus the
+    indices in keep and of the minimum and the maximum of y.
+
+    Args:
+        x, y: The trace.
+        max_points: Number of points of the decimated trace, None keeps all.
+        method: minmax or lttb.
+        keep: Indices that are always kept, e.g. peak_neighbourhood.
+    """
+    if method not in DECIMATION_METHODS:
+        raise NotImplementedError(
+            f"{method} is not implemented! Options: [{', '.join(DECIMATION_METHODS)}]"
+        )
+
+    y = np.asarray(y)
+    keep = np.empty(0, dtype=int) if keep is None else np.asarray(keep, dtype=int)
+    if max_points is None or y.size <= max_points:
+        return np.arange(y.size)
+
+    keep = np.union1d(keep, [y.argmin(), y.argmax()])
+    budget = max(max_points - keep.size, 3)
+    if method == "minmax":
+        indices = minmax_indices(y, budget // 2)
+    else:
+        indices = lttb_indices(x, y, budget)
+
+    return np.union1d(indices, keep)
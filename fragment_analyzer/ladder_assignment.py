@@ -0,0 +1,224 @@
+"""
+Dynamic programming assignment of sample peaks to ladder (size-standard) peaks.
+
+The exhaustive search in `LadderMap.generate_combinations` enumerates every
+path through the peak graph, which grows exponentially with the number of
+peaks. Here the assignment is solved as a second order Viterbi recursion:
+the state is the pair of peaks assigned to two consecutive ladder steps and
+the cost is the change in slope (steps per basepair) between consecutive
+ladder intervals, i.e. the local linearity of the mapping.
+
+Every end state gives one candidate assignment. The candidates are scored by
+Pearson correlation with the ladder, and the best one is polished by single
+peak swaps while the correlation improves.
+
+Runtime is O(ladder_size * peak_count ** 3) and memory
+O(ladder_size * peak_count ** 2).
+
+The peak graph itself is a band: the peaks are sorted, so the peaks within
+max_diff after a peak are a contiguous range. peak_adjacency builds it as
+CSR arrays with searchsorted and adjacency_paths enumerates its paths.
+"""
+
+import numpy as np
+
+from .ladders.ladders import LadderTemplate
+
+
+def pearson_correlation(candidates: np.ndarray, ladder: np.ndarray) -> np.ndarray:
+    """
+    Pearson correlation of each row in candidates with the ladder. With a
+    LadderTemplate this is a dot product with its precomputed normalized sizes.
+    """
+    if isinstance(ladder, LadderTemplate):
+        return ladder.correlation(candidates)
+
+    candidates = np.atleast_2d(candidates).astype(float)
+    ladder = np.asarray(ladder, dtype=float)
+
+    x = candidates - candidates.mean(axis=1, keepdims=True)
+    y = ladder - ladder.mean()
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (x @ y) / (np.linalg.norm(x, axis=1) * np.linalg.norm(y))
+
+
+def peak_adjacency(peaks: np.ndarray, max_diff: float) -> tuple:
+    """
+    Edges from every peak to the later peaks at most max_diff away, as CSR
+    arrays (indptr, indices): the edges of peak i go to the peak indices
+    indices[indptr[i]:indptr[i + 1]].
+    """
+    peaks = np.asarray(peaks)
+    n = peaks.size
+    first = np.arange(1, n + 1)
+    last = np.maximum(np.searchsorted(peaks, peaks + max_diff, side="right"), first)
+
+    counts = last - first
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    indices = np.arange(indptr[-1]) - np.repeat(indptr[:-1] - first, counts)
+
+    return indptr, indices
+
+
+def adjacency_paths(indptr: np.ndarray, indices: np.ndarray):
+    """
+    Lazily yields every path (as a list of peak indices) from a peak without
+    incoming edges to a peak without outgoing edges, depth first.
+    """
+    n = indptr.size - 1
+    has_incoming = np.zeros(n, dtype=bool)
+    has_incoming[indices] = True
+
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+
+    for start in np.flatnonzero(~has_incoming).tolist():
+        # stack[k]: position of the next edge to follow from path[k]
+        path = [start]
+        stack = [indptr[start]]
+        while stack:
+            node = path[-1]
+            position = stack[-1]
+            if position == indptr[node + 1]:
+                if position == indptr[node] and len(path) > 1:
+                    yield list(path)
+                path.pop()
+                stack.pop()
+                continue
+
+            stack[-1] += 1
+            path.append(indices[position])
+            stack.append(indptr[indices[position]])
+
+
+def _viterbi_candidates(
+    peaks: np.ndarray, ladder: LadderTemplate, max_diff: float
+) -> np.ndarray:
+    """
+    Returns the most locally linear assignment (as peak indices) for every
+    valid pair of peaks assigned to the last two ladder steps.
+    """
+    n_peaks = peaks.size
+    ladder_size = ladder.size
+
+    diff = peaks[None, :] - peaks[:, None]
+    allowed = (diff > 0) & (diff <= max_diff)
+    transition = np.where(allowed, 0.0, np.inf)
+    ladder_diff = ladder.spacing
+
+    # cost[k, j]: the previous ladder step is at peak k, the current at peak j
+    cost = transition.copy()
+    backpointers = np.empty((ladder_size, n_peaks, n_peaks), dtype=np.intp)
+
+    for i in range(2, ladder_size):
+        slope_before = (diff / ladder_diff[i - 2])[:, :, None]
+        slope_after = (diff / ladder_diff[i - 1])[None, :, :]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            penalty = ((slope_after - slope_before) / (slope_after + slope_before)) ** 2
+        penalty[np.isnan(penalty)] = np.inf
+
+        step_cost = cost[:, :, None] + penalty + transition[None, :, :]
+        backpointers[i] = step_cost.argmin(axis=0)
+        cost = np.take_along_axis(step_cost, backpointers[i][None], axis=0)[0]
+
+    last, current = np.nonzero(np.isfinite(cost))
+
+    assignment = np.empty((last.size, ladder_size), dtype=np.intp)
+    assignment[:, -1] = current
+    assignment[:, -2] = last
+    for i in range(ladder_size - 1, 1, -1):
+        assignment[:, i - 2] = backpointers[i][assignment[:, i - 1], assignment[:, i]]
+
+    return assignment
+
+
+def _polish(
+    peaks: np.ndarray,
+    ladder: LadderTemplate,
+    max_diff: float,
+    assignment: np.ndarray,
+    correlation: float,
+) -> tuple:
+    """
+    Swaps single peaks of the assignment while the correlation improves.
+    """
+    ladder_size = ladder.size
+    improved = True
+    swaps = 0
+
+    while improved:
+        improved = False
+        for i in range(ladder_size):
+            low = assignment[i - 1] + 1 if i > 0 else 0
+            high = assignment[i + 1] if i < ladder_size - 1 else peaks.size
+
+            options = np.arange(low, high)
+            options = options[options != assignment[i]]
+            if i > 0:
+                options = options[peaks[options] - peaks[assignment[i - 1]] <= max_diff]
+            if i < ladder_size - 1:
+                options = options[peaks[assignment[i + 1]] - peaks[options] <= max_diff]
+            if options.size == 0:
+                continue
+
+            trials = np.repeat(assignment[None, :], options.size, axis=0)
+            trials[:, i] = options
+            trial_correlation = pearson_correlation(peaks[trials], ladder)
+            best = np.nanargmax(trial_correlation)
+
+            if trial_correlation[best] > correlation:
+                correlation = trial_correlation[best]
+                assignment = trials[best]
+                improved = True
+                swaps += 1
+
+    return assignment, correlation, swaps
+
+
+def dp_ladder_assignment(
+    peaks: np.ndarray, ladder: np.ndarray, max_diff: float, full_output=False
+) -> tuple:
+    """
+    Assigns one peak to every ladder step using dynamic programming.
+
+    Args:
+        peaks: Sorted positions (steps) of the candidate ladder peaks.
+        ladder: Basepair sizes of the ladder, or a LadderTemplate.
+        max_diff: Maximum allowed distance between two consecutive assigned peaks.
+        full_output: Also return a dict with the number of candidate
+            assignments and of polishing swaps.
+
+    Returns:
+        A tuple of (best_correlated_peaks, best_correlation), or
+        (best_correlated_peaks, best_correlation, info) if full_output.
+    """
+    peaks = np.asarray(peaks)
+    if not isinstance(ladder, LadderTemplate):
+        ladder = LadderTemplate("ladder", ladder)
+
+    if peaks.size < ladder.size:
+        raise ValueError(
+            f"Found {peaks.size} peaks, but the ladder has {ladder.size} steps."
+        )
+
+    assignment = _viterbi_candidates(peaks.astype(float), ladder, max_diff)
+    if assignment.shape[0] == 0:
+        raise ValueError(
+            f"No combination of peaks with a maximum distance of {max_diff} "
+            "matches the ladder."
+        )
+
+    correlation = pearson_correlation(peaks[assignment], ladder)
+    best = np.nanargmax(correlation)
+
+    best_assignment, best_correlation, swaps = _polish(
+        peaks, ladder, max_diff, assignment[best], correlation[best]
+    )
+
+    if full_output:
+        info = {"candidates": assignment.shape[0], "swaps": swaps}
+        return peaks[best_assignment], float(best_correlation), info
+
+    return peaks[best_assignment], float(best_correlation)
@@ -1,14 +1,29 @@
-import matplotlib.pyplot as plt
+import logging
+import time
 import pandas as pd
 import numpy as np
-import networkx as nx
-from scipy import stats, signal
-from Bio import SeqIO
-from sklearn.linear_model import LinearRegression
+from scipy import signal
 from pathlib import Path
+from itertools import islice
 
-from .ladders.ladders import LADDERS, CHANNELS
+from .ladders.ladders import LADDER_REGISTRY
 from .baseline_removal import baseline_arPLS
+from .ladder_assignment import (
+    adjacency_paths,
+    dp_ladder_assignment,
+    pearson_correlation,
+    peak_adjacency,
+)
+from .calibration import SizeCalibration
+from .calibration_cache import CalibrationCache
+from .abif import AbifReader
+from .shared_traces import TraceHandle
+from .metrics import get_metrics
+from .noise import noise_threshold, prune_weak_peaks
+from .plate_calibration import align_consensus
+from . import plotting
+
+logger = logging.getLogger("fragment_analyzer")
 
 
 class LadderMap:
@@ -21,160 +36,441 @@ class LadderMap:
         distance: int = 30,
         height: int = 100,
         max_diff_coefficient: float = 1.5,
+        method: str = "dp",
+        cache: CalibrationCache = None,
+        calibration_method: str = "linear",
+        metrics=None,
+        max_candidates: int = 250_000,
+        time_limit: float = None,
+        seed: np.ndarray = None,
+        seed_tolerance: float = 50,
+        noise_k: float = 5.0,
+        min_height: float = 100,
     ) -> None:
-        self.channel = CHANNELS[ladder]
-        self.data_ = Path(data_)
-        self.data = SeqIO.read(data_, "abi").annotations["abif_raw"]
-        self.ladder = LADDERS[ladder]
+        if method not in ("dp", "graph"):
+            raise NotImplementedError(
+                f"{method} is not implemented! Options: [dp, graph]"
+            )
+
+        # a registered ladder name or a LadderTemplate
+        self.template = LADDER_REGISTRY.get(ladder)
+        self.channel = self.template.channel
+        if self.channel is None:
+            raise ValueError(
+                f"Ladder {self.template.name} has no channel, e.g. "
+                f'LadderTemplate("{self.template.name}", sizes, channel="DATA205")'
+            )
+        # a file, or a TraceHandle of its channels in shared memory
+        self.data_ = data_.path if isinstance(data_, TraceHandle) else Path(data_)
+        # per stage wall time and counters, see fragment_analyzer.metrics
+        self.metrics = get_metrics(metrics, self.data_.name)
+
+        with self.metrics.stage("read"):
+            if isinstance(data_, TraceHandle):
+                # copied, so the block is unmapped in a worker right away
+                with data_.open() as traces:
+                    self.data = {k: np.array(v) for k, v in traces.items()}
+            else:
+                self.data = AbifReader(data_)
+        if self.channel not in self.data:
+            raise ValueError(
+                f"{self.data_.name} has no channel {self.channel} for ladder "
+                f"{self.template.name}"
+            )
+        self.ladder = self.template.sizes
         self.normalize_peaks = normalize_peaks
 
-        if self.normalize_peaks:
-            self.sample_ladder = np.array(baseline_arPLS(self.data[self.channel]))
-        else:
-            self.sample_ladder = np.array(self.data[self.channel])
+        # per channel intensities and the basepair axis, computed once
+        self._intensities = {}
+        self._basepairs = None
+        self._adjacency = None
+        self._graph = None
+        # the assigned peaks next to the ladder sizes, once they are mapped
+        self.correlation_dataframe = None
+
+        self.sample_ladder = self.channel_intensity(self.channel)
 
         self.max_peak_count = max_peak_count
         self.distance = distance
+        # a fixed height, or "auto" for min_height within the span of the
+        # ladder and a threshold of noise_k robust standard deviations above
+        # the rolling noise floor outside of it, see get_peaks
         self.height = height
-        self.peaks = self.get_peaks()
+        self.noise_k = noise_k
+        self.min_height = min_height
+        self.method = method
+        self.max_diff_coefficient = max_diff_coefficient
+        self.calibration_method = calibration_method
+        # budget of the graph search, see best_ladder_peak_correlation
+        self.max_candidates = max_candidates
+        self.time_limit = time_limit
+        self.fallback = False
+        # expected steps of the ladder peaks, e.g. from the other samples of
+        # the plate, see fragment_analyzer.plate_calibration
+        self.seed = None if seed is None else np.asarray(seed, dtype=float)
+        self.seed_tolerance = seed_tolerance
+
+        if cache is not None:
+            key = cache.key(
+                self.data_,
+                ladder=self.template.name,
+                ladder_sizes=self.ladder.tolist(),
+                normalize_peaks=normalize_peaks,
+                max_peak_count=max_peak_count,
+                distance=distance,
+                height=height,
+                max_diff_coefficient=max_diff_coefficient,
+                method=method,
+                **(
+                    dict(max_candidates=max_candidates, time_limit=time_limit)
+                    if method == "graph"
+                    else {}
+                ),
+                **(
+                    dict(noise_k=noise_k, min_height=min_height)
+                    if height == "auto"
+                    else {}
+                ),
+                **(
+                    dict(seed=self.seed.tolist(), seed_tolerance=seed_tolerance)
+                    if seed is not None
+                    else {}
+                ),
+            )
+            with self.metrics.stage("cache"):
+                cached = cache.get(key)
+                if cached is not None:
+                    try:
+                        self._restore_calibration(cached)
+                    except (KeyError, ValueError, IndexError):
+                        # an incomplete entry, e.g. of an older version, is a miss
+                        cached = None
+            self.metrics.count("cache", hit=cached is not None)
+        else:
+            cached = None
+
+        if cached is None:
+            with self.metrics.stage("get_peaks"):
+                self.peaks = self.get_peaks()
+            self.metrics.count("get_peaks", peaks=self.peaks.size)
+            self.set_max_diff()
+
+            with self.metrics.stage("ladder_assignment"):
+                self.best_ladder_peak_correlation()
+
+            if cache is not None:
+                cache.put(key, **self._calibration())
+
+        with self.metrics.stage("calibration"):
+            self.fit_calibration()
+
+    def set_max_diff(self):
+        """
+        The longest edge of the peak graph, from the spacing of the peaks.
+        """
         self.max_diff = np.min(
-            [np.diff(self.peaks).max() * max_diff_coefficient, 300]
+            [np.diff(self.peaks).max() * self.max_diff_coefficient, 300]
         )  # max_diff can maximum be 300
-        self.graph = self.generate_graph()
-        self.best_ladder_peak_correlation()
-        self._fit_linear_model()
+
+    def _calibration(self) -> dict:
+        """
+        The results of the ladder mapping, as stored in a CalibrationCache.
+        """
+        return {
+            "peaks": self.peaks,
+            "best_correlated_peaks": self.best_correlated_peaks,
+            "best_correlation": np.array(self.best_correlation),
+            "fallback": np.array(self.fallback),
+        }
+
+    def _restore_calibration(self, cached: dict):
+        self.peaks = cached["peaks"]
+        self.set_max_diff()
+        self.best_correlated_peaks = cached["best_correlated_peaks"]
+        self.best_correlation = float(cached["best_correlation"])
+        self.fallback = bool(cached["fallback"]) if "fallback" in cached else False
+        self._set_correlation_dataframe()
 
     def get_peaks(self) -> np.array:
+        """
+        The max_peak_count highest peaks after the highest (primer) peak or,
+        with a seed, the highest peaks within seed_tolerance steps of the
+        expected ladder peaks, after aligning them to the peaks of the sample
+        (see plate_calibration.align_consensus).
+
+        With height="auto" the peaks must be higher than min_height; outside
+        the span the ladder could occupy they must also rise noise_k robust
+        standard deviations above the noise floor and not be too low to be
+        ladder peaks (see noise.prune_weak_peaks). They are removed before the
+        peak graph is built.
+        """
+        # with "auto" every peak above min_height is found, the noise
+        # threshold only prunes the ones outside the span of the ladder
+        height = self.min_height if self.height == "auto" else self.height
 
         peaks_obj = signal.find_peaks(
-            self.sample_ladder, distance=self.distance, height=self.height
+            self.sample_ladder, distance=self.distance, height=height
         )
 
         heights = peaks_obj[1]["peak_heights"]
         peaks = peaks_obj[0]
 
+        if self.height == "auto":
+            threshold = noise_threshold(
+                self.sample_ladder, self.noise_k, min_height=self.min_height
+            )
+            keep = prune_weak_peaks(peaks, heights, threshold, self.ladder.size)
+            self.metrics.count("get_peaks", pruned=int(np.sum(~keep)))
+            peaks, heights = peaks[keep], heights[keep]
+
         df = pd.DataFrame({"peaks": peaks, "heights": heights})
-        idxmax = df["heights"].idxmax()
 
-        idxs_remove = list(range(idxmax + 1))
+        if self.seed is not None:
+            # the seed already lies after the primer peak; it is aligned to
+            # the well first, as the runs drift in start time and speed
+            seed = align_consensus(self.seed, peaks, heights, self.seed_tolerance)
+            distance = np.abs(peaks[:, None] - seed[None, :]).min(axis=1)
+            df = df[distance <= self.seed_tolerance]
+            if df.shape[0] < self.ladder.size:
+                raise ValueError(
+                    f"Found {df.shape[0]} peaks within {self.seed_tolerance} steps "
+                    f"of the seed of {self.data_.name}, but the ladder has "
+                    f"{self.ladder.size} steps."
+                )
+        else:
+            idxmax = df["heights"].idxmax()
 
-        df = df.drop(idxs_remove)
+            idxs_remove = list(range(idxmax + 1))
+
+            df = df.drop(idxs_remove)
 
         peaks_adj = df.nlargest(self.max_peak_count, ["heights"])
 
         return peaks_adj["peaks"].sort_values().to_numpy()
 
-    def generate_graph(self) -> nx.DiGraph:
-        G = nx.DiGraph()
+    @property
+    def adjacency(self) -> tuple:
+        """
+        The edges of the peak graph as CSR arrays (indptr, indices) of peak
+        indices, see peak_adjacency.
+        """
+        if self._adjacency is None:
+            self._adjacency = peak_adjacency(self.peaks, self.max_diff)
 
-        for p in self.peaks:
-            G.add_node(p)
+        return self._adjacency
 
-        i = 0
-        while i < self.peaks.size:
-            j = i + 1
-            while j < self.peaks.size:
-                diff = self.peaks[j] - self.peaks[i]
-                if diff <= self.max_diff:
-                    G.add_edge(self.peaks[i], self.peaks[j], length=diff)
-                j += 1
-            i += 1
+    @property
+    def graph(self):
+        """
+        The networkx graph of the peaks, e.g. for debugging. Only built (and
+        networkx imported) when it is used, the ladder search uses adjacency.
+        """
+        if self._graph is None:
+            self._graph = self.generate_graph()
 
-        return G
+        return self._graph
 
-    def generate_combinations(self):
-        start_nodes = [
-            node for node in self.graph.nodes if self.graph.in_degree(node) == 0
-        ]
-        end_nodes = [
-            node for node in self.graph.nodes if self.graph.out_degree(node) == 0
-        ]
+    def generate_graph(self) -> "nx.DiGraph":
+        import networkx as nx
 
-        # comment out the below code to make the algorithm work for every file... TODO later
-        # if len(start_nodes) > 1:
-        #    raise Exception("Can't generate. Too many start nodes.")
-        #
-        # if len(end_nodes) > 1:
-        #    raise Exception("Can't generate, Too many end nodes.")
+        indptr, indices = self.adjacency
+        sources = self.peaks[np.repeat(np.arange(self.peaks.size), np.diff(indptr))]
+        targets = self.peaks[indices]
 
-        # debug
-        # seems like this steps takes a long time for some samples...
-        all_paths = list(nx.all_simple_paths(self.graph, start_nodes[0], end_nodes[0]))
+        G = nx.DiGraph()
+        G.add_nodes_from(self.peaks)
+        G.add_edges_from(
+            (source, target, {"length": target - source})
+            for source, target in zip(sources, targets)
+        )
 
-        for p_arr in all_paths:
-            for i in range(0, len(p_arr) - self.ladder.size + 1):
-                yield np.array(p_arr[i : i + self.ladder.size])
+        return G
 
-    def best_ladder_peak_correlation(self):
-        result = []
-        for combination in self.generate_combinations():
-            corr_peaks = stats.pearsonr(self.ladder, combination)
+    def generate_combinations(self):
+        """
+        Yields every ladder sized window of every path through the peak graph,
+        from all start nodes (no incoming edges) to all end nodes (no outgoing
+        edges). The paths are enumerated lazily, one at a time.
+
+        Stops and sets self.fallback when more than max_candidates paths are
+        enumerated or it runs longer than time_limit seconds.
+        """
+        paths = 0
+        started = time.perf_counter()
+        try:
+            for path in adjacency_paths(*self.adjacency):
+                paths += 1
+
+                if self._search_exceeded(paths, started):
+                    self.fallback = True
+                    return
+
+                p_arr = self.peaks[path]
+                for i in range(0, len(p_arr) - self.ladder.size + 1):
+                    yield p_arr[i : i + self.ladder.size]
+        finally:
+            # also when the consumer stops early
+            self.metrics.count("ladder_assignment", paths=paths)
+
+    def _dp_ladder_assignment(self):
+        (
+            self.best_correlated_peaks,
+            self.best_correlation,
+            info,
+        ) = dp_ladder_assignment(
+            self.peaks, self.template, self.max_diff, full_output=True
+        )
+        self.metrics.count("ladder_assignment", **info)
+
+    def _search_exceeded(self, paths: int, started: float) -> bool:
+        if self.max_candidates is not None and paths > self.max_candidates:
+            return True
+        if (
+            self.time_limit is not None
+            and time.perf_counter() - started > self.time_limit
+        ):
+            return True
+
+        return False
+
+    def best_ladder_peak_correlation(self, block_size: int = 10_000):
+        """
+        Assigns the peaks to the ladder steps with the dp or graph method.
+
+        The graph search scores every window of every path through the peak
+        graph, which grows exponentially with the number of peaks. When it
+        enumerates more than max_candidates paths or runs longer than
+        time_limit seconds, the dp assignment is used instead and
+        self.fallback is set.
+        """
+        self.fallback = False
+        self.metrics.count("ladder_assignment", method=self.method)
+        if self.method == "dp":
+            self._dp_ladder_assignment()
+        else:
+            self.best_correlated_peaks = None
+            self.best_correlation = -np.inf
+
+            # score the combinations in blocks instead of one at a time
+            combinations = self.generate_combinations()
+            windows = 0
+            while True:
+                block = np.array(list(islice(combinations, block_size)))
+                if block.size == 0:
+                    break
+                windows += block.shape[0]
+
+                correlations = pearson_correlation(block, self.template)
+                best = np.nanargmax(correlations)
+                if correlations[best] > self.best_correlation:
+                    self.best_correlated_peaks = block[best]
+                    self.best_correlation = correlations[best]
+            self.metrics.count(
+                "ladder_assignment", windows=windows, fallback=self.fallback
+            )
 
-            obj = {"corr_peaks": corr_peaks.statistic, "peaks": combination}
+            if self.fallback:
+                logger.warning(
+                    "The graph search of %s exceeded its budget, "
+                    "using the dp assignment instead.",
+                    self.data_.name,
+                )
+                self._dp_ladder_assignment()
 
-            result.append(obj)
+            if self.best_correlated_peaks is None:
+                raise ValueError(
+                    f"No combination of peaks in {self.data_.name} matches the ladder."
+                )
 
-        df = pd.DataFrame(result)
-        df = df.sort_values(by="corr_peaks", ascending=False)
-        best = df.head(1)
+        self._set_correlation_dataframe()
 
-        self.best_correlated_peaks = best.peaks.squeeze()
-        self.best_correlation = best.corr_peaks.squeeze()
+    def _set_correlation_dataframe(self):
+        self.correlation_dataframe = pd.DataFrame(
+            {
+                "corr_peaks": self.best_correlation,
+                "peaks": self.best_correlated_peaks,
+                "ladder": self.ladder,
+            }
+        )
 
-        self.correlation_dataframe = best.explode("peaks").assign(ladder=self.ladder)
+    def fit_calibration(self):
+        """
+        Fits the step to basepair calibration and precomputes the basepairs of
+        every step of the trace once.
+        """
+        self.calibration = SizeCalibration(
+            self.best_correlated_peaks, self.ladder, self.calibration_method
+        )
+        self._basepairs = self.calibration.predict(np.arange(self.sample_ladder.size))
 
-    def _fit_linear_model(self):
-        self.linear_model = LinearRegression()
-        self.linear_model.fit(self.best_correlated_peaks.reshape(-1, 1), self.ladder)
+    @property
+    def linear_model(self) -> SizeCalibration:
+        # kept for code written against the former scikit-learn model
+        return self.calibration
+
+    def channel_intensity(self, channel: str = "DATA1") -> np.ndarray:
+        """
+        Intensities of channel, baseline corrected if normalize_peaks.
+        Computed once per channel and reused.
+        """
+        if channel not in self._intensities:
+            with self.metrics.stage("intensity"):
+                if self.normalize_peaks:
+                    intensity, _, info = baseline_arPLS(
+                        self.data[channel], full_output=True
+                    )
+                    self.metrics.add("intensity", baseline_iterations=info["num_iter"])
+                elif isinstance(self.data, dict):
+                    # already copied from shared memory
+                    intensity = self.data[channel]
+                else:
+                    intensity = np.array(self.data[channel])
+                self._intensities[channel] = np.asarray(intensity)
+
+        return self._intensities[channel]
+
+    def step_basepairs(self, size: int) -> np.ndarray:
+        """
+        Basepairs of the steps 0 to size - 1 predicted from the ladder.
+        Computed once and shared by all channels.
+        """
+        if self._basepairs is None or self._basepairs.size < size:
+            self._basepairs = self.calibration.predict(np.arange(size))
+
+        return self._basepairs[:size]
+
+    def adjusted_step_arrays(self, channel: str = "DATA1") -> tuple:
+        """
+        Returns the arrays (step_raw, step_adjusted, intensity) of channel,
+        where step_adjusted are the basepairs predicted from the ladder.
+        Steps before basepair 0 are removed.
+        """
+        intensity = self.channel_intensity(channel)
+        step_adjusted = self.step_basepairs(intensity.size)
+
+        keep = np.flatnonzero(step_adjusted >= 0)
+
+        return keep, step_adjusted[keep], intensity[keep]
 
     def adjusted_step_dataframe(self, channel: str = "DATA1") -> pd.DataFrame:
-        if self.normalize_peaks:
-            data = baseline_arPLS(self.data[channel])
-        else:
-            data = self.data[channel]
-
-        df = (
-            pd.DataFrame({"peaks": data})
-            .reset_index()
-            .rename(columns={"index": "step_raw"})
-            .assign(
-                step_adjusted=lambda x: self.linear_model.predict(
-                    x.step_raw.to_numpy().reshape(-1, 1)
-                )
-            )
-            .loc[lambda x: x.step_adjusted >= 0]
-        )
+        step_raw, step_adjusted, intensity = self.adjusted_step_arrays(channel)
 
-        return df
+        return pd.DataFrame(
+            {"step_raw": step_raw, "peaks": intensity, "step_adjusted": step_adjusted},
+            index=step_raw,
+        )
 
     @property
     def plot_best_sample_ladder(self):
-        fig = plt.figure(figsize=(20, 10))
-        plt.plot(self.sample_ladder)
-        plt.plot(
+        return plotting.best_sample_ladder_figure(
+            self.sample_ladder,
             self.best_correlated_peaks,
-            self.sample_ladder[self.best_correlated_peaks],
-            "o",
+            self.ladder,
+            self.best_correlation,
         )
-        plt.title(f"Correlation with Ladder: {self.best_correlation * 100: .2f}")
-
-        for peak, ladder in zip(self.best_correlated_peaks, self.ladder):
-            plt.text(peak, self.sample_ladder[peak], ladder)
-
-        plt.ylabel("intensity")
-        plt.xlabel("time")
-        plt.grid()
-        return fig
 
     @property
     def plot_ladder_correlation(self):
-        fig = plt.figure(figsize=(20, 10))
-        plt.plot(
-            self.correlation_dataframe.ladder, self.correlation_dataframe.peaks, "o"
+        return plotting.ladder_correlation_figure(
+            self.correlation_dataframe.ladder, self.correlation_dataframe.peaks
         )
-        plt.xlabel("Basepairs")
-        plt.ylabel("Time")
-        plt.grid()
-        plt.title("Correlation of found peaks with size-standard")
-
-        return fig
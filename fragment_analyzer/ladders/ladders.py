@@ -1,3 +1,6 @@
+import json
+from pathlib import Path
+
 import numpy as np
 
 LADDERS = {
@@ -67,3 +70,153 @@ LADDERS = {
 }
 
 CHANNELS = {"LIZ": "DATA205", "ROX": "DATA12"}
+
+
+class LadderTemplate:
+    """
+    A size standard with the statistics used to score candidate peaks
+    precomputed once.
+
+    Args:
+        name: Name of the ladder, e.g. "LIZ".
+        sizes: Basepair sizes of the ladder peaks, ascending.
+        channel: The ABIF channel the ladder is in, e.g. "DATA205".
+
+    Example usage:
+    template = LadderTemplate("GS500", [35, 50, 75, 100, 139, 150, 160, 200], "DATA105")
+    template.correlation(candidate_peaks)
+    """
+
+    def __init__(self, name: str, sizes, channel: str = None) -> None:
+        sizes = np.array(sizes)
+        if sizes.ndim != 1 or sizes.size < 3:
+            raise ValueError(f"Ladder {name} needs at least 3 sizes, got {sizes}")
+        if np.any(np.diff(sizes) <= 0):
+            raise ValueError(f"The sizes of ladder {name} must be ascending")
+
+        self.name = name
+        self.channel = channel
+        self.sizes = sizes
+        self.sizes.setflags(write=False)
+
+        values = sizes.astype(float)
+        self.centered = values - values.mean()
+        # unit length, so the Pearson correlation of a centered and
+        # normalized candidate is a dot product
+        self.normalized = self.centered / np.linalg.norm(self.centered)
+        self.spacing = np.diff(values)
+
+    @property
+    def size(self) -> int:
+        return self.sizes.size
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    # numpy 2 passes copy, asarray decides whether the sizes are copied
+    def __array__(self, dtype=None, copy=None):  # pylint: disable=unused-argument
+        return np.asarray(self.sizes, dtype=dtype)
+
+    def correlation(self, candidates: np.ndarray) -> np.ndarray:
+        """
+        Pearson correlation of every row of candidates with the ladder.
+        """
+        candidates = np.atleast_2d(candidates).astype(float)
+        x = candidates - candidates.mean(axis=1, keepdims=True)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (x @ self.normalized) / np.linalg.norm(x, axis=1)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "channel": self.channel,
+            "sizes": self.sizes.tolist(),
+        }
+
+    def __repr__(self) -> str:
+        return f"LadderTemplate({self.name}, {self.size} sizes, channel={self.channel})"
+
+
+class LadderRegistry:
+    """
+    The ladders known by name. LIZ and ROX are registered by default, and
+    custom ladders can be registered or loaded from a file.
+
+    Example usage:
+    LADDER_REGISTRY.load("GS500.json")
+    laddermap = LadderMap(data, "GS500")
+    """
+
+    def __init__(self, templates: list = ()) -> None:
+        self._templates = {}
+        for template in templates:
+            self.register(template)
+
+    def register(self, template: LadderTemplate) -> LadderTemplate:
+        self._templates[template.name] = template
+
+        return template
+
+    def load(self, path: str, name: str = None, channel: str = None) -> LadderTemplate:
+        """
+        Loads and registers a ladder from a file.
+
+        A .json file holds {"name": ..., "channel": ..., "sizes": [...]}. Any
+        other file holds the sizes separated by commas, spaces or new lines
+        (lines starting with # are skipped); the name defaults to the file name.
+        name and channel override the values of the file.
+        """
+        path = Path(path)
+        if path.suffix == ".json":
+            values = json.loads(path.read_text(encoding="utf-8"))
+        else:
+            lines = [
+                x.split("#")[0]
+                for x in path.read_text(encoding="utf-8").splitlines()
+                if x.strip()
+            ]
+            values = {
+                "sizes": [float(x) for x in " ".join(lines).replace(",", " ").split()]
+            }
+
+        name = name or values.get("name") or path.stem
+        channel = channel or values.get("channel")
+        if channel is None:
+            raise ValueError(f"No channel is given for the ladder in {path}")
+
+        sizes = np.asarray(values["sizes"])
+        if np.all(sizes == np.round(sizes)):
+            sizes = sizes.astype(int)
+
+        return self.register(LadderTemplate(name, sizes, channel))
+
+    def get(self, ladder) -> LadderTemplate:
+        """
+        The template of a ladder name. A LadderTemplate is returned as is.
+        """
+        if isinstance(ladder, LadderTemplate):
+            return ladder
+        if ladder not in self._templates:
+            raise NotImplementedError(
+                f"{ladder} is not implemented! Options: [{', '.join(self._templates)}]"
+            )
+
+        return self._templates[ladder]
+
+    def __getitem__(self, name: str) -> LadderTemplate:
+        return self.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def __iter__(self):
+        return iter(self._templates)
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+
+LADDER_REGISTRY = LadderRegistry(
+    [LadderTemplate(name, sizes, CHANNELS[name]) for name, sizes in LADDERS.items()]
+)
@@ -0,0 +1,196 @@
+"""
+Opt-in per-stage instrumentation of LadderMap and PeakArea.
+
+Every stage records its wall time and, if memory is True, the peak memory
+allocated by Python during the stage (measured with tracemalloc, which slows
+the analysis down). Stages can also record counters, e.g. the number of
+baseline iterations, candidate ladder assignments or lmfit function
+evaluations.
+
+Example usage:
+laddermap = LadderMap("sample.fsa", "LIZ", metrics=True)
+peakarea = PeakArea(laddermap, "gauss", metrics=True)
+laddermap.metrics.to_dict()
+peakarea.metrics.to_json("metrics.json")
+"""
+
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger("fragment_analyzer")
+
+# the memory recording stages that are running, innermost last, with the
+# traced memory at their start and the highest peak seen so far
+_active = []
+
+
+class Metrics:
+    """
+    Wall time, peak memory and counters of the stages of one analysis.
+
+    Args:
+        name: Name of the analysed sample, included in the exports.
+        memory: Also record the peak memory of every stage with tracemalloc.
+    """
+
+    enabled = True
+
+    def __init__(self, name: str = None, memory: bool = False) -> None:
+        self.name = name
+        self.memory = memory
+        self.stages = {}
+
+    def _stage(self, name: str) -> dict:
+        return self.stages.setdefault(name, {"seconds": 0.0})
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Times the block as stage name. A stage entered twice adds up its
+        time and keeps the largest peak memory.
+
+        Stages can be nested (e.g. the stages of a PeakArea inside a timed
+        block). tracemalloc has one peak per process, which every stage
+        resets when it starts, so the peak seen by a stage is also folded
+        into the stages around it.
+        """
+        started_tracing = False
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            for outer in _active:
+                outer["peak"] = max(outer["peak"], peak)
+            tracemalloc.reset_peak()
+            frame = {"start": current, "peak": current}
+            _active.append(frame)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self._stage(name)
+            record["seconds"] += time.perf_counter() - start
+
+            if self.memory:
+                _active.remove(frame)
+                peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                for outer in _active:
+                    outer["peak"] = max(outer["peak"], peak)
+                record["peak_memory"] = max(
+                    record.get("peak_memory", 0), peak - frame["start"]
+                )
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def count(self, stage: str, **counters) -> None:
+        """
+        Sets counters of a stage, e.g. count("baseline", iterations=12).
+        """
+        self._stage(stage).update(counters)
+
+    def add(self, stage: str, **counters) -> None:
+        """
+        Adds to counters of a stage, e.g. add("fit", nfev=31).
+        """
+        record = self._stage(stage)
+        for counter, value in counters.items():
+            record[counter] = record.get(counter, 0) + value
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(x["seconds"] for x in self.stages.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "total_seconds": self.total_seconds,
+            "stages": {name: dict(record) for name, record in self.stages.items()},
+        }
+
+    def to_json(self, path: str = None) -> str:
+        """
+        Returns the metrics as JSON, and writes them to path if given.
+        """
+        text = json.dumps(self.to_dict(), indent=2, default=_to_builtin)
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+
+        return text
+
+    def log(self, level: int = logging.INFO, target: logging.Logger = None) -> None:
+        """
+        Logs one line per stage to target, by default the "fragment_analyzer"
+        logger.
+        """
+        target = logger if target is None else target
+        for name, record in self.stages.items():
+            counters = " ".join(
+                f"{k}={_to_builtin(v)}" for k, v in record.items() if k != "seconds"
+            )
+            target.log(
+                level,
+                "%s %s: %.4f s %s",
+                self.name,
+                name,
+                record["seconds"],
+                counters,
+            )
+
+    def __repr__(self) -> str:
+        stages = ", ".join(
+            f"{name}={record['seconds']:.4f}s" for name, record in self.stages.items()
+        )
+        return f"Metrics({self.name}: {stages})"
+
+
+class _NoMetrics(Metrics):
+    """
+    Stands in for Metrics when instrumentation is off, so the instrumented
+    code does not need to check.
+    """
+
+    enabled = False
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def count(self, stage: str, **counters) -> None:
+        pass
+
+    def add(self, stage: str, **counters) -> None:
+        pass
+
+
+NO_METRICS = _NoMetrics()
+
+
+def get_metrics(metrics, name: str = None) -> Metrics:
+    """
+    Resolves the metrics argument of LadderMap and PeakArea: None or False
+    turn the instrumentation off, True records wall time and counters,
+    "memory" also records peak memory, and a Metrics object is used as is.
+    """
+    if metrics is None or metrics is False:
+        return NO_METRICS
+    if metrics is True:
+        return Metrics(name)
+    if metrics == "memory":
+        return Metrics(name, memory=True)
+    if isinstance(metrics, Metrics):
+        return metrics
+
+    raise NotImplementedError(
+        f"{metrics} is not implemented! Options: [None, True, memory, Metrics]"
+    )
+
+
+def _to_builtin(value):
+    # numpy scalars are not JSON serializable
+    return value.item() if hasattr(value, "item") else value
@@ -0,0 +1,115 @@
+"""
+Noise-aware peak detection thresholds.
+
+The noise floor of a trace is estimated with a rolling median and a rolling
+median absolute deviation (MAD), which are robust to the peaks themselves as
+long as they cover less than half of a window. The windows are evaluated
+every step points in one vectorized pass over a strided view of the trace and
+interpolated in between.
+
+The threshold of a sample is its local baseline plus k robust standard
+deviations, so quiet traces keep their low peaks and noisy traces do not
+flood the ladder search and the fits with spurious peaks.
+
+Example usage:
+threshold = noise_threshold(intensity, k=5, min_height=500)
+peaks, _ = scipy.signal.find_peaks(intensity, height=threshold)
+"""
+
+import numpy as np
+
+# the MAD of normally distributed noise times this is its standard deviation
+MAD_TO_SIGMA = 1.4826
+
+
+def rolling_noise(y: np.ndarray, window: int = 201, step: int = None) -> tuple:
+    """
+    Rolling median and robust standard deviation (1.4826 * MAD) of y.
+
+    Args:
+        y: The trace.
+        window: Number of points of a window, made odd.
+        step: The windows are evaluated every step points and interpolated
+            in between. Defaults to window // 4.
+
+    Returns:
+        A tuple of (median, sigma), both with the shape of y.
+    """
+    y = np.asarray(y, dtype=float)
+    window = min(window | 1, y.size - (1 - y.size % 2))
+    if window < 3:
+        median = np.full(y.size, np.median(y) if y.size else 0.0)
+        return median, np.zeros(y.size)
+
+    step = step or max(window // 4, 1)
+
+    windows = np.lib.stride_tricks.sliding_window_view(y, window)[::step]
+    centers = np.arange(windows.shape[0]) * step + window // 2
+
+    median = np.median(windows, axis=1)
+    mad = np.median(np.abs(windows - median[:, None]), axis=1)
+
+    positions = np.arange(y.size)
+
+    return (
+        np.interp(positions, centers, median),
+        np.interp(positions, centers, MAD_TO_SIGMA * mad),
+    )
+
+
+def noise_threshold(
+    y: np.ndarray,
+    k: float = 5.0,
+    window: int = 201,
+    min_height: float = 0.0,
+) -> np.ndarray:
+    """
+    Per point detection threshold of y: the rolling median plus k times the
+    rolling robust standard deviation, and at least min_height. The floor
+    keeps the very quiet traces, e.g. of an empty well, from turning their
+    noise into peaks.
+
+    A flat stretch (e.g. a saturated or zero padded part) has a MAD of 0; the
+    standard deviation there is the median of the trace's nonzero ones.
+    """
+    median, sigma = rolling_noise(y, window)
+
+    nonzero = sigma[sigma > 0]
+    if nonzero.size:
+        sigma = np.where(sigma > 0, sigma, np.median(nonzero))
+
+    return np.maximum(median + k * sigma, min_height)
+
+
+def prune_weak_peaks(
+    peaks: np.ndarray,
+    heights: np.ndarray,
+    threshold: np.ndarray,
+    expected: int,
+    min_fraction: float = 0.1,
+) -> np.ndarray:
+    """
+    Boolean mask of the candidate ladder peaks (positions peaks, heights
+    heights) of a trace with the per point noise threshold.
+
+    The span the ladder could occupy runs from the highest (primer) peak to
+    the last of the expected highest peaks after it. Every peak in it is kept,
+    as a real ladder peak can barely rise above the floor (e.g. the 20 bp peak
+    of LIZ). Outside of it a peak must pass the threshold and be at least
+    min_fraction as high as the median of the expected highest peaks.
+    """
+    peaks = np.asarray(peaks)
+    heights = np.asarray(heights, dtype=float)
+    if heights.size <= expected:
+        return np.ones(heights.size, dtype=bool)
+
+    primer = np.argmax(heights)
+    after = heights[primer + 1 :]
+    highest = np.argsort(after)[-expected:] + primer + 1 if after.size else [primer]
+
+    inside = (peaks >= peaks[primer]) & (peaks <= peaks[highest].max())
+    strong = (heights >= threshold[peaks]) & (
+        heights >= min_fraction * np.median(heights[highest])
+    )
+
+    return inside | strong
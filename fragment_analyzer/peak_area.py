@@ -1,28 +1,192 @@
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from scipy.signal import find_peaks, peak_widths
-from lmfit.models import VoigtModel, GaussianModel, LorentzianModel
 from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer import plotting
+from fragment_analyzer.metrics import get_metrics
+from fragment_analyzer.noise import noise_threshold
+from fragment_analyzer.shared_traces import TraceHandle
+
+MODELS = ["gauss", "voigt", "lorentzian", "fast_gauss"]
+
+
+def lmfit_model(model_: str):
+    # lmfit is slow to import and not needed for fast_gauss
+    from lmfit.models import VoigtModel, GaussianModel, LorentzianModel
+
+    if model_ == "gauss":
+        return GaussianModel()
+    elif model_ == "voigt":
+        return VoigtModel()
+    elif model_ == "lorentzian":
+        return LorentzianModel()
+    else:
+        raise NotImplementedError(
+            f"{model_} is not implemented! Options: [{', '.join(MODELS)}]"
+        )
+
+
+def fit_peak(model_: str, x: np.ndarray, y: np.ndarray):
+    """
+    Fits one peak with lmfit and returns the lmfit ModelResult.
+    """
+    model = lmfit_model(model_)
+    params = model.guess(y, x)
+
+    return model.fit(y, params, x=x)
+
+
+def fast_gauss_parameters(xs: list, ys: list, min_fraction: float = 0.2) -> dict:
+    """
+    Closed-form Gaussian estimates for many peaks at once.
+
+    Fits a parabola to log(y) of the points above min_fraction of the peak
+    maximum, weighted by y ** 2 (Caruana's algorithm), for all peaks in one
+    vectorized pass. Falls back to the moments of the peak (of the intensities
+    clipped at 0, as baseline corrected traces dip below it) if the parabola
+    does not open downwards. The parameters of a peak without a positive
+    finite sigma either way are NaN, see fit_fast_gauss.
+
+    Args:
+        xs: The x values (basepairs) of every peak.
+        ys: The y values (intensities) of every peak.
+        min_fraction: Only points above this fraction of the maximum are used.
+
+    Returns:
+        A dict of arrays with the same parameters as lmfit's GaussianModel:
+        amplitude, center, sigma, fwhm and height.
+    """
+    lengths = np.array([len(x) for x in xs])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    segment = np.repeat(np.arange(lengths.size), lengths)
+
+    x = np.concatenate(xs).astype(float)
+    y = np.concatenate(ys).astype(float)
+
+    def segment_sum(values):
+        return np.add.reduceat(values, starts)
+
+    # center x on each peak for numerical stability
+    reference = segment_sum(x) / lengths
+    u = x - reference[segment]
+
+    use = y > min_fraction * np.maximum.reduceat(y, starts)[segment]
+    weight = np.where(use, y**2, 0.0)
+    log_y = np.log(np.where(use, y, 1.0))
+
+    s = [segment_sum(weight * u**k) for k in range(5)]
+    normal_matrix = np.stack(
+        [
+            np.stack([s[0], s[1], s[2]], axis=-1),
+            np.stack([s[1], s[2], s[3]], axis=-1),
+            np.stack([s[2], s[3], s[4]], axis=-1),
+        ],
+        axis=-2,
+    )
+    rhs = np.stack([segment_sum(weight * u**k * log_y) for k in range(3)], axis=-1)
+    a, b, c = np.einsum("nij,nj->ni", np.linalg.pinv(normal_matrix), rhs).T
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # moments as fallback
+        positive = np.clip(y, 0, None)
+        total = segment_sum(positive)
+        moment_center = segment_sum(x * positive) / total
+        moment_sigma = np.sqrt(
+            segment_sum(positive * (x - moment_center[segment]) ** 2) / total
+        )
+        moment_height = np.maximum.reduceat(y, starts)
+
+        sigma2 = -1 / (2 * c)
+        center = reference + b * sigma2
+        height = np.exp(a + b**2 * sigma2 / 2)
+
+    valid = (c < 0) & np.isfinite(height)
+    sigma = np.where(valid, np.sqrt(np.where(valid, sigma2, 1.0)), moment_sigma)
+    center = np.where(valid, center, moment_center)
+    height = np.where(valid, height, moment_height)
+
+    failed = ~(np.isfinite(sigma) & (sigma > 0))
+    sigma[failed] = center[failed] = height[failed] = np.nan
+
+    return {
+        "amplitude": height * sigma * np.sqrt(2 * np.pi),
+        "center": center,
+        "sigma": sigma,
+        "fwhm": 2 * np.sqrt(2 * np.log(2)) * sigma,
+        "height": height,
+    }
+
+
+def _file_name(laddermap) -> str:
+    # the file name of a LadderMap or of a TraceHandle of its traces
+    if isinstance(laddermap, TraceHandle):
+        return laddermap.path.parts[-1]
+
+    return laddermap.data_.parts[-1]
 
 
 class PeakArea:
+    """
+    Finds and fits the peaks of one channel.
+
+    The trace is kept as contiguous arrays (step_raw, step_adjusted and
+    intensity) and every peak as an index range into them. DataFrames such as
+    raw_data, peak_information, divided_peaks, fit_df and
+    peak_position_area_dataframe are only built when they are accessed.
+
+    laddermap can also be a TraceHandle of SharedTraceStore.put_laddermap,
+    e.g. in a worker process.
+
+    Peaks are searched above min_basepairs and must be higher than
+    peak_height, or with peak_height="auto" rise noise_k robust standard
+    deviations above the noise floor of the trace (see fragment_analyzer.noise)
+    and be higher than min_peak_height.
+    """
+
     def __init__(
         self,
         laddermap: LadderMap,
         model: str,
         channel: str = "DATA1",
         min_ratio: float = 0.2,
+        workers: int = 1,
+        executor: str = "thread",
+        metrics=None,
+        peak_height: float = 500,
+        min_basepairs: float = 50,
+        noise_k: float = 5.0,
+        min_peak_height: float = 500,
     ) -> None:
-        self.file_name = laddermap.data_.parts[-1]
-        self.raw_data = laddermap.adjusted_step_dataframe(channel=channel)
+        self.file_name = _file_name(laddermap)
+        # per stage wall time and counters, see fragment_analyzer.metrics
+        self.metrics = get_metrics(metrics, self.file_name)
+        # generated on first access, see fit_report
+        self._fit_report = None
+
+        with self.metrics.stage("adjusted_steps"):
+            if isinstance(laddermap, TraceHandle):
+                # the arrays are copies, so the block is unmapped right away
+                with laddermap.open() as traces:
+                    arrays = traces.adjusted_step_arrays(channel=channel)
+            else:
+                arrays = laddermap.adjusted_step_arrays(channel=channel)
+            self.step_raw, self.step_adjusted, self.intensity = arrays
 
         # find peaks
-        self.find_peaks_agnostic(min_ratio=min_ratio)
+        with self.metrics.stage("find_peaks"):
+            self.find_peaks_agnostic(
+                peak_height=peak_height,
+                min_ratio=min_ratio,
+                min_basepairs=min_basepairs,
+                noise_k=noise_k,
+                min_peak_height=min_peak_height,
+            )
+        self.metrics.count("find_peaks", peaks=self.peaks_index.size)
 
         # if no peaks could be found
         self.found_peaks = True
-        if self.peak_information.shape[0] == 0:
+        if self.peaks_index.size == 0:
             self.found_peaks = False
             print(
                 f"No peaks could be found in {self.file_name}. Please look at the raw data."
@@ -30,87 +194,209 @@ class PeakArea:
 
         # if peaks are found
         if self.found_peaks:
-            print(f"{self.peak_information.shape[0]} peaks found in {self.file_name}")
+            print(f"{self.peaks_index.size} peaks found in {self.file_name}")
             # find peak widths
-            self.find_peak_widths()
-            # divide peaks into individual dataframes
-            self.divide_peaks()
-            self.fit_df, self.fit_params, self.fit_report = self.fit_lmfit_model(
-                model_=model
-            )
+            with self.metrics.stage("peak_widths"):
+                self.find_peak_widths()
+                # divide peaks into index ranges
+                self.divide_peaks()
+            with self.metrics.stage("fit"):
+                if model == "fast_gauss":
+                    (
+                        self.fitted,
+                        self.fit_params,
+                        self.fit_results,
+                    ) = self.fit_fast_gauss()
+                else:
+                    (
+                        self.fitted,
+                        self.fit_params,
+                        self.fit_results,
+                    ) = self.fit_lmfit_model(
+                        model_=model, workers=workers, executor=executor
+                    )
+            self.metrics.count("fit", model=model, peaks=len(self.fitted))
+            if self.fit_results is not None:
+                self.metrics.count(
+                    "fit", nfev=sum(out.nfev for out in self.fit_results)
+                )
+            self.model = model
             # calculate quotient
-            self.calculate_quotient()
+            with self.metrics.stage("quotient"):
+                self.calculate_quotient()
 
-    def find_peak_widths(self, rel_height: float = 0.95):
-        widths = peak_widths(
-            self.peaks_dataframe.peaks,
-            self.peaks_index,
-            rel_height=rel_height,
+    @property
+    def raw_data(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "step_raw": self.step_raw,
+                "peaks": self.intensity,
+                "step_adjusted": self.step_adjusted,
+            },
+            index=self.step_raw,
         )
 
-        df = pd.DataFrame(widths).T
-        df.columns = ["x", "peak_height", "peak_start", "peak_end"]
+    @property
+    def peaks_dataframe(self) -> pd.DataFrame:
+        return self.raw_data.iloc[self.window]
 
-        self.peak_widths = (
-            df.assign(peak_start=lambda x: np.floor(x.peak_start).astype(int))
-            .assign(peak_end=lambda x: np.ceil(x.peak_end).astype(int))
+    @property
+    def peak_information(self) -> pd.DataFrame:
+        return (
+            self.peaks_dataframe.iloc[self.peaks_index]
+            .assign(peaks_index=self.peaks_index)
+            .assign(ratio=self.peaks_ratio)
             .assign(peak_name=lambda x: range(1, x.shape[0] + 1))
         )
 
     @property
-    def plot_peak_widths(self):
-        fig = plt.figure(figsize=(20, 10))
+    def divided_peaks(self) -> list:
+        return [
+            self.peaks_dataframe.iloc[start:end]
+            for start, end in zip(self.peak_starts, self.peak_ends)
+        ]
 
-        df = self.peaks_dataframe.loc[
-            lambda x: x.step_adjusted > self.peak_information.step_adjusted.min() - 10
-        ].loc[
-            lambda x: x.step_adjusted < self.peak_information.step_adjusted.max() + 10
+    @property
+    def fit_df(self) -> list:
+        return [
+            df.assign(fitted=fitted, model=self.model)
+            for df, fitted in zip(self.divided_peaks, self.fitted)
         ]
 
-        plt.plot(df.step_adjusted, df.peaks)
-        plt.plot(self.peak_information.step_adjusted, self.peak_information.peaks, "o")
+    def peak_arrays(self) -> tuple:
+        """
+        Views of the basepairs and intensities of every divided peak.
+        """
+        x = self.step_adjusted[self.window]
+        y = self.intensity[self.window]
+        xs = [x[start:end] for start, end in zip(self.peak_starts, self.peak_ends)]
+        ys = [y[start:end] for start, end in zip(self.peak_starts, self.peak_ends)]
 
-        plt.ylabel("intensity")
-        plt.xlabel("basepairs")
-        plt.grid()
+        return xs, ys
 
-        return fig
+    def find_peak_widths(self, rel_height: float = 0.95):
+        widths = peak_widths(
+            self.intensity[self.window],
+            self.peaks_index,
+            rel_height=rel_height,
+        )
+
+        self.widths = widths[0]
+        self.width_heights = widths[1]
+        self.peak_width_starts = np.floor(widths[2]).astype(int)
+        self.peak_width_ends = np.ceil(widths[3]).astype(int)
+
+    @property
+    def peak_widths(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "x": self.widths,
+                "peak_height": self.width_heights,
+                "peak_start": self.peak_width_starts,
+                "peak_end": self.peak_width_ends,
+                "peak_name": range(1, self.widths.size + 1),
+            }
+        )
+
+    @property
+    def plot_peak_widths(self):
+        return plotting.peak_widths_figure(
+            self.step_adjusted[self.window],
+            self.intensity[self.window],
+            self.peaks_index,
+        )
 
     def divide_peaks(self, padding: int = 4):
         # add some padding to the left and right to be sure to include everything in the peak
-        self.divided_peaks = [
-            self.peaks_dataframe.iloc[x.peak_start - padding : x.peak_end + padding]
-            for x in self.peak_widths.itertuples()
-        ]
+        self.peak_starts = np.maximum(self.peak_width_starts - padding, 0)
+        self.peak_ends = self.peak_width_ends + padding
+
+    def fit_lmfit_model(self, model_: str, workers: int = 1, executor: str = "thread"):
+        """
+        Fits every divided peak with lmfit, optionally in parallel over a
+        thread or process pool with the given number of workers.
+
+        Returns the fitted values, the fitted parameters and the lmfit
+        ModelResults.
+        """
+        # fail early for unknown models
+        lmfit_model(model_)
+
+        xs, ys = self.peak_arrays()
+        models = [model_] * len(xs)
 
-    def fit_lmfit_model(self, model_: str):
-        if model_ == "gauss":
-            model = GaussianModel()
-        elif model_ == "voigt":
-            model = VoigtModel()
-        elif model_ == "lorentzian":
-            model = LorentzianModel()
+        if workers == 1 or len(xs) == 1:
+            fitted_results = list(map(fit_peak, models, xs, ys))
         else:
-            raise NotImplementedError(
-                f"{model_} is not implemented! Options: [gauss, voigt, lorentzian]"
-            )
+            if executor == "thread":
+                pool = ThreadPoolExecutor(max_workers=workers)
+            elif executor == "process":
+                pool = ProcessPoolExecutor(max_workers=workers)
+            else:
+                raise NotImplementedError(
+                    f"{executor} is not implemented! Options: [thread, process]"
+                )
+            with pool:
+                fitted_results = list(pool.map(fit_peak, models, xs, ys))
 
-        fitted_df = []
-        fitted_parameters = []
-        fitted_report = []
-        for df in self.divided_peaks:
-            df = df.copy()
-            y = df.peaks.to_numpy()
-            x = df.step_adjusted.to_numpy()
+        fitted = [out.best_fit for out in fitted_results]
+        fitted_parameters = [out.values for out in fitted_results]
 
-            params = model.guess(y, x)
-            out = model.fit(y, params, x=x)
+        return fitted, fitted_parameters, fitted_results
 
-            fitted_df.append(df.assign(fitted=out.best_fit, model=model_))
-            fitted_parameters.append(out.values)
-            fitted_report.append(out.fit_report())
+    def fit_fast_gauss(self):
+        """
+        Fits a Gaussian to every divided peak in closed form (see
+        fast_gauss_parameters). Much faster than lmfit and usually enough
+        for the areas used in calculate_quotient. The few peaks the closed
+        form cannot fit are fitted with lmfit's gauss model.
 
-        return fitted_df, fitted_parameters, fitted_report
+        Returns the fitted values, the fitted parameters and None, as
+        there are no lmfit ModelResults.
+        """
+        xs, ys = self.peak_arrays()
+
+        parameters = fast_gauss_parameters(xs, ys)
+        fitted_parameters = [
+            {name: float(values[i]) for name, values in parameters.items()}
+            for i in range(len(xs))
+        ]
+
+        fitted = []
+        fallbacks = 0
+        for i, (x, y, p) in enumerate(zip(xs, ys, fitted_parameters)):
+            if np.isfinite(p["sigma"]):
+                fitted.append(
+                    p["height"]
+                    * np.exp(-((x - p["center"]) ** 2) / (2 * p["sigma"] ** 2))
+                )
+            else:
+                out = fit_peak("gauss", x, y)
+                fitted.append(out.best_fit)
+                fitted_parameters[i] = out.values
+                fallbacks += 1
+
+        if fallbacks:
+            self.metrics.count("fit", lmfit_fallbacks=fallbacks)
+
+        return fitted, fitted_parameters, None
+
+    @property
+    def fit_report(self) -> list:
+        """
+        Fit report of every peak, generated on first access.
+        """
+        if self._fit_report is None:
+            if self.fit_results is None:
+                self._fit_report = [
+                    "[[Model]]\n    Model(gaussian, closed form)\n[[Variables]]\n"
+                    + "\n".join(f"    {name}: {value:.8g}" for name, value in p.items())
+                    for p in self.fit_params
+                ]
+            else:
+                self._fit_report = [out.fit_report() for out in self.fit_results]
+
+        return self._fit_report
 
     def calculate_quotient(self):
         areas = np.array([x["amplitude"] for x in self.fit_params])
@@ -130,95 +416,132 @@ class PeakArea:
 
     @property
     def plot_lmfit_model(self):
-
-        fig, axs = plt.subplots(1, len(self.fit_df), sharey=True, figsize=(20, 10))
-
-        # if there is only one peak
-        if len(self.fit_df) == 1:
-            axs.plot(self.fit_df[0].step_adjusted, self.fit_df[0].peaks, "o")
-            axs.plot(self.fit_df[0].step_adjusted, self.fit_df[0].fitted)
-            axs.set_title(f"Peak 1 area: {self.fit_params[0]['amplitude']: .1f}")
-            axs.grid()
-        # if more than one peak
-        else:
-            for i, ax in enumerate(axs):
-                ax.plot(self.fit_df[i].step_adjusted, self.fit_df[i].peaks, "o")
-                ax.plot(self.fit_df[i].step_adjusted, self.fit_df[i].fitted)
-                ax.set_title(
-                    f"Peak {i + 1} area: {self.fit_params[i]['amplitude']: .1f}"
-                )
-                ax.grid()
-
-        fig.suptitle(f"Quotient: {self.quotient: .2f}")
-        fig.legend(["Raw data", "Model"])
-        fig.supxlabel("basepairs")
-        fig.supylabel("intensity")
-
-        return fig
+        xs, ys = self.peak_arrays()
+
+        return plotting.model_fit_figure(
+            xs,
+            ys,
+            self.fitted,
+            [p["amplitude"] for p in self.fit_params],
+            self.quotient,
+        )
 
     @property
     def peak_position_area_dataframe(self) -> pd.DataFrame:
         """
         Returns a DataFrame of each peak and its properties
         """
-        dataframes = []
-        for i, _ in enumerate(self.fit_df):
-            df = (
-                self.fit_df[i]
-                .loc[lambda x: x.peaks == x.peaks.max()]
-                .assign(area=self.fit_params[i]["amplitude"])
-                .assign(peak_name=f"Peak {i + 1}")
-                .drop(columns="step_raw")
-                .reset_index(drop=True)
-                .rename(
-                    columns={
-                        "peaks": "peak_height",
-                        "step_adjusted": "basepairs",
-                        "fitted": "fitted_peak_height",
-                    }
-                )
-                .drop_duplicates("peak_name")
-                .assign(file_name=self.file_name)
-            )
-            dataframes.append(df)
-        return pd.concat(dataframes).assign(quotient=self.quotient)
+        xs, ys = self.peak_arrays()
+        highest = [y.argmax() for y in ys]
+
+        return pd.DataFrame(
+            {
+                "peak_height": [y[i] for y, i in zip(ys, highest)],
+                "basepairs": [x[i] for x, i in zip(xs, highest)],
+                "fitted_peak_height": [f[i] for f, i in zip(self.fitted, highest)],
+                "model": self.model,
+                "area": [p["amplitude"] for p in self.fit_params],
+                "peak_name": [f"Peak {i + 1}" for i in range(len(xs))],
+                "file_name": self.file_name,
+                "quotient": self.quotient,
+            }
+        )
 
-    # TODO
-    # change peak_height to something appropriate... but what?
-    # change min_ratio to something appropriate... but what?
     def find_peaks_agnostic(
-        self, peak_height: int = 500, min_ratio: float = 0.2
+        self,
+        peak_height: float = 500,
+        min_ratio: float = 0.2,
+        min_basepairs: float = 50,
+        noise_k: float = 5.0,
+        min_peak_height: float = 500,
     ) -> None:
-        peaks_dataframe = self.raw_data.loc[lambda x: x.step_adjusted > 50]
-        peaks_index, _ = find_peaks(peaks_dataframe.peaks, height=peak_height)
-
-        peak_information = (
-            peaks_dataframe.iloc[peaks_index]
-            .assign(peaks_index=peaks_index)
-            .assign(ratio=lambda x: x.peaks / x.peaks.max())
-            .loc[lambda x: x.ratio > min_ratio]
-            .assign(peak_name=lambda x: range(1, x.shape[0] + 1))
-        )
+        # indices of the trace that are searched for peaks
+        self.window = np.flatnonzero(self.step_adjusted > min_basepairs)
+        intensity = self.intensity[self.window]
+
+        if peak_height == "auto":
+            peak_height = noise_threshold(
+                intensity, noise_k, min_height=min_peak_height
+            )
+
+        peaks_index, _ = find_peaks(intensity, height=peak_height)
 
-        # update peaks_index based on the above filtering
-        peaks_index = peak_information.peaks_index.to_numpy()
+        ratio = intensity[peaks_index] / intensity[peaks_index].max(initial=1)
+        keep = ratio > min_ratio
 
         # update class attributes
-        self.peaks_index = peaks_index
-        self.peaks_dataframe = peaks_dataframe
-        self.peak_information = peak_information
+        self.peaks_index = peaks_index[keep]
+        self.peaks_ratio = ratio[keep]
 
     @property
     def plot_raw_data(self):
         """
         Plot the whole area of the raw data
         """
-        fig = plt.figure(figsize=(20, 10))
-        plt.plot(self.raw_data.step_adjusted, self.raw_data.peaks)
+        return plotting.raw_data_figure(self.step_adjusted, self.intensity)
+
+
+class MultiChannelPeakArea:
+    """
+    Runs PeakArea on several channels of one LadderMap.
+
+    The basepair axis and the (baseline corrected) intensities of every
+    channel are computed once by the LadderMap and shared. The peak search
+    parameters and metrics are passed to every PeakArea. laddermap can also be
+    a TraceHandle of SharedTraceStore.put_laddermap with the channels.
+
+    Example usage:
+    peak_areas = MultiChannelPeakArea(laddermap, "gauss", channels=["DATA1", "DATA2"])
+    peak_areas.peak_position_area_dataframe
+    """
+
+    def __init__(
+        self,
+        laddermap: LadderMap,
+        model: str,
+        channels: list = ("DATA1", "DATA2", "DATA3", "DATA4"),
+        min_ratio: float = 0.2,
+        workers: int = 1,
+        executor: str = "thread",
+        peak_height: float = 500,
+        metrics=None,
+        min_basepairs: float = 50,
+        noise_k: float = 5.0,
+        min_peak_height: float = 500,
+    ) -> None:
+        self.file_name = _file_name(laddermap)
+        self.peak_areas = {
+            channel: PeakArea(
+                laddermap,
+                model,
+                channel=channel,
+                min_ratio=min_ratio,
+                workers=workers,
+                executor=executor,
+                metrics=metrics,
+                peak_height=peak_height,
+                min_basepairs=min_basepairs,
+                noise_k=noise_k,
+                min_peak_height=min_peak_height,
+            )
+            for channel in channels
+        }
+        self.found_peaks = any(x.found_peaks for x in self.peak_areas.values())
 
-        plt.ylabel("intensity")
-        plt.xlabel("basepairs")
-        plt.grid()
-        plt.title("Raw data")
+    def __getitem__(self, channel: str) -> PeakArea:
+        return self.peak_areas[channel]
+
+    @property
+    def peak_position_area_dataframe(self) -> pd.DataFrame:
+        """
+        Returns a DataFrame of each peak in every channel and its properties
+        """
+        dataframes = [
+            peak_area.peak_position_area_dataframe.assign(channel=channel)
+            for channel, peak_area in self.peak_areas.items()
+            if peak_area.found_peaks
+        ]
+        if not dataframes:
+            return pd.DataFrame()
 
-        return fig
+        return pd.concat(dataframes, ignore_index=True)
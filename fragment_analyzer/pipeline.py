@@ -0,0 +1,396 @@
+"""
+Incremental analysis of one sample.
+
+The analysis is a chain of stages, each depending on the stages before it and
+on its own parameters:
+
+parse -> baseline -> ladder_peaks -> ladder_assignment -> calibration
+      -> sample_peaks -> widths -> fits -> quotient -> report
+
+The output of every stage is memoized on its parameters and on the outputs of
+the stages it depends on, so changing one parameter only recomputes the stages
+downstream of it. Tuning e.g. min_ratio, padding or the model is near-instant,
+as the ladder is not mapped again.
+
+The outputs are (partially computed) LadderMap and PeakArea objects. A stage
+works on a shallow copy of the output of the stage before it and calls the
+same methods as LadderMap and PeakArea do, so the results are the same as
+those of LadderMap(...) and PeakArea(...).
+
+Example usage:
+pipeline = Pipeline("sample.fsa", ladder="LIZ", model="gauss")
+pipeline.peakarea.quotient
+pipeline.update(min_ratio=0.3, padding=2)
+pipeline.peakarea.quotient  # only sample_peaks, widths, fits and quotient run
+pipeline.computed
+"""
+
+import copy
+from pathlib import Path
+
+import numpy as np
+
+from fragment_analyzer.abif import AbifReader
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.ladders.ladders import LADDER_REGISTRY
+from fragment_analyzer.metrics import get_metrics
+from fragment_analyzer.peak_area import PeakArea
+
+
+def _new(cls, **attributes):
+    # an instance of cls without running its __init__
+    obj = cls.__new__(cls)
+    obj.__dict__.update(attributes)
+
+    return obj
+
+
+def _copy(obj, **attributes):
+    obj = copy.copy(obj)
+    obj.__dict__.update(attributes)
+
+    return obj
+
+
+def _parse(file, ladder, metrics):
+    template = LADDER_REGISTRY.get(ladder)
+    path = Path(file)
+
+    with metrics.stage("read"):
+        data = AbifReader(path)
+
+    return _new(
+        LadderMap,
+        template=template,
+        channel=template.channel,
+        data_=path,
+        metrics=metrics,
+        data=data,
+        ladder=template.sizes,
+        fallback=False,
+    )
+
+
+def _baseline(laddermap, normalize_peaks):
+    laddermap = _copy(
+        laddermap,
+        normalize_peaks=normalize_peaks,
+        _intensities={},
+        _basepairs=None,
+    )
+    laddermap.sample_ladder = laddermap.channel_intensity(laddermap.channel)
+
+    return laddermap
+
+
+def _ladder_peaks(
+    laddermap,
+    max_peak_count,
+    distance,
+    height,
+    max_diff_coefficient,
+    seed,
+    seed_tolerance,
+    noise_k,
+    min_height,
+):
+    laddermap = _copy(
+        laddermap,
+        max_peak_count=max_peak_count,
+        distance=distance,
+        height=height,
+        max_diff_coefficient=max_diff_coefficient,
+        seed=None if seed is None else np.asarray(seed, dtype=float),
+        seed_tolerance=seed_tolerance,
+        noise_k=noise_k,
+        min_height=min_height,
+        _adjacency=None,
+        _graph=None,
+    )
+    with laddermap.metrics.stage("get_peaks"):
+        laddermap.peaks = laddermap.get_peaks()
+    laddermap.set_max_diff()
+
+    return laddermap
+
+
+def _ladder_assignment(laddermap, method, max_candidates, time_limit):
+    if method not in ("dp", "graph"):
+        raise NotImplementedError(f"{method} is not implemented! Options: [dp, graph]")
+
+    laddermap = _copy(
+        laddermap, method=method, max_candidates=max_candidates, time_limit=time_limit
+    )
+    with laddermap.metrics.stage("ladder_assignment"):
+        laddermap.best_ladder_peak_correlation()
+
+    return laddermap
+
+
+def _calibration(laddermap, calibration_method):
+    laddermap = _copy(laddermap, calibration_method=calibration_method)
+    with laddermap.metrics.stage("calibration"):
+        laddermap.fit_calibration()
+
+    return laddermap
+
+
+def _sample_peaks(
+    laddermap, channel, min_ratio, peak_height, min_basepairs, noise_k, min_peak_height
+):
+    file_name = laddermap.data_.parts[-1]
+    step_raw, step_adjusted, intensity = laddermap.adjusted_step_arrays(channel)
+    peakarea = _new(
+        PeakArea,
+        file_name=file_name,
+        metrics=laddermap.metrics,
+        step_raw=step_raw,
+        step_adjusted=step_adjusted,
+        intensity=intensity,
+        _fit_report=None,
+    )
+
+    with peakarea.metrics.stage("find_peaks"):
+        peakarea.find_peaks_agnostic(
+            peak_height=peak_height,
+            min_ratio=min_ratio,
+            min_basepairs=min_basepairs,
+            noise_k=noise_k,
+            min_peak_height=min_peak_height,
+        )
+    peakarea.found_peaks = peakarea.peaks_index.size > 0
+
+    return peakarea
+
+
+def _widths(peakarea, rel_height, padding):
+    peakarea = _copy(peakarea)
+    if peakarea.found_peaks:
+        with peakarea.metrics.stage("peak_widths"):
+            peakarea.find_peak_widths(rel_height=rel_height)
+            peakarea.divide_peaks(padding=padding)
+
+    return peakarea
+
+
+def _fits(peakarea, model, workers, executor):
+    # without the fit report of the copied fits
+    peakarea = _copy(peakarea, model=model, _fit_report=None)
+
+    if peakarea.found_peaks:
+        with peakarea.metrics.stage("fit"):
+            if model == "fast_gauss":
+                fits = peakarea.fit_fast_gauss()
+            else:
+                fits = peakarea.fit_lmfit_model(
+                    model_=model, workers=workers, executor=executor
+                )
+        peakarea.fitted, peakarea.fit_params, peakarea.fit_results = fits
+
+    return peakarea
+
+
+def _quotient(peakarea):
+    peakarea = _copy(peakarea)
+    if peakarea.found_peaks:
+        with peakarea.metrics.stage("quotient"):
+            peakarea.calculate_quotient()
+
+    return peakarea
+
+
+def _report(laddermap, peakarea):
+    from fragment_analyzer.reports.report_data import report_data
+
+    return report_data(laddermap, peakarea)
+
+
+# stage -> (function, the stages it depends on, its parameters)
+STAGES = {
+    "parse": (_parse, [], ["file", "ladder"]),
+    "baseline": (_baseline, ["parse"], ["normalize_peaks"]),
+    "ladder_peaks": (
+        _ladder_peaks,
+        ["baseline"],
+        [
+            "max_peak_count",
+            "distance",
+            "height",
+            "max_diff_coefficient",
+            "seed",
+            "seed_tolerance",
+            "noise_k",
+            "min_height",
+        ],
+    ),
+    "ladder_assignment": (
+        _ladder_assignment,
+        ["ladder_peaks"],
+        ["method", "max_candidates", "time_limit"],
+    ),
+    "calibration": (_calibration, ["ladder_assignment"], ["calibration_method"]),
+    "sample_peaks": (
+        _sample_peaks,
+        ["calibration"],
+        [
+            "channel",
+            "min_ratio",
+            "peak_height",
+            "min_basepairs",
+            "noise_k",
+            "min_peak_height",
+        ],
+    ),
+    "widths": (_widths, ["sample_peaks"], ["rel_height", "padding"]),
+    "fits": (_fits, ["widths"], ["model", "workers", "executor"]),
+    "quotient": (_quotient, ["fits"], []),
+    "report": (_report, ["calibration", "quotient"], []),
+}
+
+# the defaults of LadderMap and PeakArea
+DEFAULTS = {
+    "normalize_peaks": False,
+    "max_peak_count": 38,
+    "distance": 30,
+    "height": 100,
+    "max_diff_coefficient": 1.5,
+    "seed": None,
+    "seed_tolerance": 50,
+    "method": "dp",
+    "max_candidates": 250_000,
+    "time_limit": None,
+    "calibration_method": "linear",
+    "channel": "DATA1",
+    "min_ratio": 0.2,
+    "peak_height": 500,
+    "min_basepairs": 50,
+    "noise_k": 5.0,
+    "min_height": 100,
+    "min_peak_height": 500,
+    "rel_height": 0.95,
+    "padding": 4,
+    "model": "gauss",
+    "workers": 1,
+    "executor": "thread",
+}
+
+
+def _freeze(value):
+    # parameters as a hashable part of a memo key
+    if isinstance(value, (np.ndarray, list, tuple)):
+        return tuple(np.asarray(value).tolist())
+
+    return value
+
+
+class Pipeline:
+    """
+    The stages of the analysis of one sample, memoized on their inputs.
+
+    Args:
+        file: The .fsa file.
+        ladder: Name of the ladder, e.g. "LIZ", or a LadderTemplate.
+        max_entries: Number of outputs kept per stage, so switching back to
+            earlier parameters is also instant.
+        metrics: See fragment_analyzer.metrics; only the stages that run are
+            recorded.
+        parameters: Parameters of LadderMap and PeakArea (see DEFAULTS), and
+            rel_height of find_peak_widths and padding of divide_peaks.
+            noise_k is shared by the ladder and the sample peaks.
+    """
+
+    def __init__(
+        self,
+        file: str,
+        ladder: str,
+        max_entries: int = 8,
+        metrics=None,
+        **parameters,
+    ) -> None:
+        self.parameters = {"file": str(file), "ladder": ladder, **DEFAULTS}
+        self.max_entries = max_entries
+        self.metrics = get_metrics(metrics, Path(file).name)
+        # stage -> {memo key: output}
+        self._memo = {stage: {} for stage in STAGES}
+        # the stages computed by the last run
+        self.computed = []
+
+        self.update(**parameters)
+
+    def update(self, **parameters) -> "Pipeline":
+        """
+        Changes parameters. Nothing is computed until an output is accessed.
+        """
+        unknown = set(parameters) - set(self.parameters)
+        if unknown:
+            raise TypeError(
+                f"Unknown parameters {sorted(unknown)}! "
+                f"Options: [{', '.join(self.parameters)}]"
+            )
+        self.parameters.update(parameters)
+
+        return self
+
+    def _run(self, stage: str) -> tuple:
+        function, dependencies, parameters = STAGES[stage]
+
+        upstream = [self._run(x) for x in dependencies]
+        values = {x: self.parameters[x] for x in parameters}
+        key = (
+            tuple(k for k, _ in upstream),
+            tuple((x, _freeze(v)) for x, v in values.items()),
+        )
+
+        memo = self._memo[stage]
+        if key in memo:
+            # most recently used last
+            memo[key] = memo.pop(key)
+        else:
+            if stage == "parse":
+                values["metrics"] = self.metrics
+            memo[key] = function(*(output for _, output in upstream), **values)
+            self.computed.append(stage)
+            while len(memo) > self.max_entries:
+                del memo[next(iter(memo))]
+
+        return key, memo[key]
+
+    def run(self, stage: str = "quotient"):
+        """
+        Returns the output of stage, computing only the stages whose inputs
+        changed since they were last computed.
+        """
+        if stage not in STAGES:
+            raise NotImplementedError(
+                f"{stage} is not implemented! Options: [{', '.join(STAGES)}]"
+            )
+
+        self.computed = []
+
+        return self._run(stage)[1]
+
+    @property
+    def laddermap(self) -> LadderMap:
+        return self.run("calibration")
+
+    @property
+    def peakarea(self) -> PeakArea:
+        return self.run("quotient")
+
+    @property
+    def report_data(self) -> dict:
+        return self.run("report")
+
+    def save_report(self, folder: str):
+        """
+        Saves the HTML report of the current parameters to folder.
+        """
+        from fragment_analyzer.reports.generate_report import save_report
+
+        return save_report(self.report_data, folder)
+
+    def clear(self) -> None:
+        """
+        Forgets all memoized outputs.
+        """
+        self._memo = {stage: {} for stage in STAGES}
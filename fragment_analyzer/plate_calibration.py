@@ -0,0 +1,261 @@
+"""
+Plate-level quality control of the ladder calibrations.
+
+Every sample of a plate (run) is sized with the same size standard on the
+same instrument, so the steps of its ladder peaks are nearly the same in all
+wells, up to a drift in start time and speed and a slight curvature. The
+consensus of the plate is the median step of every ladder peak over the wells
+with a good ladder correlation. The deviation of a well is the largest
+distance of its ladder peaks to the consensus mapped onto them with a
+quadratic (shift, scale and curvature) fit, so drift is not counted, while a
+mis-assigned peak is. A well is an outlier when its
+deviation is larger than that of the other wells, measured with a robust
+(median absolute deviation) z-score.
+
+Failed wells and outliers are mapped again with the consensus as seed: the
+consensus is aligned to the strongest peaks of the well (align_consensus)
+and only the peaks within seed_tolerance steps of the aligned ladder peaks
+are searched. The tolerance follows from the spread of the deviations of the
+plate. This is both faster and finds weak ladders that the unseeded search,
+which starts after the highest peak, misses.
+"""
+
+import numpy as np
+import pandas as pd
+
+QC_STATUSES = ["ok", "low correlation", "outlier", "failed", "rescued"]
+
+
+def plate_consensus(
+    ladder_peaks: np.ndarray, correlations: np.ndarray, min_correlation: float = 0.99
+) -> np.ndarray:
+    """
+    Median step of every ladder peak over the wells with a ladder correlation
+    of at least min_correlation.
+
+    Args:
+        ladder_peaks: Assigned ladder peaks of the wells, shape (wells, ladder size).
+            Rows of failed wells are NaN.
+        correlations: Ladder correlation of every well (NaN if failed).
+        min_correlation: Minimum correlation of the wells in the consensus.
+
+    Returns:
+        The expected steps of the ladder peaks, or None if no well is good enough.
+    """
+    ladder_peaks = np.asarray(ladder_peaks, dtype=float)
+    good = np.asarray(correlations, dtype=float) >= min_correlation
+    if not good.any():
+        return None
+
+    return np.median(ladder_peaks[good], axis=0)
+
+
+def ladder_deviation(
+    ladder_peaks: np.ndarray, consensus: np.ndarray, degree: int = 2
+) -> np.ndarray:
+    """
+    Largest distance in steps of the ladder peaks of every well to the
+    consensus mapped onto them with a least squares polynomial of degree,
+    NaN for failed wells.
+    """
+    ladder_peaks = np.atleast_2d(np.asarray(ladder_peaks, dtype=float))
+    deviation = np.full(ladder_peaks.shape[0], np.nan)
+
+    valid = ~np.isnan(ladder_peaks).any(axis=1)
+    if valid.any():
+        # one least squares fit of all wells
+        design = np.vander(consensus, degree + 1)
+        coefficients, *_ = np.linalg.lstsq(design, ladder_peaks[valid].T, rcond=None)
+        residuals = ladder_peaks[valid].T - design @ coefficients
+        deviation[valid] = np.abs(residuals).max(axis=0)
+
+    return deviation
+
+
+def ladder_outliers(
+    deviation: np.ndarray, max_z: float = 3.5, min_deviation: float = 20
+) -> np.ndarray:
+    """
+    Boolean mask of the wells whose deviation from the consensus has a robust
+    z-score above max_z and is larger than min_deviation steps. min_deviation
+    keeps the tight plates, where the MAD is only a few steps, from flagging
+    every well.
+    """
+    deviation = np.asarray(deviation, dtype=float)
+    valid = ~np.isnan(deviation)
+    if not valid.any():
+        return np.zeros(deviation.size, dtype=bool)
+
+    median = np.median(deviation[valid])
+    mad = 1.4826 * np.median(np.abs(deviation[valid] - median))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (deviation - median) / mad
+
+    return valid & (deviation > min_deviation) & (z > max_z)
+
+
+def plate_tolerance(
+    deviation: np.ndarray, max_z: float = 3.5, minimum: float = 10
+) -> float:
+    """
+    Seed tolerance in steps from the spread of the deviations of a plate: the
+    deviation a well may have before it is an outlier, and at least minimum.
+    """
+    deviation = np.asarray(deviation, dtype=float)
+    deviation = deviation[~np.isnan(deviation)]
+    if deviation.size == 0:
+        return minimum
+
+    median = np.median(deviation)
+    mad = 1.4826 * np.median(np.abs(deviation - median))
+
+    return float(max(median + max_z * mad, minimum))
+
+
+def _nearest(peaks: np.ndarray, positions: np.ndarray) -> tuple:
+    # the nearest of the sorted peaks to every position, and its distance
+    right = np.clip(np.searchsorted(peaks, positions), 1, peaks.size - 1)
+    left = right - 1
+    nearest = np.where(
+        np.abs(peaks[left] - positions) <= np.abs(peaks[right] - positions),
+        left,
+        right,
+    )
+
+    return peaks[nearest], np.abs(peaks[nearest] - positions)
+
+
+def align_consensus(
+    consensus: np.ndarray,
+    peaks: np.ndarray,
+    heights: np.ndarray = None,
+    tolerance: float = 10,
+    scales: np.ndarray = np.linspace(0.85, 1.15, 61),
+    strongest: int = None,
+    degree: int = 2,
+) -> np.ndarray:
+    """
+    The consensus mapped onto the peaks of a well.
+
+    Every scale (around the center of the consensus) and every shift that
+    puts a consensus peak on one of the strongest peaks is scored by the
+    number of consensus peaks near one of them, within a quarter of the
+    median ladder spacing, as a shift and a scale do not model the
+    curvature. The best alignment is refined with least squares polynomials
+    of degree through the matched peaks, the last ones within tolerance steps.
+
+    Args:
+        consensus: Expected steps of the ladder peaks.
+        peaks: Candidate peaks of the well.
+        heights: Heights of peaks, to pick the strongest ones.
+        tolerance: Distance in steps of a matched peak.
+        scales: The scales that are tried.
+        strongest: Number of strongest peaks used, defaults to twice the ladder size.
+        degree: Degree of the refined mapping.
+
+    Returns:
+        The aligned consensus. It is only shifted and scaled if too few peaks
+        match to refine it.
+    """
+    consensus = np.asarray(consensus, dtype=float)
+    peaks = np.sort(np.asarray(peaks, dtype=float))
+    if peaks.size < 3:
+        return consensus
+
+    strongest = strongest or 2 * consensus.size
+    if heights is not None and peaks.size > strongest:
+        order = np.argsort(np.asarray(heights))[::-1][:strongest]
+        anchors = np.sort(np.asarray(peaks)[order])
+    else:
+        anchors = peaks
+
+    coarse = max(tolerance, np.median(np.diff(consensus)) / 4)
+    center = consensus.mean()
+    best = (-1, np.inf, consensus)
+    for scale in scales:
+        scaled = center + scale * (consensus - center)
+        # shifts that put a consensus peak on an anchor, shape (shifts, ladder size)
+        shifts = (anchors[:, None] - scaled[None, :]).ravel()
+        _, distance = _nearest(anchors, scaled[None, :] + shifts[:, None])
+        matched = distance <= coarse
+        counts = matched.sum(axis=1)
+        error = np.where(matched, distance, 0).sum(axis=1)
+        i = np.lexsort((error, -counts))[0]
+        if (counts[i], -error[i]) > (best[0], -best[1]):
+            best = (counts[i], error[i], scaled + shifts[i])
+
+    aligned = best[2]
+    for limit in (coarse, tolerance, tolerance):
+        nearest, distance = _nearest(peaks, aligned)
+        matched = distance <= limit
+        if matched.sum() <= degree + 1:
+            break
+        coefficients = np.polyfit(consensus[matched], nearest[matched], degree)
+        aligned = np.polyval(coefficients, consensus)
+
+    return aligned
+
+
+def plate_ladder_qc(
+    results: list,
+    min_correlation: float = 0.99,
+    max_z: float = 3.5,
+    min_deviation: float = 20,
+) -> tuple:
+    """
+    Compares the ladder calibrations of the analyse_file results of a plate.
+
+    Args:
+        results: analyse_file results with the ladder_peaks and
+            ladder_correlation of every well.
+        min_correlation: Wells with a lower ladder correlation are not part of
+            the consensus and are flagged as "low correlation".
+        max_z, min_deviation: See ladder_outliers.
+
+    Returns:
+        A tuple of (consensus, seed_tolerance, qc), where consensus are the
+        expected steps of the ladder peaks (or None), seed_tolerance is
+        plate_tolerance of the wells and qc is a DataFrame with the path, file
+        name, ladder correlation, deviation in steps and qc status of every well.
+
+    Example usage:
+    consensus, seed_tolerance, qc = plate_ladder_qc(results)
+    rerun = qc.loc[qc["ladder_qc"] != "ok", "path"]
+    """
+    sizes = [x["ladder_peaks"].size for x in results if x["ladder_peaks"] is not None]
+    size = max(sizes) if sizes else 0
+
+    ladder_peaks = np.full((len(results), size), np.nan)
+    correlations = np.full(len(results), np.nan)
+    for i, result in enumerate(results):
+        if result["ladder_peaks"] is not None:
+            ladder_peaks[i] = result["ladder_peaks"]
+            correlations[i] = result["ladder_correlation"]
+
+    consensus = plate_consensus(ladder_peaks, correlations, min_correlation)
+
+    status = np.where(np.isnan(correlations), "failed", "ok").astype(object)
+    status[correlations < min_correlation] = "low correlation"
+
+    if consensus is not None:
+        deviation = ladder_deviation(ladder_peaks, consensus)
+        outliers = ladder_outliers(deviation, max_z, min_deviation)
+        status[outliers] = "outlier"
+        good = (status == "ok") & ~np.isnan(deviation)
+        seed_tolerance = plate_tolerance(deviation[good], max_z)
+    else:
+        deviation = np.full(len(results), np.nan)
+        seed_tolerance = None
+
+    qc = pd.DataFrame(
+        {
+            "path": [x["path"] for x in results],
+            "file_name": [x["file_name"] for x in results],
+            "ladder_correlation": correlations,
+            "ladder_deviation": deviation,
+            "ladder_qc": status,
+        }
+    )
+
+    return consensus, seed_tolerance, qc
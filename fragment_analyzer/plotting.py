@@ -0,0 +1,146 @@
+"""
+Matplotlib figures of the analysis results.
+
+The figures are built from plain arrays, i.e. from precomputed results, so
+they can be drawn without the LadderMap and PeakArea objects (e.g. in a
+report worker process). matplotlib is imported on first use.
+
+Long traces can be downsampled with max_points: every bin keeps its minimum
+and maximum (see fragment_analyzer.decimation), so the peaks look the same
+while far fewer points are drawn.
+"""
+
+import io
+
+import numpy as np
+
+from fragment_analyzer.decimation import decimate
+
+FIGSIZE = (20, 10)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int = None) -> tuple:
+    """
+    Reduces (x, y) to at most about max_points points by keeping the minimum
+    and the maximum of y in max_points // 2 equally sized bins.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    keep = decimate(x, y, max_points)
+
+    return x[keep], y[keep]
+
+
+def figure_to_png(fig, dpi: int = 72) -> bytes:
+    """
+    Renders fig to PNG and closes it, so it does not stay in pyplot's
+    figure registry.
+    """
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format="png", dpi=dpi)
+    finally:
+        plt.close(fig)
+
+    return buffer.getvalue()
+
+
+def best_sample_ladder_figure(
+    sample_ladder: np.ndarray,
+    best_correlated_peaks: np.ndarray,
+    ladder: np.ndarray,
+    best_correlation: float,
+    max_points: int = None,
+):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=FIGSIZE)
+    ax.plot(*downsample(np.arange(sample_ladder.size), sample_ladder, max_points))
+    ax.plot(best_correlated_peaks, sample_ladder[best_correlated_peaks], "o")
+    ax.set_title(f"Correlation with Ladder: {best_correlation * 100: .2f}")
+
+    for peak, size in zip(best_correlated_peaks, ladder):
+        ax.text(peak, sample_ladder[peak], size)
+
+    ax.set_ylabel("intensity")
+    ax.set_xlabel("time")
+    ax.grid()
+
+    return fig
+
+
+def ladder_correlation_figure(ladder: np.ndarray, peaks: np.ndarray):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=FIGSIZE)
+    ax.plot(ladder, peaks, "o")
+    ax.set_xlabel("Basepairs")
+    ax.set_ylabel("Time")
+    ax.grid()
+    ax.set_title("Correlation of found peaks with size-standard")
+
+    return fig
+
+
+def raw_data_figure(
+    step_adjusted: np.ndarray, intensity: np.ndarray, max_points: int = None
+):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=FIGSIZE)
+    ax.plot(*downsample(step_adjusted, intensity, max_points))
+
+    ax.set_ylabel("intensity")
+    ax.set_xlabel("basepairs")
+    ax.grid()
+    ax.set_title("Raw data")
+
+    return fig
+
+
+def peak_widths_figure(
+    x: np.ndarray, y: np.ndarray, peaks_index: np.ndarray, max_points: int = None
+):
+    """
+    The trace x, y around the peaks at peaks_index.
+    """
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=FIGSIZE)
+
+    peaks_x = x[peaks_index]
+    show = (x > peaks_x.min() - 10) & (x < peaks_x.max() + 10)
+
+    ax.plot(*downsample(x[show], y[show], max_points))
+    ax.plot(peaks_x, y[peaks_index], "o")
+
+    ax.set_ylabel("intensity")
+    ax.set_xlabel("basepairs")
+    ax.grid()
+
+    return fig
+
+
+def model_fit_figure(xs: list, ys: list, fitted: list, areas: list, quotient: float):
+    """
+    One panel per divided peak with the raw data and the fitted model.
+    """
+    import matplotlib.pyplot as plt
+
+    fig, axs = plt.subplots(1, len(xs), sharey=True, figsize=FIGSIZE)
+    axs = np.atleast_1d(axs)
+
+    for i, ax in enumerate(axs):
+        ax.plot(xs[i], ys[i], "o")
+        ax.plot(xs[i], fitted[i])
+        ax.set_title(f"Peak {i + 1} area: {areas[i]: .1f}")
+        ax.grid()
+
+    fig.suptitle(f"Quotient: {quotient: .2f}")
+    fig.legend(["Raw data", "Model"])
+    fig.supxlabel("basepairs")
+    fig.supylabel("intensity")
+
+    return fig
@@ -1,7 +1,19 @@
-import panel as pn
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+
+import panel as pn
+
+from fragment_analyzer import plotting
+from fragment_analyzer.reports import vega_plots
 from fragment_analyzer.ladder_map import LadderMap
 from fragment_analyzer.peak_area import PeakArea
+from fragment_analyzer.reports.report_data import report_data
+from fragment_analyzer.shared_traces import (
+    SharedTraceStore,
+    resolve_report_data,
+    share_report_data,
+)
 
 pn.extension("tabulator")
 pn.extension("vega", sizing_mode="stretch_width", template="fast")
@@ -9,10 +21,38 @@ pn.widgets.Tabulator.theme = "modern"
 
 
 class Report:
-    def __init__(self, laddermap: LadderMap, peakarea: PeakArea):
-        self.laddermap = laddermap
-        self.peakarea = peakarea
-        self.name = self.peakarea.file_name
+    """
+    HTML report of one sample.
+
+    Figures are rendered to PNG and closed right away, and traces longer
+    than max_points are downsampled (None draws every point).
+
+    With interactive, the traces are zoomable Vega-Lite plots of decimated
+    traces that keep full resolution around the peaks (see
+    fragment_analyzer.reports.vega_plots), each less than half the size of
+    its PNG at the default max_points. Only the fits of the peaks stay a PNG.
+
+    Example usage:
+    report = Report(laddermap, peakarea)
+    report.generate_report().save("report.html")
+    """
+
+    def __init__(
+        self,
+        laddermap: LadderMap = None,
+        peakarea: PeakArea = None,
+        data: dict = None,
+        max_points: int = 1_000,
+        dpi: int = 72,
+        interactive: bool = True,
+        decimation: str = "minmax",
+    ):
+        self.data = data if data is not None else report_data(laddermap, peakarea)
+        self.name = self.data["name"]
+        self.max_points = max_points
+        self.dpi = dpi
+        self.interactive = interactive
+        self.decimation = decimation
 
     def header(
         self,
@@ -29,10 +69,10 @@ class Report:
             f"""
             {text}
             """,
-            background=bg_color,
             height=height,
             margin=10,
-            style={
+            styles={
+                "background": bg_color,
                 "color": "white",
                 "padding": "10px",
                 "text-align": f"{textalign}",
@@ -40,8 +80,89 @@ class Report:
             },
         )
 
-    def generate_report(self):
-        head = self.header(
+    def figure(self, fig):
+        return pn.pane.PNG(
+            plotting.figure_to_png(fig, dpi=self.dpi), sizing_mode="scale_width"
+        )
+
+    def vega(self, spec: dict):
+        return pn.pane.Vega(spec, sizing_mode="stretch_width")
+
+    def raw_data_plot(self):
+        data = self.data
+        if not self.interactive:
+            return self.figure(
+                plotting.raw_data_figure(
+                    data["step_adjusted"], data["intensity"], self.max_points
+                )
+            )
+
+        peaks = data["window"][data["peaks_index"]] if data["found_peaks"] else None
+        return self.vega(
+            vega_plots.raw_data_spec(
+                data["step_adjusted"],
+                data["intensity"],
+                peaks,
+                self.max_points,
+                self.decimation,
+            )
+        )
+
+    def ladder_plots(self) -> list:
+        data = self.data
+        if not self.interactive:
+            return [
+                self.figure(
+                    plotting.best_sample_ladder_figure(
+                        data["sample_ladder"],
+                        data["best_correlated_peaks"],
+                        data["ladder"],
+                        data["best_correlation"],
+                        self.max_points,
+                    )
+                ),
+                self.figure(
+                    plotting.ladder_correlation_figure(
+                        data["ladder"], data["best_correlated_peaks"]
+                    )
+                ),
+            ]
+
+        return [
+            self.vega(
+                vega_plots.best_sample_ladder_spec(
+                    data["sample_ladder"],
+                    data["best_correlated_peaks"],
+                    data["ladder"],
+                    data["best_correlation"],
+                    self.max_points,
+                    self.decimation,
+                )
+            ),
+            self.vega(
+                vega_plots.ladder_correlation_spec(
+                    data["ladder"], data["best_correlated_peaks"]
+                )
+            ),
+        ]
+
+    def peaks_plot(self):
+        data = self.data
+        x = data["step_adjusted"][data["window"]]
+        y = data["intensity"][data["window"]]
+        if not self.interactive:
+            return self.figure(
+                plotting.peak_widths_figure(x, y, data["peaks_index"], self.max_points)
+            )
+
+        return self.vega(
+            vega_plots.peak_widths_spec(
+                x, y, data["peaks_index"], self.max_points, self.decimation
+            )
+        )
+
+    def title(self):
+        return self.header(
             text=f"""
             # Fragment Analysis Report
             ## Report of {self.name}
@@ -50,47 +171,58 @@ class Report:
             bg_color="#03a1fc",
             height=185,
         )
+
+    def peak_table(self):
+        return pn.widgets.Tabulator(
+            self.data["peaks"],
+            show_index=False,
+            name="Peak information",
+        )
+
+    def model_fitting_report(self) -> list:
+        model_fitting_report = []
+        for i, x in enumerate(self.data["fit_report"]):
+            markdown = pn.pane.Markdown(f"## Peak number {i + 1}:")
+            model_fitting_report.append(markdown)
+            model_fitting_report.append(x)
+            model_fitting_report.append(pn.layout.Divider())
+
+        return model_fitting_report
+
+    def generate_report(self):
+        data = self.data
+
         ### ----- Raw Data plot ----- ###
         raw_data_markdown = self.header("# Raw Data plot", height=100)
-        raw_data_plot = pn.pane.Matplotlib(self.peakarea.plot_raw_data)
+        raw_data_plot = self.raw_data_plot()
 
         ### ----- Ladder info and raw data----- ###
         best_ladder_markdown = self.header("# Fit of the Ladder", height=100)
-        best_ladder_plot = pn.pane.Matplotlib(self.laddermap.plot_best_sample_ladder)
-
-        correlation_plot = pn.pane.Matplotlib(
-            self.laddermap.plot_ladder_correlation,
-        )
+        best_ladder_plot, correlation_plot = self.ladder_plots()
 
         ### ----- Peaks info ----- ###
         peaks_markdown = self.header("# Peaks", height=100)
-        peaks_plot = pn.pane.Matplotlib(self.peakarea.plot_peak_widths)
+        peaks_plot = self.peaks_plot()
 
         ### ----- Quotient info ----- ###
         quotient_markdown = self.header("# Areas", height=100)
-        quotient_plot = pn.pane.Matplotlib(self.peakarea.plot_lmfit_model)
+        quotient_plot = self.figure(
+            plotting.model_fit_figure(
+                data["xs"], data["ys"], data["fitted"], data["areas"], data["quotient"]
+            )
+        )
 
         ### ----- Quotient info ----- ###
         df_markdown = self.header("# Peak Information Table", height=100)
-        df_table = pn.widgets.Tabulator(
-            self.peakarea.peak_position_area_dataframe,
-            show_index=False,
-            name="Peak information",
-        )
+        df_table = self.peak_table()
 
         ### ----- Model fitting info ----- ###
         model_fitting_markdown = self.header("# Fitting of the Models", height=100)
-        model_fitting_report = []
-        for i, x in enumerate(self.peakarea.fit_report):
-            markdown = pn.pane.Markdown(f"## Peak number {i + 1}:")
-            model_fitting_report.append(markdown)
-            model_fitting_report.append(x)
-            model_fitting_report.append(pn.layout.Divider())
 
         ### CREATE REPORT ###
 
         return pn.Column(
-            head,
+            self.title(),
             raw_data_markdown,
             raw_data_plot,
             pn.layout.Divider(),
@@ -108,32 +240,103 @@ class Report:
             df_table,
             pn.layout.Divider(),
             model_fitting_markdown,
-            *model_fitting_report,
+            *self.model_fitting_report(),
         )
 
     def generate_no_peaks_report(self):
-        head = self.header(
-            text=f"""
-            # Fragment Analysis Report
-            ## Report of {self.name}
-            """,
-            fontsize="20px",
-            bg_color="#03a1fc",
-            height=185,
-        )
-
         no_peaks_markdown = self.header(
             "# No peaks could be generated. Please look at the raw data.", height=100
         )
-        raw_plot = pn.pane.Matplotlib(self.peakarea.plot_raw_data)
+        raw_plot = self.raw_data_plot()
         return pn.Column(
-            head,
+            self.title(),
             no_peaks_markdown,
             raw_plot,
         )
 
+    def generate_summary_report(self):
+        """
+        Report without figures: the ladder correlation, the peak table and
+        the fit reports.
+        """
+        ladder_markdown = pn.pane.Markdown(
+            f"**Correlation with Ladder:** {self.data['best_correlation'] * 100: .2f}"
+        )
+
+        if not self.data["found_peaks"]:
+            return pn.Column(
+                self.title(),
+                ladder_markdown,
+                self.header("# No peaks could be generated.", height=100),
+            )
+
+        return pn.Column(
+            self.title(),
+            ladder_markdown,
+            pn.pane.Markdown(f"**Quotient:** {self.data['quotient']: .2f}"),
+            self.header("# Peak Information Table", height=100),
+            self.peak_table(),
+            pn.layout.Divider(),
+            self.header("# Fitting of the Models", height=100),
+            *self.model_fitting_report(),
+        )
+
+
+def save_report(
+    data: dict,
+    folder: str,
+    figures: bool = True,
+    max_points: int = 1_000,
+    interactive: bool = True,
+) -> Path:
+    """
+    Renders the report of report_data (or of share_report_data) and saves it
+    to folder. Returns the path of the HTML file.
+    """
+    # the shared traces are unmapped once the report is saved
+    with resolve_report_data(data) as data:
+        return _save_report(data, folder, figures, max_points, interactive)
+
+
+def _save_report(
+    data: dict, folder: str, figures: bool, max_points: int, interactive: bool
+) -> Path:
+    report = Report(data=data, max_points=max_points, interactive=interactive)
+
+    # create the output folder if it doesn't exist
+    outpath = Path(folder)
+    outpath.mkdir(parents=True, exist_ok=True)
+
+    # If no peaks could be found
+    if not data["found_peaks"]:
+        outname = outpath / f"FAILED-fragment_analysis-report-{report.name}.html"
+        layout = (
+            report.generate_summary_report()
+            if not figures
+            else report.generate_no_peaks_report()
+        )
+
+    else:
+        outname = outpath / f"fragment_analysis-report-{report.name}.html"
+        layout = (
+            report.generate_summary_report()
+            if not figures
+            else report.generate_report()
+        )
 
-def generate_report(laddermap: LadderMap, peakarea: PeakArea, folder: str) -> None:
+    layout.save(outname, title=report.name)
+
+    return outname
+
+
+def generate_report(
+    laddermap: LadderMap,
+    peakarea: PeakArea,
+    folder: str,
+    figures: bool = True,
+    max_points: int = 1_000,
+    interactive: bool = True,
+) -> None:
     """
     Generates an HTML report for a given ladder map and peak area, and saves it to the specified folder.
 
@@ -141,6 +344,9 @@ def generate_report(laddermap: LadderMap, peakarea: PeakArea, folder: str) -> No
         laddermap: A LadderMap object containing the ladder map data.
         peakarea: A PeakArea object containing the peak area data.
         folder: A string representing the folder where the report will be saved.
+        figures: If False, a summary report without figures is saved.
+        max_points: Traces are downsampled to about this many points (None keeps all).
+        interactive: Zoomable plots of decimated traces instead of PNGs.
 
     Returns:
         None
@@ -153,19 +359,56 @@ def generate_report(laddermap: LadderMap, peakarea: PeakArea, folder: str) -> No
     # generate a report and save it to a folder called 'reports'
     generate_report(laddermap, peakarea, 'reports')
     """
+    save_report(
+        report_data(laddermap, peakarea), folder, figures, max_points, interactive
+    )
 
-    report = Report(laddermap, peakarea)
 
-    # create the output folder if it doesn't exist
-    outpath = Path(folder)
-    if not outpath.exists():
-        outpath.mkdir(parents=True)
+def generate_reports(
+    results: list,
+    folder: str,
+    workers: int = None,
+    figures: bool = True,
+    max_points: int = 1_000,
+    interactive: bool = True,
+) -> list:
+    """
+    Generates the reports of many samples, rendered in parallel over a
+    process pool.
 
-    # If no peaks could be found
-    if not peakarea.found_peaks:
-        outname = outpath / f"FAILED-fragment_analysis-report-{report.name}.html"
-        report.generate_no_peaks_report().save(outname, title=report.name)
+    Args:
+        results: (LadderMap, PeakArea) pairs.
+        folder: The folder where the reports will be saved.
+        workers: Number of processes. Defaults to the number of CPUs, 1 renders
+            everything in the current process.
+        figures: If False, summary reports without figures are saved.
+        max_points: Traces are downsampled to about this many points (None keeps all).
+        interactive: Zoomable plots of decimated traces instead of PNGs.
 
-    else:
-        outname = outpath / f"fragment_analysis-report-{report.name}.html"
-        report.generate_report().save(outname, title=report.name)
+    Returns:
+        The paths of the saved reports, in the order of results.
+
+    Example usage:
+    generate_reports([(laddermap, peakarea), ...], "reports", workers=8)
+    """
+    datas = [report_data(laddermap, peakarea) for laddermap, peakarea in results]
+    workers = workers or os.cpu_count()
+
+    if workers == 1 or len(datas) <= 1:
+        return [save_report(x, folder, figures, max_points, interactive) for x in datas]
+
+    # the workers read the traces from shared memory instead of unpickling them
+    with SharedTraceStore() as store, ProcessPoolExecutor(
+        max_workers=min(workers, len(datas))
+    ) as executor:
+        datas = [share_report_data(x, store) for x in datas]
+        return list(
+            executor.map(
+                save_report,
+                datas,
+                [folder] * len(datas),
+                [figures] * len(datas),
+                [max_points] * len(datas),
+                [interactive] * len(datas),
+            )
+        )
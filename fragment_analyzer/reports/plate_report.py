@@ -0,0 +1,237 @@
+"""
+One HTML report of a whole plate.
+
+The page holds a sortable summary table of all samples and one collapsed
+section per sample. The figures are saved once as PNG files next to the
+report (rendered over a process pool) and referenced with lazily loaded
+<img> tags, so the HTML only grows by a little markup per sample, the
+Panel/Bokeh resources are included once and only the opened sections are
+loaded by the browser.
+"""
+
+import html
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import pandas as pd
+import panel as pn
+
+from fragment_analyzer import plotting
+from fragment_analyzer.reports.report_data import report_data
+from fragment_analyzer.shared_traces import (
+    SharedTraceStore,
+    resolve_report_data,
+    share_report_data,
+)
+
+pn.extension("tabulator")
+pn.widgets.Tabulator.theme = "modern"
+
+
+def plate_summary(datas: list, summary: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    One row per sample with the ladder correlation, the quotient and the
+    area of every peak.
+
+    Args:
+        datas: report_data of the samples.
+        summary: Optionally the summary of batch_analysis, to also list the
+            files that failed.
+    """
+    rows = []
+    for data in datas:
+        row = {
+            "file_name": data["name"],
+            "ladder_correlation": data["best_correlation"],
+            "peaks": 0,
+            "quotient": None,
+        }
+        if data["found_peaks"]:
+            peaks = data["peaks"]
+            row.update(peaks=peaks.shape[0], quotient=data["quotient"])
+            row.update(
+                {
+                    f"area {name}": area
+                    for name, area in zip(peaks["peak_name"], peaks["area"])
+                }
+            )
+        rows.append(row)
+
+    table = pd.DataFrame(rows) if rows else pd.DataFrame(columns=["file_name"])
+
+    if summary is not None:
+        # ladder_qc is only in the summary of a batch with plate_qc
+        columns = [
+            x for x in ("file_name", "status", "error", "ladder_qc") if x in summary
+        ]
+        table = summary[columns].merge(table, on="file_name", how="left")
+
+    return table.sort_values("file_name", ignore_index=True)
+
+
+def _slug(name: str) -> str:
+    return "".join(x if x.isalnum() or x in "-_." else "_" for x in name)
+
+
+def save_sample_figures(
+    data: dict, assets: str, max_points: int = 2_000, dpi: int = 72
+) -> list:
+    """
+    Saves the figures of one sample as PNG files in assets.
+    Returns the file names.
+    """
+    with resolve_report_data(data) as data:
+        figures = {
+            "raw_data": plotting.raw_data_figure(
+                data["step_adjusted"], data["intensity"], max_points
+            ),
+            "ladder": plotting.best_sample_ladder_figure(
+                data["sample_ladder"],
+                data["best_correlated_peaks"],
+                data["ladder"],
+                data["best_correlation"],
+                max_points,
+            ),
+        }
+        if data["found_peaks"]:
+            figures["areas"] = plotting.model_fit_figure(
+                data["xs"], data["ys"], data["fitted"], data["areas"], data["quotient"]
+            )
+
+        names = []
+        for figure, fig in figures.items():
+            name = f"{_slug(data['name'])}-{figure}.png"
+            (Path(assets) / name).write_bytes(plotting.figure_to_png(fig, dpi=dpi))
+            names.append(name)
+
+    return names
+
+
+def sample_section(data: dict, images: list, assets_url: str) -> pn.Card:
+    """
+    Collapsed section of one sample. The figures are only loaded by the
+    browser when the section is opened.
+    """
+    parts = [
+        f'<img src="{assets_url}/{name}" loading="lazy" style="width: 100%;">'
+        for name in images
+    ]
+
+    if data["found_peaks"]:
+        parts.append(data["peaks"].to_html(index=False, float_format="%.2f"))
+        parts.extend(
+            f"<details><summary>Fit of peak {i + 1}</summary>"
+            f"<pre>{html.escape(report)}</pre></details>"
+            for i, report in enumerate(data["fit_report"])
+        )
+    else:
+        parts.append("<p>No peaks could be found. Please look at the raw data.</p>")
+
+    return pn.Card(
+        pn.pane.HTML("\n".join(parts), sizing_mode="stretch_width"),
+        title=data["name"],
+        collapsed=True,
+        sizing_mode="stretch_width",
+    )
+
+
+def save_plate_report(
+    datas: list,
+    outname: str = "plate_report.html",
+    summary: pd.DataFrame = None,
+    workers: int = None,
+    figures: bool = True,
+    max_points: int = 2_000,
+    dpi: int = 72,
+) -> Path:
+    """
+    Saves the plate report of report_data dicts.
+    See generate_plate_report. Returns the path of the HTML file.
+    """
+    outname = Path(outname)
+    outname.parent.mkdir(parents=True, exist_ok=True)
+    datas = sorted(datas, key=lambda x: x["name"])
+
+    if figures:
+        assets = outname.parent / f"{outname.stem}_assets"
+        assets.mkdir(exist_ok=True)
+
+        render = partial(
+            save_sample_figures, assets=str(assets), max_points=max_points, dpi=dpi
+        )
+        workers = min(workers or os.cpu_count(), max(len(datas), 1))
+        if workers == 1:
+            images = list(map(render, datas))
+        else:
+            with SharedTraceStore() as store, ProcessPoolExecutor(
+                max_workers=workers
+            ) as executor:
+                shared = [share_report_data(x, store) for x in datas]
+                images = list(executor.map(render, shared))
+    else:
+        images = [[] for _ in datas]
+
+    table = pn.widgets.Tabulator(
+        plate_summary(datas, summary),
+        show_index=False,
+        header_filters=True,
+        pagination="local",
+        page_size=100,
+        name="Samples",
+        sizing_mode="stretch_width",
+    )
+
+    layout = pn.Column(
+        pn.pane.Markdown(
+            f"# Fragment Analysis Plate Report\n{len(datas)} samples",
+            styles={"background": "#03a1fc", "color": "white", "padding": "10px"},
+        ),
+        table,
+        pn.layout.Divider(),
+        *(
+            sample_section(data, names, f"{outname.stem}_assets")
+            for data, names in zip(datas, images)
+        ),
+        sizing_mode="stretch_width",
+    )
+    layout.save(outname, title=outname.stem)
+
+    return outname
+
+
+def generate_plate_report(
+    results: list,
+    outname: str = "plate_report.html",
+    workers: int = None,
+    figures: bool = True,
+    max_points: int = 2_000,
+) -> Path:
+    """
+    Generates one HTML report of many samples.
+
+    The report has a sortable and filterable summary table of the ladder
+    correlations, quotients and areas and one collapsed section per sample.
+    The figures are saved in a folder next to the report,
+    "<report name>_assets", and only loaded when a section is opened.
+
+    Args:
+        results: (LadderMap, PeakArea) pairs.
+        outname: Path of the HTML file.
+        workers: Number of processes rendering the figures. Defaults to the
+            number of CPUs.
+        figures: If False, the sections only hold the tables and fit reports.
+        max_points: Traces are downsampled to about this many points (None keeps all).
+
+    Returns:
+        The path of the report.
+
+    Example usage:
+    generate_plate_report([(laddermap, peakarea), ...], "reports/plate.html")
+    """
+    datas = [report_data(laddermap, peakarea) for laddermap, peakarea in results]
+
+    return save_plate_report(
+        datas, outname, workers=workers, figures=figures, max_points=max_points
+    )
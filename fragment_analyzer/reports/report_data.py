@@ -0,0 +1,41 @@
+"""
+The results of a sample as shown in the reports, without importing panel,
+so batch workers can collect them cheaply.
+"""
+
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.peak_area import PeakArea
+
+
+def report_data(laddermap: LadderMap, peakarea: PeakArea) -> dict:
+    """
+    The results of one sample that are shown in a report, as plain arrays,
+    DataFrames and strings. It is small, picklable and all a Report needs,
+    so reports can be rendered in other processes.
+    """
+    data = {
+        "name": peakarea.file_name,
+        "found_peaks": peakarea.found_peaks,
+        "sample_ladder": laddermap.sample_ladder,
+        "best_correlated_peaks": laddermap.best_correlated_peaks,
+        "ladder": laddermap.ladder,
+        "best_correlation": laddermap.best_correlation,
+        "step_adjusted": peakarea.step_adjusted,
+        "intensity": peakarea.intensity,
+    }
+
+    if peakarea.found_peaks:
+        xs, ys = peakarea.peak_arrays()
+        data.update(
+            window=peakarea.window,
+            peaks_index=peakarea.peaks_index,
+            xs=xs,
+            ys=ys,
+            fitted=peakarea.fitted,
+            areas=[p["amplitude"] for p in peakarea.fit_params],
+            quotient=peakarea.quotient,
+            peaks=peakarea.peak_position_area_dataframe,
+            fit_report=peakarea.fit_report,
+        )
+
+    return data
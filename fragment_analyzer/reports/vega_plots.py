@@ -0,0 +1,202 @@
+"""
+Interactive (Vega-Lite) plots of the analysis results for the reports.
+
+The traces are decimated (see fragment_analyzer.decimation) to about
+max_points points, at full resolution within radius points of the peaks, and
+embedded as two rounded arrays instead of one object per point. About 1000
+points are enough for the width of a report; a spec then holds less than half
+the bytes of the PNG it replaces (see benchmarks/bench_report_size.py), and
+the plots can be zoomed and panned in the browser.
+
+The specs are plain dicts built from arrays, as the matplotlib figures of
+fragment_analyzer.plotting, and shown with pn.pane.Vega.
+"""
+
+import numpy as np
+
+from fragment_analyzer.decimation import decimate, peak_neighbourhood
+
+SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+HEIGHT = 400
+
+
+def _values(decimals: dict, **arrays) -> dict:
+    # one row of arrays, split into points by a flatten transform
+    return {
+        "values": [
+            {
+                name: np.round(np.asarray(array, dtype=float), decimals[name]).tolist()
+                for name, array in arrays.items()
+            }
+        ]
+    }
+
+
+def _encoding(x_title: str, y_title: str) -> dict:
+    return {
+        "x": {"field": "x", "type": "quantitative", "title": x_title},
+        "y": {"field": "y", "type": "quantitative", "title": y_title},
+    }
+
+
+def trace_spec(
+    x: np.ndarray,
+    y: np.ndarray,
+    title: str,
+    x_title: str,
+    y_title: str,
+    peaks: np.ndarray = None,
+    labels: list = None,
+    max_points: int = 1_000,
+    method: str = "minmax",
+    radius: int = 25,
+    x_decimals: int = 2,
+) -> dict:
+    """
+    A zoomable line of the trace (x, y), with the points at the indices peaks
+    (optionally labelled) marked.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    peaks = np.empty(0, dtype=int) if peaks is None else np.asarray(peaks, dtype=int)
+
+    keep = decimate(
+        x, y, max_points, method, keep=peak_neighbourhood(y.size, peaks, radius)
+    )
+    decimals = {"x": x_decimals, "y": 1, "label": 2}
+
+    layers = [
+        {
+            "data": _values(decimals, x=x[keep], y=y[keep]),
+            "transform": [{"flatten": ["x", "y"]}],
+            "mark": {"type": "line", "strokeWidth": 1},
+            "encoding": _encoding(x_title, y_title),
+            "params": [{"name": "zoom", "select": "interval", "bind": "scales"}],
+        }
+    ]
+
+    if peaks.size:
+        arrays = {"x": x[peaks], "y": y[peaks]}
+        if labels is not None:
+            arrays["label"] = labels
+        tooltip = [{"field": name, "type": "quantitative"} for name in arrays]
+        layers.append(
+            {
+                "data": _values(decimals, **arrays),
+                "transform": [{"flatten": list(arrays)}],
+                "mark": {"type": "point", "filled": True, "color": "#ff7f0e"},
+                "encoding": {**_encoding(x_title, y_title), "tooltip": tooltip},
+            }
+        )
+        if labels is not None:
+            layers.append(
+                {
+                    "data": layers[-1]["data"],
+                    "transform": layers[-1]["transform"],
+                    "mark": {"type": "text", "dy": -10},
+                    "encoding": {
+                        **_encoding(x_title, y_title),
+                        "text": {"field": "label", "type": "quantitative"},
+                    },
+                }
+            )
+
+    return {
+        "$schema": SCHEMA,
+        "title": title,
+        "width": "container",
+        "height": HEIGHT,
+        "layer": layers,
+    }
+
+
+def raw_data_spec(
+    step_adjusted: np.ndarray,
+    intensity: np.ndarray,
+    peaks: np.ndarray = None,
+    max_points: int = 1_000,
+    method: str = "minmax",
+) -> dict:
+    """
+    The whole trace, at full resolution around peaks (indices into the trace).
+    """
+    return trace_spec(
+        step_adjusted,
+        intensity,
+        "Raw data",
+        "basepairs",
+        "intensity",
+        peaks=peaks,
+        max_points=max_points,
+        method=method,
+    )
+
+
+def best_sample_ladder_spec(
+    sample_ladder: np.ndarray,
+    best_correlated_peaks: np.ndarray,
+    ladder: np.ndarray,
+    best_correlation: float,
+    max_points: int = 1_000,
+    method: str = "minmax",
+) -> dict:
+    """
+    The ladder channel with the assigned ladder peaks labelled by their size.
+    """
+    return trace_spec(
+        np.arange(sample_ladder.size),
+        sample_ladder,
+        f"Correlation with Ladder: {best_correlation * 100: .2f}",
+        "time",
+        "intensity",
+        peaks=best_correlated_peaks,
+        labels=ladder,
+        max_points=max_points,
+        method=method,
+        x_decimals=0,
+    )
+
+
+def ladder_correlation_spec(ladder: np.ndarray, peaks: np.ndarray) -> dict:
+    return {
+        "$schema": SCHEMA,
+        "title": "Correlation of found peaks with size-standard",
+        "width": "container",
+        "height": HEIGHT,
+        "data": _values({"x": 2, "y": 0}, x=ladder, y=peaks),
+        "transform": [{"flatten": ["x", "y"]}],
+        "mark": {"type": "point", "filled": True},
+        "encoding": {
+            **_encoding("Basepairs", "Time"),
+            "tooltip": [
+                {"field": "x", "type": "quantitative", "title": "basepairs"},
+                {"field": "y", "type": "quantitative", "title": "time"},
+            ],
+        },
+    }
+
+
+def peak_widths_spec(
+    x: np.ndarray,
+    y: np.ndarray,
+    peaks_index: np.ndarray,
+    max_points: int = 1_000,
+    method: str = "minmax",
+) -> dict:
+    """
+    The trace x, y around the peaks at peaks_index.
+    """
+    x = np.asarray(x)
+    peaks_x = x[peaks_index]
+    show = np.flatnonzero((x > peaks_x.min() - 10) & (x < peaks_x.max() + 10))
+
+    return trace_spec(
+        x[show],
+        np.asarray(y)[show],
+        "Peaks",
+        "basepairs",
+        "intensity",
+        peaks=np.searchsorted(show, peaks_index),
+        max_points=max_points,
+        method=method,
+    )
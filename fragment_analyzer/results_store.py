@@ -0,0 +1,203 @@
+"""
+Columnar store of analysis results across runs, as partitioned Parquet.
+
+Three tables are stored, each as a Hive partitioned Parquet dataset:
+
+    folder/peaks/run=<run>/*.parquet    one row per peak
+    folder/ladder/run=<run>/*.parquet   one row per sample (ladder QC)
+    folder/fits/run=<run>/*.parquet     one row per fitted parameter
+
+Every row holds the file name and the run, plate, well, sample and
+instrument read from the .fsa file, so e.g. quotient trends per plate or
+well over months of runs are a scan of a few columns.
+
+Needs pyarrow (pip install pyarrow, or the "parquet" extra).
+"""
+
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.peak_area import PeakArea
+
+TABLES = ["peaks", "ladder", "fits"]
+
+# metadata column -> ABIF tag
+METADATA_TAGS = {
+    "run": "RunN1",
+    "run_date": "RUND1",
+    "plate": "CTNM1",
+    "well": "TUBE1",
+    "sample": "SpNm1",
+    "instrument": "MCHN1",
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "The ResultsStore needs pyarrow. Install it with 'pip install pyarrow'."
+        ) from e
+
+    return pyarrow, pyarrow.parquet
+
+
+def sample_metadata(laddermap: LadderMap) -> dict:
+    """
+    File name, run, plate, well, sample and instrument of the sample.
+    Missing tags are stored as "unknown".
+    """
+    metadata = {"file_name": laddermap.data_.name}
+    for column, tag in METADATA_TAGS.items():
+        value = laddermap.data.get(tag)
+        metadata[column] = str(value) if value not in (None, "") else "unknown"
+
+    return metadata
+
+
+def result_tables(
+    laddermap: LadderMap, peakarea: PeakArea, channel: str = "DATA1"
+) -> dict:
+    """
+    The rows of one sample for the peaks, ladder and fits tables, as DataFrames.
+    """
+    metadata = sample_metadata(laddermap)
+
+    ladder = pd.DataFrame(
+        [
+            {
+                **metadata,
+                "best_correlation": float(laddermap.best_correlation),
+                "ladder_peaks": laddermap.best_correlated_peaks.astype(np.int64),
+                "ladder_sizes": np.asarray(laddermap.ladder, dtype=float),
+                "calibration_method": laddermap.calibration_method,
+                "found_peaks": bool(peakarea.found_peaks),
+            }
+        ]
+    )
+
+    if not peakarea.found_peaks:
+        return {"peaks": None, "ladder": ladder, "fits": None}
+
+    peaks = peakarea.peak_position_area_dataframe.assign(
+        **metadata, channel=channel
+    ).astype({"peak_height": float, "fitted_peak_height": float, "quotient": float})
+
+    fits = pd.DataFrame(
+        [
+            {
+                **metadata,
+                "channel": channel,
+                "peak_name": f"Peak {i + 1}",
+                "model": peakarea.model,
+                "parameter": name,
+                "value": float(value),
+            }
+            for i, parameters in enumerate(peakarea.fit_params)
+            for name, value in parameters.items()
+        ]
+    )
+
+    return {"peaks": peaks, "ladder": ladder, "fits": fits}
+
+
+class ResultsStore:
+    """
+    Appends results to partitioned Parquet datasets and reads them back.
+
+    Every append writes one new file per table and partition, so appending
+    the results of a whole batch at once gives fewer and larger files than
+    appending sample by sample. compact() merges the files of a partition.
+
+    Example usage:
+    store = ResultsStore("results")
+    store.append([(laddermap, peakarea), ...])
+    store.read("peaks", columns=["plate", "well", "quotient"], filters=[("plate", "==", "4062")])
+    """
+
+    def __init__(self, folder: str, partition: str = "run") -> None:
+        if partition not in METADATA_TAGS:
+            raise NotImplementedError(
+                f"{partition} is not implemented! Options: [{', '.join(METADATA_TAGS)}]"
+            )
+
+        self.pa, self.pq = _import_pyarrow()
+        self.folder = Path(folder)
+        self.partition = partition
+
+    def append(self, results: list, channel: str = "DATA1") -> None:
+        """
+        Appends the results of (LadderMap, PeakArea) pairs.
+        """
+        self.append_tables(
+            [
+                result_tables(laddermap, peakarea, channel)
+                for laddermap, peakarea in results
+            ]
+        )
+
+    def append_tables(self, tables: list) -> None:
+        """
+        Appends result_tables dicts (e.g. returned by batch workers).
+        """
+        for name in TABLES:
+            frames = [x[name] for x in tables if x[name] is not None]
+            if not frames:
+                continue
+
+            table = self.pa.Table.from_pandas(
+                pd.concat(frames, ignore_index=True), preserve_index=False
+            )
+            self.pq.write_to_dataset(
+                table,
+                self.folder / name,
+                partition_cols=[self.partition],
+                basename_template=f"{uuid.uuid4().hex}-{{i}}.parquet",
+            )
+
+    def read(self, table: str = "peaks", columns: list = None, filters=None):
+        """
+        Reads a table as a DataFrame. Only the given columns are read, and
+        filters (pyarrow filters, e.g. [("plate", "==", "4062")]) on the
+        partition column skip whole partitions.
+        """
+        if table not in TABLES:
+            raise NotImplementedError(
+                f"{table} is not implemented! Options: [{', '.join(TABLES)}]"
+            )
+        if not (self.folder / table).exists():
+            return pd.DataFrame(columns=columns)
+
+        return self.pq.read_table(
+            self.folder / table, columns=columns, filters=filters
+        ).to_pandas()
+
+    def compact(self) -> None:
+        """
+        Rewrites every partition that has more than one file as one file.
+
+        The merged file is moved into place before the old files are removed,
+        so readers never see an empty partition and an interrupted compact
+        loses no rows (it can leave them twice until the old files are removed).
+        """
+        for name in TABLES:
+            for partition in (self.folder / name).glob(f"{self.partition}=*"):
+                files = sorted(partition.glob("*.parquet"))
+                if len(files) < 2:
+                    continue
+
+                table = self.pa.concat_tables(
+                    [self.pq.read_table(x) for x in files], promote_options="default"
+                )
+                # hidden files are skipped by readers until renamed
+                basename = f"{uuid.uuid4().hex}-0.parquet"
+                self.pq.write_table(table, partition / f".{basename}")
+                (partition / f".{basename}").rename(partition / basename)
+                for x in files:
+                    x.unlink()
@@ -0,0 +1,274 @@
+"""
+Shared-memory store of the traces of many samples, for process pools.
+
+The arrays of a sample (decoded channels, baseline corrected intensities and
+the calibrated basepair axis) are copied once into one shared memory block.
+A TraceHandle is a small picklable description of that block; workers open it
+as read-only NumPy views, so the traces are not pickled across processes and
+every trace is in memory only once.
+
+The process that creates a SharedTraceStore owns the blocks and unlinks them
+when the store is closed. The handles are opened in its child processes
+(e.g. a process pool, forked or spawned), which share its resource tracker,
+so only the owner registers and unregisters the blocks. Workers unmap a
+block when the last SharedTraces of it is closed.
+
+Example usage:
+with SharedTraceStore() as store:
+    handle = store.put_abif("sample.fsa")
+    laddermap = LadderMap(handle, "LIZ")  # in a worker
+
+    handle = store.put_laddermap(laddermap)
+    peakarea = PeakArea(handle, "gauss")  # in a worker
+"""
+
+import sys
+from collections.abc import Mapping
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# the arrays of a report_data dict that are shared, see share_report_data
+REPORT_ARRAYS = ("sample_ladder", "step_adjusted", "intensity")
+
+# name -> SharedMemory, the blocks mapped in this process
+_attached = {}
+# name -> number of open SharedTraces, of the blocks this process did not create
+_users = {}
+
+
+def _attach(name: str):
+    if name not in _attached:
+        from multiprocessing import shared_memory
+
+        # before 3.13 attaching registers the block again with the resource
+        # tracker of the owner, which keeps a set of names, so the owner's
+        # unlink still unregisters it once
+        kwargs = {"track": False} if sys.version_info >= (3, 13) else {}
+        _attached[name] = shared_memory.SharedMemory(name=name, **kwargs)
+        _users[name] = 0
+
+    if name in _users:
+        _users[name] += 1
+
+    return _attached[name]
+
+
+def _detach(name: str) -> None:
+    # the blocks of a store of this process are closed by the store
+    if name not in _users:
+        return
+
+    _users[name] -= 1
+    if _users[name] > 0:
+        return
+
+    try:
+        _attached[name].close()
+    except BufferError:
+        # views are still referenced, they keep the mapping alive
+        return
+    del _attached[name], _users[name]
+
+
+class TraceHandle:
+    """
+    Picklable reference to the arrays of one sample in shared memory.
+
+    Args:
+        name: Name of the shared memory block.
+        path: The .fsa file of the sample.
+        layout: Array name -> (offset, shape, dtype) in the block.
+    """
+
+    def __init__(self, name: str, path: str, layout: dict) -> None:
+        self.name = name
+        self.path = Path(path)
+        self.layout = layout
+
+    def open(self) -> "SharedTraces":
+        return SharedTraces(self)
+
+    def __repr__(self) -> str:
+        return f"TraceHandle({self.name!r}, {self.path.name!r}, {list(self.layout)})"
+
+
+class SharedTraces(Mapping):
+    """
+    Read-only mapping of array names to NumPy views of a TraceHandle.
+
+    Has data_ and adjusted_step_arrays like a LadderMap, so a PeakArea can be
+    built from the channels and the basepair axis stored by put_laddermap.
+    close (or a with block) unmaps the block once no views of it are left.
+    """
+
+    def __init__(self, handle: TraceHandle) -> None:
+        self.handle = handle
+        self.data_ = handle.path
+        self._shm = _attach(handle.name)
+        self._closed = False
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        offset, shape, dtype = self.handle.layout[key]
+        view = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset)
+        view.flags.writeable = False
+
+        return view
+
+    def __iter__(self):
+        return iter(self.handle.layout)
+
+    def __len__(self) -> int:
+        return len(self.handle.layout)
+
+    def adjusted_step_arrays(self, channel: str = "DATA1") -> tuple:
+        """
+        Returns the arrays (step_raw, step_adjusted, intensity) of channel,
+        as LadderMap.adjusted_step_arrays. Needs the basepairs array.
+        """
+        intensity = self[channel]
+        step_adjusted = self["basepairs"][: intensity.size]
+
+        keep = np.flatnonzero(step_adjusted >= 0)
+
+        return keep, step_adjusted[keep], intensity[keep]
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._shm = None
+            _detach(self.handle.name)
+
+    def __enter__(self) -> "SharedTraces":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class SharedTraceStore:
+    """
+    Owner of the shared memory blocks of many samples. Unlinks them on close.
+
+    Example usage:
+    with SharedTraceStore() as store:
+        handles = [store.put_abif(file) for file in files]
+        executor.map(analyse, handles)
+    """
+
+    def __init__(self) -> None:
+        self.names = []
+
+    def put(self, path: str, arrays: dict) -> TraceHandle:
+        """
+        Copies arrays (name -> NumPy array) into a new shared memory block.
+        """
+        from multiprocessing import shared_memory
+
+        arrays = {k: np.ascontiguousarray(v) for k, v in arrays.items()}
+
+        layout = {}
+        size = 0
+        for key, array in arrays.items():
+            # 8 byte alignment of every array
+            size += -size % 8
+            layout[key] = (size, array.shape, array.dtype.str)
+            size += array.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        _attached[shm.name] = shm
+        self.names.append(shm.name)
+
+        for key, array in arrays.items():
+            offset, shape, dtype = layout[key]
+            view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            view[...] = array
+            del view
+
+        return TraceHandle(shm.name, path, layout)
+
+    def put_abif(self, path: str, channels: list = None) -> TraceHandle:
+        """
+        Decodes the numeric channels (e.g. ["DATA1", "DATA205"], defaults to
+        all DATA channels) of an .fsa file into shared memory. A LadderMap
+        accepts the handle instead of the file.
+        """
+        from fragment_analyzer.abif import AbifReader
+
+        data = AbifReader(path)
+        if channels is None:
+            channels = [x for x in data if x.startswith("DATA")]
+
+        return self.put(path, {x: data[x] for x in channels})
+
+    def put_laddermap(self, laddermap, channels: list = ("DATA1",)) -> TraceHandle:
+        """
+        Stores the (baseline corrected) intensities of channels and the
+        basepair axis of a LadderMap. A PeakArea accepts the handle instead of
+        the LadderMap.
+        """
+        arrays = {x: laddermap.channel_intensity(x) for x in channels}
+        arrays["basepairs"] = laddermap.step_basepairs(
+            max(x.size for x in arrays.values())
+        )
+
+        return self.put(laddermap.data_, arrays)
+
+    def close(self) -> None:
+        """
+        Unmaps and unlinks all blocks of the store. Views of them must not be
+        used afterwards.
+        """
+        for name in self.names:
+            shm = _attached.pop(name, None)
+            if shm is None:
+                continue
+            try:
+                shm.close()
+            except BufferError:
+                # views are still referenced, they keep the mapping alive
+                pass
+            shm.unlink()
+        self.names = []
+
+    def __enter__(self) -> "SharedTraceStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def share_report_data(data: dict, store: SharedTraceStore) -> dict:
+    """
+    Moves the traces of a report_data dict into the store, so that the dict
+    is cheap to send to a process pool. Undone by resolve_report_data.
+    """
+    arrays = {x: data[x] for x in REPORT_ARRAYS if isinstance(data.get(x), np.ndarray)}
+    shared = {k: v for k, v in data.items() if k not in arrays}
+    shared["traces"] = store.put(data["name"], arrays)
+
+    return shared
+
+
+@contextmanager
+def resolve_report_data(data: dict):
+    """
+    report_data with the shared traces of share_report_data as NumPy views,
+    which must not be used after the with block.
+
+    Example usage:
+    with resolve_report_data(data) as data:
+        save_sample_figures(data, assets)
+    """
+    if "traces" not in data:
+        yield data
+        return
+
+    with data["traces"].open() as traces:
+        resolved = {**{k: v for k, v in data.items() if k != "traces"}, **traces}
+        try:
+            yield resolved
+        finally:
+            # drop the views, so the block can be unmapped
+            resolved.clear()
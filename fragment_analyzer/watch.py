@@ -0,0 +1,229 @@
+"""
+Long-running analysis of a folder that a sequencer writes .fsa files to.
+
+The folder is polled, which works on every platform and on network shares.
+A new file is only analysed once its size and modification time have not
+changed for `settle` seconds and its whole ABIF tag directory is present.
+The files are analysed on a bounded process pool and the results are
+appended to the output files as soon as each file is done.
+"""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+
+from fragment_analyzer.abif import is_complete_abif
+from fragment_analyzer.batch import (
+    analyse_file,
+    append_csv,
+    append_metrics,
+    metrics_argument,
+    summary_row,
+)
+
+
+class FolderWatcher:
+    """
+    Watches a folder and analyses every new .fsa file with analyse_file.
+
+    Files listed (by path) in an existing summary file are not analysed again,
+    so a stopped watcher can be restarted on the same folder.
+
+    Args:
+        path: The folder to watch.
+        ladder: Name of the ladder, e.g. "LIZ", or a LadderTemplate.
+        model: Model used by PeakArea, e.g. "gauss".
+        channel: Channel of the sample.
+        min_ratio: Passed to PeakArea.
+        workers: Number of processes. Defaults to the number of CPUs. At most
+            2 * workers files are queued at the same time.
+        report_folder: If given, an HTML report of every file is saved there.
+        output: The peak tables are appended to this csv file.
+        summary: The status, error and runtime of every file are appended to
+            this csv file.
+        interval: Seconds between two scans of the folder.
+        settle: Seconds the size of a file must be unchanged before it is analysed.
+        recursive: Also watch the subfolders (e.g. one per run).
+        store: If given, a ResultsStore the results of every file are appended to.
+        metrics: If given, the per stage metrics of every file are appended to
+            this file as JSON lines.
+        metrics_memory: With metrics, also record the peak memory of every stage.
+        verbose: Print the status and the runtime of every file.
+        laddermap_kwargs: Passed to LadderMap, and peak_height and
+            min_peak_height to PeakArea (see analyse_file).
+
+    Example usage:
+    watcher = FolderWatcher("/data/sequencer", "LIZ", "gauss", workers=2)
+    watcher.run()
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ladder: str,
+        model: str,
+        channel: str = "DATA1",
+        min_ratio: float = 0.2,
+        workers: int = None,
+        report_folder: str = None,
+        output: str = "peaks.csv",
+        summary: str = "summary.csv",
+        interval: float = 2.0,
+        settle: float = 5.0,
+        recursive: bool = False,
+        store=None,
+        metrics: str = None,
+        metrics_memory: bool = False,
+        verbose: bool = True,
+        **laddermap_kwargs,
+    ) -> None:
+        self.path = Path(path)
+        if not self.path.is_dir():
+            raise NotADirectoryError(f"{self.path} is not a directory")
+
+        self.workers = workers or os.cpu_count()
+        self.output = output
+        self.summary = summary
+        self.interval = interval
+        self.settle = settle
+        self.recursive = recursive
+        self.store = store
+        self.metrics = metrics
+        self.verbose = verbose
+        self.kwargs = dict(
+            ladder=ladder,
+            model=model,
+            channel=channel,
+            min_ratio=min_ratio,
+            report_folder=report_folder,
+            keep_tables=store is not None,
+            metrics=metrics_argument(metrics, metrics_memory),
+            **laddermap_kwargs,
+        )
+
+        # file -> (size, mtime, time since when it is unchanged)
+        self._pending = {}
+        # resolved paths, as the run folders of a recursive watch reuse the
+        # file names of the wells
+        self.processed = set()
+        if summary is not None and Path(summary).exists():
+            paths = pd.read_csv(summary, usecols=["path"]).path
+            self.processed.update(str(Path(x).resolve()) for x in paths)
+
+    def _files(self) -> list:
+        pattern = "**/*.fsa" if self.recursive else "*.fsa"
+        # resolved, so the summary has the absolute paths for a restart
+        return sorted(x.resolve() for x in self.path.glob(pattern) if x.is_file())
+
+    def poll(self) -> list:
+        """
+        Scans the folder once. Returns the new files that are completely written.
+        """
+        now = time.monotonic()
+        ready = []
+
+        for file in self._files():
+            if str(file) in self.processed:
+                continue
+
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                self._pending.pop(file, None)
+                continue
+
+            previous = self._pending.get(file)
+            if previous is None or previous[:2] != (stat.st_size, stat.st_mtime):
+                # unchanged since the modification time, so files that are
+                # already complete when the watcher starts are not delayed
+                since = now - max(time.time() - stat.st_mtime, 0)
+                self._pending[file] = (stat.st_size, stat.st_mtime, since)
+
+            since = self._pending[file][2]
+            if now - since >= self.settle and is_complete_abif(file):
+                ready.append(file)
+
+        return ready
+
+    def collect(self, result: dict) -> None:
+        """
+        Appends the results of one file to the output files.
+        """
+        if result["peaks"] is not None and self.output is not None:
+            append_csv(result["peaks"], self.output)
+
+        if result["tables"] is not None:
+            self.store.append_tables([result["tables"]])
+
+        if self.metrics is not None:
+            append_metrics(result, self.metrics)
+
+        if self.summary is not None:
+            append_csv(pd.DataFrame([summary_row(result)]), self.summary)
+
+        if self.verbose:
+            error = f" ({result['error']})" if result["error"] else ""
+            print(
+                f"{result['file_name']}: {result['status']}{error} "
+                f"in {result['seconds']:.2f} s"
+            )
+
+    def _idle(self, running: dict, last_activity: float, idle_timeout: float) -> bool:
+        now = time.monotonic()
+        # files that are still written or settling
+        changing = any(
+            now - since < self.settle for _, _, since in self._pending.values()
+        )
+
+        return not running and not changing and now - last_activity >= idle_timeout
+
+    def run(self, idle_timeout: float = None) -> None:
+        """
+        Watches the folder until interrupted, or until nothing has happened
+        for idle_timeout seconds.
+        """
+        if self.verbose:
+            print(f"Watching {self.path} for .fsa files (Ctrl+C to stop)")
+
+        running = {}
+        last_activity = time.monotonic()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                while True:
+                    for file in self.poll():
+                        if file in running.values():
+                            continue
+                        if len(running) >= 2 * self.workers:
+                            break
+                        future = executor.submit(analyse_file, file, **self.kwargs)
+                        running[future] = file
+                        last_activity = time.monotonic()
+
+                    if running:
+                        done, _ = wait(
+                            running, timeout=self.interval, return_when=FIRST_COMPLETED
+                        )
+                    else:
+                        done = set()
+                        time.sleep(self.interval)
+
+                    for future in done:
+                        file = running.pop(future)
+                        self.processed.add(str(file))
+                        self._pending.pop(file, None)
+                        self.collect(future.result())
+                        last_activity = time.monotonic()
+
+                    if idle_timeout is not None and self._idle(
+                        running, last_activity, idle_timeout
+                    ):
+                        break
+
+            except KeyboardInterrupt:
+                executor.shutdown(wait=False, cancel_futures=True)
+                if self.verbose:
+                    print(f"Stopped, {len(running)} files were not finished")
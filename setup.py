@@ -12,11 +12,10 @@ setup(
     install_requires=[
         "pandas",
         "numpy",
-        "scikit-learn",
         "matplotlib",
         "networkx",
         "lmfit",
         "scipy",
-        "biopython",
     ],
+    extras_require={"parquet": ["pyarrow"]},
 )
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import numpy as np
+
+from fragment_analyzer.abif import AbifReader
+
+DEMO = Path(__file__).parent.parent / "demo" / "4062_Dx" / "1_PRT_2_4062_A02_Dx.fsa"
+
+
+def test_known_tag_values():
+    data = AbifReader(DEMO)
+
+    assert len(data) == 173
+    assert data["SMPL1"] == "Sample"
+    assert data["TUBE1"] == "A02"
+    assert data["CTNM1"] == "4062"
+    assert data["DyeN1"] == "6-FAM"
+    assert data["MODL1"] == "3500"
+    assert data["RUND1"] == "2022-12-15"
+    assert data["RUNT1"] == "19:28:44"
+    assert data["LANE1"] == 2
+    assert data["Scan1"] == 6604
+
+
+def test_traces_are_widened_integer_arrays():
+    data = AbifReader(DEMO)
+
+    for channel, first, total in (
+        ("DATA1", [-3, 1, 0, 0, -1], 725336),
+        ("DATA205", [12, 21, 0, 0, 21], 604098),
+    ):
+        trace = data[channel]
+        assert trace.dtype == np.int64
+        assert trace.shape == (data["Scan1"],)
+        assert trace[:5].tolist() == first
+        assert trace.sum() == total
+
+
+def test_missing_tags():
+    data = AbifReader(DEMO)
+
+    assert "DATA999" not in data
+    assert data.get("DATA999") is None
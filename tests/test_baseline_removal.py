@@ -0,0 +1,65 @@
+import numpy as np
+from numpy.linalg import norm
+from scipy import sparse
+from scipy.sparse import linalg
+
+from fragment_analyzer.baseline_removal import baseline_arPLS
+
+
+def sparse_arPLS(y, ratio=0.99, lam=100, niter=1000):
+    # the former sparse LU solver of baseline_arPLS
+    L = len(y)
+    diag = np.ones(L - 2)
+    D = sparse.spdiags([diag, -2 * diag, diag], [0, -1, -2], L, L - 2)
+    H = lam * D.dot(D.T)
+    w = np.ones(L)
+    W = sparse.spdiags(w, 0, L, L)
+
+    crit = 1
+    count = 0
+    while crit > ratio:
+        z = linalg.spsolve((W + H).tocsc(), W * y)
+        d = y - z
+        dn = d[d < 0]
+        m = np.mean(dn)
+        s = np.std(dn)
+        w_new = 1 / (1 + np.exp(2 * (d - (2 * s - m)) / s))
+        crit = norm(w_new - w) / norm(w)
+        w = w_new
+        W.setdiag(w)
+        count += 1
+        if count > niter:
+            break
+
+    return z, count
+
+
+def trace(size=3000, seed=0):
+    # a drifting baseline with noise and a few peaks
+    rng = np.random.default_rng(seed)
+    x = np.arange(size)
+    y = 200 + 0.05 * x + 30 * np.sin(x / 300) + rng.normal(0, 10, size)
+    for center, height in ((400, 800), (1500, 5000), (2600, 2000)):
+        y += height * np.exp(-((x - center) ** 2) / 50)
+
+    return y
+
+
+def test_banded_solver_matches_the_sparse_solver():
+    for y in (trace(), trace(8000, seed=1), trace()[:5]):
+        for lam in (100, 1e5):
+            expected, iterations = sparse_arPLS(y, lam=lam)
+            z, _, info = baseline_arPLS(y, lam=lam, full_output=True)
+
+            assert info["num_iter"] == iterations
+            np.testing.assert_allclose(z, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_warm_start_converges_in_fewer_iterations():
+    y = trace()
+    _, _, cold = baseline_arPLS(y, full_output=True)
+
+    _, _, warm = baseline_arPLS(y, full_output=True, w=cold["weights"])
+
+    assert cold["converged"] and warm["converged"]
+    assert warm["num_iter"] <= cold["num_iter"]
@@ -0,0 +1,61 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fragment_analyzer.ladder_map import LadderMap
+
+ROOT = Path(__file__).parent.parent
+DEMO = ROOT / "demo" / "4062_Dx" / "1_PRT_2_4062_A02_Dx.fsa"
+SCRIPT = ROOT / "benchmarks" / "bench_stages.py"
+
+spec = importlib.util.spec_from_file_location("bench_stages", SCRIPT)
+bench_stages = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench_stages)
+
+
+def test_count_paths_counts_the_enumerated_windows():
+    with contextlib.redirect_stdout(io.StringIO()):
+        laddermap = LadderMap(DEMO, "LIZ")
+
+    _, windows = bench_stages.count_paths(laddermap)
+
+    assert windows == sum(1 for _ in laddermap.generate_combinations())
+
+
+def test_compare_flags_only_slower_stages_above_the_floor():
+    baseline = {"files": {"a.fsa": {"fit": 1.0, "abif": 0.001, "paths": 10}}}
+    current = {"files": {"a.fsa": {"fit": 1.5, "abif": 0.003, "paths": 99}}}
+
+    regressions = bench_stages.compare(current, baseline, threshold=1.25, floor=0.005)
+
+    assert regressions == [("a.fsa", "fit", 1.0, 1.5)]
+    assert bench_stages.stage_totals(current["files"]) == {"fit": 1.5, "abif": 0.003}
+
+
+def test_a_run_compares_against_its_own_json(tmp_path):
+    output = tmp_path / "bench.json"
+    command = [sys.executable, str(SCRIPT), "--files", str(DEMO), "--methods", "dp"]
+    command += ["--model", "fast_gauss"]
+    # the package may not be installed
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+
+    subprocess.run(
+        command + ["--output", str(output)], capture_output=True, check=True, env=env
+    )
+    result = json.loads(output.read_text())
+    assert list(result["files"]) == [f"{DEMO.parent.name}/{DEMO.name}"]
+    assert result["totals"]["peak_area"] > 0
+
+    compared = subprocess.run(
+        command + ["--compare", str(output), "--threshold", "1e9"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    assert "0 regressions" in compared.stdout
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from fragment_analyzer.calibration import SizeCalibration
+
+STEPS = np.array([1000.0, 1300, 1500, 2000, 2600, 3100, 3900])
+
+
+def southern(m, c=-2.0e6, m0=-3000.0, L0=600.0):
+    # basepairs of steps m on one Southern curve
+    return c / (m - m0) + L0
+
+
+def test_linear_fits_a_least_squares_line():
+    basepairs = 0.1 * STEPS - 80 + np.array([1, -1, 2, 0, -2, 1, -1])
+
+    calibration = SizeCalibration(STEPS, basepairs, "linear")
+
+    slope, intercept = np.polyfit(STEPS, basepairs, 1)
+    assert calibration.coef_[0] == pytest.approx(slope)
+    assert calibration.intercept_ == pytest.approx(intercept)
+    np.testing.assert_allclose(
+        calibration.predict([[1000], [2000]]),
+        [intercept + 1000 * slope, intercept + 2000 * slope],
+    )
+
+
+def test_piecewise_interpolates_between_the_ladder_peaks():
+    basepairs = np.array([20.0, 50, 70, 120, 200, 260, 340])
+    calibration = SizeCalibration(STEPS, basepairs, "piecewise")
+
+    np.testing.assert_allclose(calibration.predict(STEPS), basepairs)
+    assert calibration.predict([1150])[0] == pytest.approx(35)
+    # linear outside the ladder, with the slope of the linear fit
+    assert calibration.predict([900])[0] == pytest.approx(20 - 100 * calibration.slope)
+    assert calibration.predict([4000])[0] == pytest.approx(
+        340 + 100 * calibration.slope
+    )
+
+
+def test_local_southern_reproduces_a_southern_curve():
+    calibration = SizeCalibration(STEPS, southern(STEPS), "local_southern")
+
+    steps = np.linspace(STEPS[0], STEPS[-1], 101)
+    np.testing.assert_allclose(calibration.predict(steps), southern(steps))
+
+
+def test_local_southern_of_collinear_peaks_is_a_line():
+    calibration = SizeCalibration(STEPS, 0.1 * STEPS - 80, "local_southern")
+
+    np.testing.assert_allclose(calibration.predict([1150, 3500]), [35, 270])
+
+
+def test_unknown_methods_are_not_implemented():
+    with pytest.raises(NotImplementedError, match="Options: \\[linear, piecewise"):
+        SizeCalibration(STEPS, STEPS, "cubic")
@@ -0,0 +1,72 @@
+import contextlib
+import io
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+from fragment_analyzer.calibration_cache import CalibrationCache
+from fragment_analyzer.ladder_map import LadderMap
+
+DEMO = Path(__file__).parent.parent / "demo" / "4062_Dx" / "1_PRT_2_4062_A02_Dx.fsa"
+
+
+def test_eviction_keeps_the_recently_used_entries(tmp_path):
+    cache = CalibrationCache(tmp_path, max_entries=10, evict_fraction=0.5)
+    for i in range(10):
+        cache.put(f"{i}", peaks=np.arange(i))
+        os.utime(tmp_path / f"{i}.npz", (i, i))
+    cache.get("0")
+
+    cache.put("10", peaks=np.arange(3))
+
+    assert len(cache) == 5
+    assert cache.get("0") is not None
+    assert cache.get("1") is None
+
+
+def test_an_entry_removed_by_another_process_is_a_miss(tmp_path):
+    cache = CalibrationCache(tmp_path)
+    cache.put("a", peaks=np.arange(3))
+    (tmp_path / "a.npz").unlink()
+
+    assert cache.get("a") is None
+    cache.evict()
+
+
+def test_a_failing_cache_does_not_fail_the_laddermap(tmp_path, caplog):
+    cache = CalibrationCache(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = LadderMap(DEMO, "LIZ").best_correlated_peaks
+
+        # an incomplete entry is a miss
+        LadderMap(DEMO, "LIZ", cache=cache)
+        for entry in tmp_path.glob("*.npz"):
+            np.savez(entry, peaks=np.arange(3))
+        laddermap = LadderMap(DEMO, "LIZ", cache=cache)
+        np.testing.assert_array_equal(laddermap.best_correlated_peaks, expected)
+
+        # an entry that cannot be written is a warning
+        cache.folder = tmp_path / "missing"
+        with caplog.at_level(logging.WARNING, logger="fragment_analyzer"):
+            laddermap = LadderMap(DEMO, "LIZ", cache=cache)
+        np.testing.assert_array_equal(laddermap.best_correlated_peaks, expected)
+        assert "Could not write to the calibration cache" in caplog.text
+
+
+def test_a_truncated_entry_is_a_miss_and_removed(tmp_path):
+    cache = CalibrationCache(tmp_path)
+    cache.put("a", peaks=np.arange(100))
+    entry = tmp_path / "a.npz"
+    entry.write_bytes(entry.read_bytes()[:40])
+
+    assert cache.get("a") is None
+    assert not entry.exists()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        LadderMap(DEMO, "LIZ", cache=cache)
+        for entry in tmp_path.glob("*.npz"):
+            entry.write_bytes(entry.read_bytes()[:-100])
+        laddermap = LadderMap(DEMO, "LIZ", cache=cache)
+    assert laddermap.best_correlation > 0.99
@@ -0,0 +1,17 @@
+import numpy as np
+
+from fragment_analyzer.decimation import decimate
+
+
+def test_decimate_keeps_the_global_extremes():
+    x = np.arange(6000, dtype=float)
+    # a peak a bit wider than the buckets: lttb alone picks a point on its
+    # flank instead of its top
+    y = 1000 * np.exp(-(((x - 3000.3) / 9) ** 2) / 2) - 200 * (x == 4500)
+
+    for method in ("minmax", "lttb"):
+        keep = decimate(x, y, 500, method)
+
+        assert keep.size <= 510
+        assert y[keep].max() == y.max()
+        assert y[keep].min() == y.min()
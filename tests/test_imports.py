@@ -0,0 +1,36 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+import fragment_analyzer
+
+HEAVY = ["matplotlib", "panel", "lmfit", "networkx", "scipy", "pandas"]
+
+
+def imported_after(statement: str) -> list:
+    # the heavy modules imported by statement in a fresh interpreter
+    probe = (
+        f"import json, sys\n{statement}\n"
+        f"print(json.dumps([x for x in {HEAVY!r} if x in sys.modules]))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True
+    ).stdout
+
+    return json.loads(output)
+
+
+def test_importing_the_package_imports_no_heavy_modules():
+    assert imported_after("import fragment_analyzer") == []
+    assert "matplotlib" not in imported_after("from fragment_analyzer import LadderMap")
+
+
+def test_every_public_name_resolves():
+    for name in fragment_analyzer.__all__:
+        assert getattr(fragment_analyzer, name) is not None
+    assert "LIZ" in fragment_analyzer.ladders.LADDERS
+
+    with pytest.raises(AttributeError):
+        fragment_analyzer.NotAName
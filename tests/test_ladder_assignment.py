@@ -0,0 +1,121 @@
+import contextlib
+import io
+import logging
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+import pytest
+from scipy import stats
+
+from fragment_analyzer.ladder_assignment import (
+    adjacency_paths,
+    dp_ladder_assignment,
+    peak_adjacency,
+    pearson_correlation,
+)
+from fragment_analyzer.ladder_map import LadderMap
+
+DEMO = Path(__file__).parent.parent / "demo" / "4062_Dx"
+
+LADDER = np.array([20, 40, 60, 100, 140, 200, 250, 300])
+
+
+def test_dp_and_graph_pick_the_same_peaks():
+    for file in sorted(DEMO.glob("*.fsa"))[:3]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            dp = LadderMap(file, "LIZ", method="dp")
+            graph = LadderMap(file, "LIZ", method="graph")
+
+        np.testing.assert_array_equal(
+            dp.best_correlated_peaks, graph.best_correlated_peaks
+        )
+        assert dp.best_correlation == pytest.approx(graph.best_correlation)
+
+
+def test_dp_skips_the_peaks_between_the_ladder_peaks():
+    ladder_peaks = 1000 + 10 * LADDER
+    peaks = np.sort(np.concatenate([ladder_peaks, [1150, 1730, 2310]]))
+
+    assigned, correlation = dp_ladder_assignment(peaks, LADDER, max_diff=700)
+
+    np.testing.assert_array_equal(assigned, ladder_peaks)
+    assert correlation == pytest.approx(1)
+
+
+def test_dp_needs_as_many_peaks_as_ladder_sizes():
+    with pytest.raises(ValueError, match="the ladder has 8 steps"):
+        dp_ladder_assignment(1000 + 10 * LADDER[:-1], LADDER, max_diff=700)
+
+
+def test_dp_needs_peaks_within_max_diff():
+    with pytest.raises(ValueError, match="No combination of peaks"):
+        dp_ladder_assignment(1000 + 10 * LADDER, LADDER, max_diff=100)
+
+
+def test_block_scoring_matches_pearsonr():
+    rng = np.random.default_rng(0)
+    candidates = np.sort(rng.uniform(1000, 6000, (50, LADDER.size)), axis=1)
+
+    expected = [stats.pearsonr(x, LADDER)[0] for x in candidates]
+
+    np.testing.assert_allclose(pearson_correlation(candidates, LADDER), expected)
+
+
+def test_the_graph_search_does_not_depend_on_the_block_size():
+    with contextlib.redirect_stdout(io.StringIO()):
+        laddermap = LadderMap(sorted(DEMO.glob("*.fsa"))[0], "LIZ", method="graph")
+    expected = laddermap.best_correlated_peaks, laddermap.best_correlation
+
+    windows = list(laddermap.generate_combinations())
+    correlations = [stats.pearsonr(x, laddermap.ladder)[0] for x in windows]
+    np.testing.assert_array_equal(windows[np.argmax(correlations)], expected[0])
+
+    laddermap.best_ladder_peak_correlation(block_size=7)
+    np.testing.assert_array_equal(laddermap.best_correlated_peaks, expected[0])
+    assert laddermap.best_correlation == pytest.approx(expected[1])
+
+
+@pytest.mark.parametrize("budget", [dict(max_candidates=0), dict(time_limit=0)])
+def test_an_exceeded_graph_search_falls_back_to_dp(budget, caplog):
+    file = sorted(DEMO.glob("*.fsa"))[1]
+    with contextlib.redirect_stdout(io.StringIO()):
+        dp = LadderMap(file, "LIZ", method="dp")
+        with caplog.at_level(logging.WARNING, logger="fragment_analyzer"):
+            graph = LadderMap(file, "LIZ", method="graph", **budget)
+
+    assert graph.fallback
+    assert not dp.fallback
+    assert "exceeded its budget" in caplog.text
+    np.testing.assert_array_equal(graph.best_correlated_peaks, dp.best_correlated_peaks)
+
+
+def test_the_peak_adjacency_matches_the_pairwise_graph():
+    rng = np.random.default_rng(1)
+    peaks = np.sort(rng.choice(np.arange(1000, 2000), 20, replace=False))
+    max_diff = 200
+
+    # every pair of peaks at most max_diff apart, as the graph used to be built
+    G = nx.DiGraph()
+    G.add_nodes_from(range(peaks.size))
+    G.add_edges_from(
+        (i, j)
+        for i in range(peaks.size)
+        for j in range(i + 1, peaks.size)
+        if peaks[j] - peaks[i] <= max_diff
+    )
+
+    indptr, indices = peak_adjacency(peaks, max_diff)
+    edges = {
+        (i, j) for i in range(peaks.size) for j in indices[indptr[i] : indptr[i + 1]]
+    }
+    assert edges == set(G.edges)
+
+    starts = [node for node in G.nodes if G.in_degree(node) == 0]
+    ends = [node for node in G.nodes if G.out_degree(node) == 0]
+    expected = {
+        tuple(path) for start in starts for path in nx.all_simple_paths(G, start, ends)
+    }
+    paths = [tuple(path) for path in adjacency_paths(indptr, indices)]
+    assert len(paths) == len(expected)
+    assert set(paths) == expected
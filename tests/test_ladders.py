@@ -0,0 +1,79 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.ladders.ladders import LadderRegistry, LadderTemplate
+
+DEMO = Path(__file__).parent.parent / "demo" / "4062_Dx" / "1_PRT_2_4062_A02_Dx.fsa"
+
+SIZES = [35, 50, 75, 100, 139, 150, 160, 200]
+
+
+def test_load_a_json_ladder(tmp_path):
+    path = tmp_path / "ladder.json"
+    path.write_text(json.dumps({"name": "GS500", "channel": "DATA105", "sizes": SIZES}))
+    registry = LadderRegistry()
+
+    template = registry.load(path)
+
+    assert registry["GS500"] is template
+    assert template.channel == "DATA105"
+    assert template.sizes.tolist() == SIZES
+    assert template.sizes.dtype.kind == "i"
+
+
+def test_load_a_sizes_file(tmp_path):
+    path = tmp_path / "GS500.txt"
+    path.write_text("# GeneScan 500\n35, 50, 75\n100 139\n150.5\n160\n200\n")
+    registry = LadderRegistry()
+
+    template = registry.load(path, channel="DATA105")
+
+    assert template.name == "GS500"
+    assert template.sizes.tolist() == [35, 50, 75, 100, 139, 150.5, 160, 200]
+    assert "GS500" in registry and len(registry) == 1
+
+
+def test_load_needs_a_channel(tmp_path):
+    path = tmp_path / "GS500.txt"
+    path.write_text(" ".join(map(str, SIZES)))
+
+    with pytest.raises(ValueError, match="No channel"):
+        LadderRegistry().load(path)
+
+
+def test_register_and_get():
+    registry = LadderRegistry()
+    template = registry.register(LadderTemplate("GS500", SIZES, "DATA105"))
+
+    assert registry.get("GS500") is template
+    assert registry.get(template) is template
+    with pytest.raises(NotImplementedError, match="Options: \\[GS500\\]"):
+        registry.get("ROX")
+
+
+def test_templates_need_ascending_sizes():
+    with pytest.raises(ValueError, match="ascending"):
+        LadderTemplate("bad", [10, 30, 20])
+    with pytest.raises(ValueError, match="at least 3 sizes"):
+        LadderTemplate("bad", [10, 20])
+
+
+def test_template_correlation_is_pearson():
+    template = LadderTemplate("GS500", SIZES, "DATA105")
+    candidates = np.array([SIZES, np.arange(8) ** 2])
+
+    expected = [np.corrcoef(x, SIZES)[0, 1] for x in candidates]
+
+    np.testing.assert_allclose(template.correlation(candidates), expected)
+
+
+def test_laddermap_names_the_missing_channel():
+    with pytest.raises(ValueError, match="Ladder GS500 has no channel"):
+        LadderMap(DEMO, LadderTemplate("GS500", SIZES))
+
+    with pytest.raises(ValueError, match="has no channel DATA999 for ladder GS500"):
+        LadderMap(DEMO, LadderTemplate("GS500", SIZES, "DATA999"))
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import numpy as np
+
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.noise import noise_threshold, prune_weak_peaks
+
+DEMO = Path(__file__).parent.parent / "demo"
+
+
+def test_noise_threshold_has_a_floor():
+    rng = np.random.default_rng(0)
+    quiet = rng.normal(20, 2, 5000)
+
+    assert noise_threshold(quiet, k=5).max() < 100
+    assert (noise_threshold(quiet, k=5, min_height=500) == 500).all()
+
+
+def test_prune_weak_peaks_keeps_the_span_of_the_ladder():
+    peaks = np.array([100, 500, 600, 700, 800, 900, 1000])
+    heights = np.array([50.0, 30000, 110, 1000, 1200, 1100, 40])
+    threshold = np.full(1100, 150.0)
+
+    keep = prune_weak_peaks(peaks, heights, threshold, expected=3)
+
+    # the low peak at 600 lies between the primer and the ladder peaks
+    assert keep.tolist() == [False, True, True, True, True, True, False]
+
+
+def test_auto_height_keeps_the_weak_first_ladder_peak():
+    # the 20 bp peak of this well is only 114 high, 4 robust sd above the noise
+    file = DEMO / "4071_Dx 230113_PRT1_PRT3_rn" / "PRT1_NA18555_4071_F08_Dx.fsa"
+
+    fixed = LadderMap(file, "LIZ")
+    auto = LadderMap(file, "LIZ", height="auto")
+
+    assert auto.best_correlated_peaks[0] == 1052
+    np.testing.assert_array_equal(
+        auto.best_correlated_peaks, fixed.best_correlated_peaks
+    )
+    assert auto.best_correlation > 0.9999
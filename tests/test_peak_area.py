@@ -0,0 +1,138 @@
+import contextlib
+import io
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.peak_area import (
+    MultiChannelPeakArea,
+    PeakArea,
+    fast_gauss_parameters,
+)
+from fragment_analyzer.shared_traces import SharedTraceStore
+
+DEMO = Path(__file__).parent.parent / "demo" / "4062_Dx" / "1_PRT_2_4062_A02_Dx.fsa"
+
+
+def test_fast_gauss_moments_ignore_negative_intensities():
+    # a flat-topped peak on a baseline corrected trace that dips below 0: the
+    # parabola does not open downwards and the unclipped moments are negative
+    x = np.linspace(180, 200, 41)
+    y = np.where(np.abs(x - 190) < 6, 35.0, -40.0)
+
+    parameters = fast_gauss_parameters([x], [y])
+
+    assert np.isfinite(parameters["sigma"][0])
+    assert np.isfinite(parameters["amplitude"][0])
+    assert abs(parameters["center"][0] - 190) < 1
+
+
+@pytest.fixture(scope="module")
+def laddermap():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return LadderMap(DEMO, "LIZ")
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_lmfit_fits_match_the_serial_fits(laddermap, executor):
+    with contextlib.redirect_stdout(io.StringIO()):
+        serial = PeakArea(laddermap, "gauss")
+        parallel = PeakArea(laddermap, "gauss", workers=2, executor=executor)
+
+    assert len(parallel.fit_params) == len(serial.fit_params) > 1
+    for a, b in zip(parallel.fit_params, serial.fit_params):
+        assert a == pytest.approx(b)
+    assert parallel.fit_report == serial.fit_report
+
+
+def test_an_unknown_executor_is_not_implemented(laddermap):
+    with contextlib.redirect_stdout(io.StringIO()):
+        peakarea = PeakArea(laddermap, "fast_gauss")
+
+    with pytest.raises(NotImplementedError, match="Options: \\[thread, process\\]"):
+        peakarea.fit_lmfit_model("gauss", workers=2, executor="dask")
+
+
+def test_multichannel_table_combines_the_channels(laddermap):
+    # DATA3 has no peaks
+    channels = ["DATA1", "DATA2", "DATA3"]
+    with contextlib.redirect_stdout(io.StringIO()):
+        peak_areas = MultiChannelPeakArea(
+            laddermap, "fast_gauss", channels=channels, peak_height=300
+        )
+        with SharedTraceStore() as store:
+            handle = store.put_laddermap(laddermap, channels=channels)
+            shared = MultiChannelPeakArea(
+                handle, "fast_gauss", channels=channels, peak_height=300
+            )
+        singles = {
+            channel: PeakArea(laddermap, "fast_gauss", channel=channel, peak_height=300)
+            for channel in channels
+        }
+
+    expected = pd.concat(
+        [
+            x.peak_position_area_dataframe.assign(channel=channel)
+            for channel, x in singles.items()
+            if x.found_peaks
+        ],
+        ignore_index=True,
+    )
+
+    assert peak_areas.file_name == shared.file_name == DEMO.name
+    assert expected.channel.nunique() > 1
+    pd.testing.assert_frame_equal(peak_areas.peak_position_area_dataframe, expected)
+    pd.testing.assert_frame_equal(shared.peak_position_area_dataframe, expected)
+
+
+def test_the_peak_table_matches_the_dataframe_views(laddermap):
+    with contextlib.redirect_stdout(io.StringIO()):
+        peakarea = PeakArea(laddermap, "fast_gauss")
+
+    # the peak table as it was built from the DataFrames
+    expected = pd.concat(
+        [
+            df.loc[lambda x: x.peaks == x.peaks.max()]
+            .assign(area=p["amplitude"], peak_name=f"Peak {i + 1}")
+            .drop(columns="step_raw")
+            .rename(
+                columns={
+                    "peaks": "peak_height",
+                    "step_adjusted": "basepairs",
+                    "fitted": "fitted_peak_height",
+                }
+            )
+            .drop_duplicates("peak_name")
+            .assign(file_name=peakarea.file_name)
+            for i, (df, p) in enumerate(zip(peakarea.fit_df, peakarea.fit_params))
+        ],
+        ignore_index=True,
+    ).assign(quotient=peakarea.quotient)
+
+    table = peakarea.peak_position_area_dataframe
+    pd.testing.assert_frame_equal(
+        table, expected[table.columns], check_dtype=False, check_exact=False
+    )
+
+    pd.testing.assert_frame_equal(
+        peakarea.raw_data, laddermap.adjusted_step_dataframe("DATA1")
+    )
+    xs, ys = peakarea.peak_arrays()
+    for df, x, y in zip(peakarea.divided_peaks, xs, ys):
+        np.testing.assert_array_equal(df.step_adjusted, x)
+        np.testing.assert_array_equal(df.peaks, y)
+
+
+def test_divide_peaks_clips_the_padding_at_the_start(laddermap):
+    with contextlib.redirect_stdout(io.StringIO()):
+        peakarea = PeakArea(laddermap, "fast_gauss")
+
+    peakarea.peak_width_starts = np.array([2, 50])
+    peakarea.peak_width_ends = np.array([10, 60])
+    peakarea.divide_peaks(padding=4)
+
+    assert peakarea.peak_starts.tolist() == [0, 46]
+    assert peakarea.peak_ends.tolist() == [14, 64]
@@ -0,0 +1,46 @@
+import contextlib
+import io
+from pathlib import Path
+
+import numpy as np
+
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.peak_area import PeakArea
+from fragment_analyzer.pipeline import Pipeline
+
+DEMO = Path(__file__).parent.parent / "demo" / "4062_Dx" / "1_PRT_2_4062_A02_Dx.fsa"
+
+
+def test_an_update_only_recomputes_the_downstream_stages():
+    pipeline = Pipeline(DEMO, "LIZ", model="fast_gauss")
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipeline.peakarea
+        assert pipeline.computed == [
+            "parse",
+            "baseline",
+            "ladder_peaks",
+            "ladder_assignment",
+            "calibration",
+            "sample_peaks",
+            "widths",
+            "fits",
+            "quotient",
+        ]
+
+        pipeline.update(min_ratio=0.3)
+        peakarea = pipeline.peakarea
+        assert pipeline.computed == ["sample_peaks", "widths", "fits", "quotient"]
+
+        pipeline.update(calibration_method="piecewise")
+        pipeline.peakarea
+        assert pipeline.computed[0] == "calibration"
+
+        # earlier parameters are memoized
+        pipeline.update(calibration_method="linear")
+        pipeline.peakarea
+        assert pipeline.computed == []
+
+        expected = PeakArea(LadderMap(DEMO, "LIZ"), "fast_gauss", min_ratio=0.3)
+
+    np.testing.assert_array_equal(peakarea.peaks_index, expected.peaks_index)
+    assert peakarea.quotient == expected.quotient
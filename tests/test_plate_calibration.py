@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import numpy as np
+
+from fragment_analyzer.batch import batch_analysis
+from fragment_analyzer.plate_calibration import (
+    align_consensus,
+    ladder_deviation,
+    plate_ladder_qc,
+)
+
+DEMO = Path(__file__).parent.parent / "demo" / "4062_Dx"
+
+# the steps of the LIZ ladder peaks of a typical well of the demo plate
+CONSENSUS = np.array(
+    [1177, 1283, 1427, 1578, 1735, 1845, 1894, 2060, 2221, 2386, 2550, 2667]
+    + [2716, 2885, 3053, 3223, 3395, 3516, 3565, 3737, 3908, 4079, 4248, 4367]
+    + [4417, 4585, 4749, 4912, 5071, 5180, 5224, 5379, 5526, 5669],
+    dtype=float,
+)
+
+
+def perturb(steps: np.ndarray) -> np.ndarray:
+    # a later, slower and slightly curved run
+    center = steps.mean()
+    return 90 + center + 1.08 * (steps - center) + 2e-6 * (steps - center) ** 2
+
+
+def test_align_consensus_follows_a_perturbed_well():
+    rng = np.random.default_rng(0)
+    expected = perturb(CONSENSUS)
+    # a primer peak, noise peaks between the ladder peaks and one missing peak
+    noise = rng.uniform(expected[0], expected[-1], 20)
+    peaks = np.concatenate([[400], np.delete(expected, 7), noise])
+    heights = np.concatenate(
+        [[30_000], np.full(expected.size - 1, 2000), rng.uniform(100, 400, 20)]
+    )
+
+    aligned = align_consensus(CONSENSUS, peaks, heights, tolerance=10)
+
+    assert np.abs(aligned - expected).max() < 1
+
+
+def test_ladder_deviation_ignores_drift_but_not_a_wrong_peak():
+    drifted = perturb(CONSENSUS)
+    wrong = drifted.copy()
+    wrong[1] -= 60
+
+    deviation = ladder_deviation(np.stack([drifted, wrong]), CONSENSUS)
+
+    assert deviation[0] < 1
+    assert deviation[1] > 20
+
+
+def test_plate_ladder_qc_flags_the_outlier():
+    rng = np.random.default_rng(1)
+    results = []
+    for i in range(8):
+        peaks = CONSENSUS + rng.normal(0, 1, CONSENSUS.size) + i
+        results.append(
+            {
+                "path": f"plate/{i}.fsa",
+                "file_name": f"{i}.fsa",
+                "ladder_peaks": peaks,
+                "ladder_correlation": 0.9998,
+            }
+        )
+    results[3]["ladder_peaks"] = results[3]["ladder_peaks"].copy()
+    results[3]["ladder_peaks"][1] -= 60
+
+    consensus, tolerance, qc = plate_ladder_qc(results)
+
+    assert qc["ladder_qc"].tolist() == ["ok"] * 3 + ["outlier"] + ["ok"] * 4
+    assert np.abs(consensus - CONSENSUS).max() < 10
+    assert 10 <= tolerance < 20
+
+
+def test_perturbed_well_is_rescued():
+    # A04 runs faster than the other wells and its unseeded ladder picks a
+    # wrong second peak
+    peaks, summary = batch_analysis(
+        str(DEMO / "1_PRT_*"),
+        "LIZ",
+        "fast_gauss",
+        workers=1,
+        plate_qc=True,
+        verbose=False,
+    )
+    summary = summary.set_index("file_name")
+
+    assert summary.loc["1_PRT_4_4062_A04_Dx.fsa", "ladder_qc"] == "rescued"
+    assert summary.loc["1_PRT_4_4062_A04_Dx.fsa", "ladder_deviation"] < 10
+    assert (summary.drop("1_PRT_4_4062_A04_Dx.fsa")["ladder_qc"] == "ok").all()
+    assert summary["path"].is_unique
@@ -0,0 +1,64 @@
+import contextlib
+import io
+from pathlib import Path
+
+import pandas as pd
+
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.peak_area import PeakArea
+from fragment_analyzer.reports.plate_report import generate_plate_report, plate_summary
+from fragment_analyzer.reports.report_data import report_data
+
+DEMO = Path(__file__).parent.parent / "demo" / "4062_Dx"
+
+
+def analyse(files):
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = []
+        for file in files:
+            laddermap = LadderMap(file, "LIZ")
+            results.append((laddermap, PeakArea(laddermap, "fast_gauss")))
+
+    return results
+
+
+def test_plate_summary_lists_every_peak_and_the_failed_files():
+    # A01 has no peaks
+    results = analyse(sorted(DEMO.glob("*.fsa"))[:2])
+    datas = [report_data(*x) for x in results]
+    summary = pd.DataFrame(
+        {
+            "file_name": [x["name"] for x in datas] + ["failed.fsa"],
+            "status": ["ok", "ok", "failed"],
+            "error": [None, None, "ValueError: no ladder"],
+        }
+    )
+
+    table = plate_summary(datas, summary)
+
+    assert table.file_name.tolist() == sorted(summary.file_name)
+    table = table.set_index("file_name")
+    assert not results[0][1].found_peaks
+    assert table.loc[datas[0]["name"], "peaks"] == 0
+
+    second = table.loc[datas[1]["name"]]
+    peaks = results[1][1].peak_position_area_dataframe
+    assert second.peaks == len(peaks)
+    assert second["area Peak 1"] == peaks.area[0]
+    assert second.quotient == peaks.quotient[0]
+    assert second.ladder_correlation == results[1][0].best_correlation
+    assert table.loc["failed.fsa", "status"] == "failed"
+
+
+def test_plate_report_links_the_figures_of_every_sample(tmp_path):
+    results = analyse(sorted(DEMO.glob("*.fsa"))[:2])
+
+    outname = generate_plate_report(results, tmp_path / "plate.html", workers=1)
+
+    text = outname.read_text()
+    figures = sorted((tmp_path / "plate_assets").glob("*.png"))
+    assert len(figures) >= 2 * len(results)
+    for figure in figures:
+        assert f"plate_assets/{figure.name}" in text
+    # the section markup is escaped in the embedded document
+    assert "loading=&amp;quot;lazy&amp;quot;" in text
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from fragment_analyzer.results_store import ResultsStore
+
+
+def append(store, rows):
+    peaks = pd.DataFrame({"run": ["run1"] * rows, "area": range(rows)})
+    store.append_tables([{"peaks": peaks, "ladder": None, "fits": None}])
+
+
+def test_compact_merges_a_partition_into_one_file(tmp_path):
+    store = ResultsStore(tmp_path)
+    append(store, 3)
+    append(store, 2)
+
+    store.compact()
+
+    assert len(list((tmp_path / "peaks" / "run=run1").glob("*.parquet"))) == 1
+    assert sorted(store.read("peaks").area) == [0, 0, 1, 1, 2]
+
+
+def test_an_interrupted_compact_loses_no_rows(tmp_path, monkeypatch):
+    store = ResultsStore(tmp_path)
+    append(store, 3)
+    append(store, 2)
+
+    unlink = Path.unlink
+    calls = []
+
+    def crash(self, *args, **kwargs):
+        # interrupted after the first file is removed
+        calls.append(self)
+        if len(calls) > 1:
+            raise OSError("interrupted")
+        unlink(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "unlink", crash)
+    with pytest.raises(OSError):
+        store.compact()
+
+    monkeypatch.undo()
+    assert set(store.read("peaks").area) == {0, 1, 2}
+    assert len(store.read("peaks")) >= 5
@@ -0,0 +1,44 @@
+import contextlib
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from fragment_analyzer import shared_traces
+from fragment_analyzer.ladder_map import LadderMap
+from fragment_analyzer.peak_area import PeakArea
+from fragment_analyzer.shared_traces import SharedTraceStore
+
+DEMO = Path(__file__).parent.parent / "demo" / "4062_Dx"
+
+
+def analyse(abif, laddermap):
+    with contextlib.redirect_stdout(io.StringIO()):
+        ladder = LadderMap(abif, "LIZ")
+        peakarea = PeakArea(laddermap, "fast_gauss")
+
+    return (
+        ladder.best_correlated_peaks,
+        peakarea.peaks_index,
+        len(shared_traces._attached),
+    )
+
+
+def test_workers_unmap_the_blocks():
+    files = sorted(DEMO.glob("*.fsa"))[:3]
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = [LadderMap(file, "LIZ") for file in files]
+
+    with SharedTraceStore() as store:
+        abifs = [store.put_abif(file) for file in files]
+        laddermaps = [store.put_laddermap(laddermap) for laddermap in expected]
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            results = list(executor.map(analyse, abifs, laddermaps))
+
+    for laddermap, (peaks, _, attached) in zip(expected, results):
+        np.testing.assert_array_equal(peaks, laddermap.best_correlated_peaks)
+        assert attached == 0
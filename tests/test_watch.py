@@ -0,0 +1,44 @@
+import contextlib
+import io
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from fragment_analyzer.watch import FolderWatcher
+
+DEMO = Path(__file__).parent.parent / "demo" / "4062_Dx" / "1_PRT_2_4062_A02_Dx.fsa"
+
+
+def test_recursive_watch_keys_the_files_on_their_path(tmp_path):
+    for run in ("run1", "run2"):
+        (tmp_path / run).mkdir()
+        shutil.copy(DEMO, tmp_path / run / "A01.fsa")
+    summary = tmp_path / "summary.csv"
+
+    def watch():
+        watcher = FolderWatcher(
+            tmp_path,
+            "LIZ",
+            "fast_gauss",
+            workers=1,
+            output=None,
+            summary=summary,
+            interval=0.1,
+            settle=0,
+            recursive=True,
+            verbose=False,
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            watcher.run(idle_timeout=0.5)
+
+    watch()
+    assert len(pd.read_csv(summary)) == 2
+
+    # a restart skips both files, a new run with the same well is analysed
+    (tmp_path / "run3").mkdir()
+    shutil.copy(DEMO, tmp_path / "run3" / "A01.fsa")
+    watch()
+
+    paths = pd.read_csv(summary).path
+    assert sorted(Path(x).parent.name for x in paths) == ["run1", "run2", "run3"]